@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.snapshots import build_snapshots
+
+
+class Command(BaseCommand):
+    help = "Renders the static snapshots of the most requested API responses."
+
+    def handle(self, *args, **options):
+        version = build_snapshots(force=True)
+        if version is None:
+            raise CommandError('API_SNAPSHOTS_DIR is not set.')
+        self.stdout.write('Built API snapshots %s' % version)
@@ -1,3 +1,19 @@
+import logging
+
 from django.db import models
 
-# Create your models here.
+from api.snapshots import build_snapshots
+from courses.signals import courses_imported
+
+
+logger = logging.getLogger(__name__)
+
+
+# attach to signals
+def build_snapshots_of_import(sender, **kwargs):
+    # the import is already committed, the current snapshots are kept if rendering fails.
+    try:
+        build_snapshots()
+    except Exception:
+        logger.exception("Failed to build the API snapshots of the import")
+courses_imported.connect(build_snapshots_of_import, dispatch_uid='api.build_snapshots_of_import')
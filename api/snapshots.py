@@ -0,0 +1,188 @@
+"""Static snapshots of the most requested v4 API responses.
+
+After each import that changed the data of a semester, the semesters and the
+departments, courses and sections of each visible semester are rendered once into files
+(with gzipped copies) of a new version directory, and the version is switched to at once. Views decorated with snapshot() then
+answer the requests matching a snapshot from its file, without querying the database.
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Max
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified, QueryDict
+from django.utils.http import urlencode
+
+from courses.models import Semester
+
+
+__all__ = ['snapshot', 'build_snapshots', 'find_snapshot', 'SnapshotError']
+
+SNAPSHOTS_DIR = getattr(settings, 'API_SNAPSHOTS_DIR', None)
+CURRENT = 'CURRENT'
+# the file of a version directory holding the data version it was rendered from.
+DATA_VERSION = 'DATA_VERSION'
+
+
+class SnapshotError(Exception):
+    "Raised when the response of a snapshot cannot be rendered."
+
+# view name => the views that can be snapshotted, registered by snapshot().
+snapshot_views = {}
+
+
+def snapshot_key(name, params):
+    "Returns the file name of the snapshot of the named view for the given (key, [values]) params."
+    params = sorted((unicode(key), [unicode(value) for value in values]) for key, values in params)
+    return hashlib.sha1(repr((name, params))).hexdigest()
+
+
+def current_version(directory=None):
+    "Returns the version of the current snapshots, or None if there are none."
+    try:
+        with open(os.path.join(directory or SNAPSHOTS_DIR, CURRENT)) as handle:
+            return handle.read().strip() or None
+    except (IOError, OSError):
+        return None
+
+
+def data_version():
+    "Returns the version of the data of the snapshots: the last time any semester changed."
+    dates = Semester.objects.aggregate(date_updated=Max('date_updated'), data_updated=Max('data_updated'))
+    dates = [date for date in dates.values() if date is not None]
+    return max(dates).isoformat() if dates else ''
+
+
+def current_data_version(directory=None):
+    "Returns the data version of the current snapshots, or None if there are none."
+    directory = directory or SNAPSHOTS_DIR
+    version = current_version(directory)
+    if version is None:
+        return None
+    try:
+        with open(os.path.join(directory, version, DATA_VERSION)) as handle:
+            return handle.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def find_snapshot(name, params, directory=None):
+    """Returns the (version, key, path) of the snapshot of the named view for the given
+    (key, [values]) params, or None if there is none.
+    """
+    directory = directory or SNAPSHOTS_DIR
+    if not directory:
+        return None
+    version = current_version(directory)
+    if version is None:
+        return None
+    key = snapshot_key(name, params)
+    path = os.path.join(directory, version, key + '.json')
+    if not os.path.exists(path):
+        return None
+    return version, key, path
+
+
+def snapshot(view):
+    """Serves the JSON requests of the view from their snapshot when there is one.
+
+    Only GET requests of collections (without an id) in JSON can match a snapshot.
+    """
+    @wraps(view)
+    def decorated(request, id=None, version=None, ext=None, **kwargs):
+        if request.method == 'GET' and id is None and ext in (None, 'json'):
+            found = find_snapshot(view.__name__, request.GET.lists())
+            if found is not None:
+                return snapshot_response(request, *found)
+        return view(request, id=id, version=version, ext=ext, **kwargs)
+    decorated.snapshot_view = view
+    snapshot_views[view.__name__] = decorated
+    return decorated
+
+
+def snapshot_response(request, version, key, path):
+    etag = '"%s-%s"' % (version, key)
+    if request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        return HttpResponseNotModified()
+    gzipped = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+    if gzipped:
+        path += '.gz'
+    with open(path, 'rb') as handle:
+        response = HttpResponse(handle.read(), content_type='application/json')
+    if gzipped:
+        response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def snapshot_requests():
+    "Yields the (view name, params) of the snapshots to build."
+    yield 'semesters', {}
+    for semester_id in Semester.visible_objects.values_list('id', flat=True):
+        for name in ('departments', 'courses', 'sections'):
+            yield name, {'semester_id': semester_id}
+
+
+def render_snapshot(name, params):
+    "Returns the content of the response of the named view to a GET request with the given params."
+    request = HttpRequest()
+    request.method = 'GET'
+    request.GET = QueryDict(urlencode(params))
+    response = snapshot_views[name].snapshot_view(request, version=4)
+    if response.status_code != 200:
+        raise SnapshotError('Snapshot of %s %r failed: %d' % (name, params, response.status_code))
+    if response.streaming:
+        return ''.join(response.streaming_content)
+    return response.content
+
+
+def build_snapshots(directory=None, keep=2, force=False):
+    """Renders all the snapshots into a new version directory, then makes it the current
+    version. Only the ``keep`` latest versions are kept.
+
+    Unless ``force`` is given, nothing is rendered when the current snapshots are of the
+    latest data version. Returns the new (or still current) version, or None if there is
+    no directory to write to. Raises SnapshotError if a snapshot cannot be rendered, in
+    which case the current version is kept.
+    """
+    directory = directory or SNAPSHOTS_DIR
+    if not directory:
+        return None
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    data = data_version()
+    if not force and current_data_version(directory) == data:
+        return current_version(directory)
+    version = datetime.now().strftime('%Y%m%d%H%M%S%f')
+    version_dir = os.path.join(directory, version)
+    os.makedirs(version_dir)
+    try:
+        for name, params in snapshot_requests():
+            content = render_snapshot(name, params)
+            path = os.path.join(version_dir, snapshot_key(name, [(key, [value]) for key, value in params.items()]))
+            with open(path + '.json', 'wb') as handle:
+                handle.write(content)
+            with gzip.open(path + '.json.gz', 'wb') as handle:
+                handle.write(content)
+        with open(os.path.join(version_dir, DATA_VERSION), 'w') as handle:
+            handle.write(data)
+    except:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+
+    # switch to the new version at once.
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w') as handle:
+        handle.write(version)
+    os.rename(tmp_path, os.path.join(directory, CURRENT))
+
+    versions = sorted(name for name in os.listdir(directory) if os.path.isdir(os.path.join(directory, name)))
+    for old_version in versions[:-keep]:
+        shutil.rmtree(os.path.join(directory, old_version), ignore_errors=True)
+    return version
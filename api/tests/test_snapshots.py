@@ -0,0 +1,87 @@
+import gzip
+import os
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from mock import patch
+
+from shortcuts import ShortcutTestCase
+
+from api import snapshots
+from courses.bridge import import_courses
+from courses.signals import courses_imported
+from courses.tests.factories import SemesterFactory, DepartmentFactory, SemesterDepartmentFactory
+from scheduler.models import semester_data_changed
+
+
+class TestAPI4Snapshots(ShortcutTestCase):
+    urls = 'api.urls'
+
+    def setUp(self):
+        self.semester = SemesterFactory.create(year=2012)
+        self.department = DepartmentFactory.create()
+        SemesterDepartmentFactory.create(department=self.department, semester=self.semester)
+        self.directory = tempfile.mkdtemp()
+        self.patcher = patch.object(snapshots, 'SNAPSHOTS_DIR', self.directory)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def query(self):
+        return '?semester_id=%d' % self.semester.id
+
+    def test_serves_snapshots_without_queries(self):
+        expected = self.get('v4:departments', get=self.query(), status_code=200).content
+        snapshots.build_snapshots()
+        with self.assertNumQueries(0):
+            response = self.get('v4:departments', get=self.query(), status_code=200)
+        self.assertEqual(expected, response.content)
+        self.assertTrue(response.has_header('ETag'))
+        with self.assertNumQueries(0):
+            self.get('v4:departments', get=self.query(), headers={'If-None-Match': response['ETag']}, status_code=304)
+
+    def test_serves_gzipped_snapshots(self):
+        expected = self.get('v4:semesters', status_code=200).content
+        snapshots.build_snapshots()
+        response = self.get('v4:semesters', headers={'Accept-Encoding': 'gzip'}, status_code=200)
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertEqual(expected, gzip.GzipFile(fileobj=StringIO(response.content)).read())
+
+    def test_other_requests_use_the_views(self):
+        version = snapshots.build_snapshots()
+        self.assertEqual(None, snapshots.find_snapshot('departments', [('semester_id', ['0'])]))
+        self.assertEqual(None, snapshots.find_snapshot('departments', [('code', [self.department.code])]))
+        response = self.get('v4:departments', get='?code=' + self.department.code, status_code=200)
+        self.assertFalse(response['ETag'].startswith('"%s-' % version))
+        response = self.get('v4:departments', get=self.query() + '&code=' + self.department.code, status_code=200)
+        self.assertFalse(response['ETag'].startswith('"%s-' % version))
+
+    def test_keeps_latest_versions(self):
+        versions = [snapshots.build_snapshots(keep=2, force=True) for i in range(3)]
+        self.assertEqual(versions[-1], snapshots.current_version())
+        self.assertEqual(sorted(versions[1:]), sorted(
+            name for name in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, name))))
+
+    def test_rebuilt_only_when_data_changes(self):
+        version = snapshots.build_snapshots()
+        self.assertEqual(version, snapshots.build_snapshots())
+        semester_data_changed(self.semester)
+        self.assertNotEqual(version, snapshots.build_snapshots())
+
+    def test_keeps_current_version_when_rendering_fails(self):
+        version = snapshots.build_snapshots()
+        semester_data_changed(self.semester)
+        with patch.object(snapshots, 'render_snapshot', side_effect=snapshots.SnapshotError):
+            self.assertRaises(snapshots.SnapshotError, snapshots.build_snapshots)
+            courses_imported.send(sender=self)
+        self.assertEqual([version], [
+            name for name in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, name))])
+        self.assertEqual(version, snapshots.current_version())
+
+    def test_built_after_imports(self):
+        with self.settings(COURSES_COLLEGE_PARSER='os.getcwd'):
+            import_courses()
+        self.assertNotEqual(None, snapshots.current_version())
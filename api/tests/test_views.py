@@ -1,15 +1,20 @@
 from datetime import time, datetime
+from json import loads
+
+from django.core.cache import cache
 
 from shortcuts import ShortcutTestCase
 
+from api.views import iter_sections
 from courses import models
 from courses.tests.factories import (
     SemesterFactory, DepartmentFactory, SemesterDepartmentFactory,
     CourseFactory, OfferedForFactory, SectionPeriodFactory,
-    SectionFactory
+    SectionFactory, PeriodFactory
 )
-from scheduler.models import SavedSelection
+from scheduler.models import SavedSelection, SectionConflict, semester_data_changed
 from scheduler.factories import SavedSelectionFactory
+from scheduler.results import ScheduleResultCache
 
 
 class TestAPI4Docs(ShortcutTestCase):
@@ -27,8 +32,102 @@ class TestAPI4Docs(ShortcutTestCase):
 class TestAPI4Schedules(ShortcutTestCase):
     urls = 'api.urls'
 
+    def setUp(self):
+        cache.clear()
+        self.semester = SemesterFactory.create()
+        self.c1, self.c2 = CourseFactory.create_batch(2)
+        monday = models.Period.MONDAY
+        p1 = PeriodFactory.create(start=time(10), end=time(10, 50), days_of_week_flag=monday)
+        p2 = PeriodFactory.create(start=time(10, 30), end=time(11, 20), days_of_week_flag=monday)
+        p3 = PeriodFactory.create(start=time(12), end=time(12, 50), days_of_week_flag=monday)
+        self.s1 = SectionFactory.create(course=self.c1, semester=self.semester)
+        self.s2 = SectionFactory.create(course=self.c2, semester=self.semester)
+        self.s3 = SectionFactory.create(course=self.c2, semester=self.semester)
+        SectionPeriodFactory.create(section=self.s1, period=p1, semester=self.semester)
+        SectionPeriodFactory.create(section=self.s2, period=p2, semester=self.semester)
+        SectionPeriodFactory.create(section=self.s3, period=p3, semester=self.semester)
+
+    def section_ids_query(self):
+        return '?section_id=%d&section_id=%d&section_id=%d' % (
+            self.s1.id, self.s2.id, self.s3.id)
+
     def test_schedules(self):
-        pass
+        json = self.json_get('v4:schedules', get=self.section_ids_query(), status_code=200)
+        self.assertEqual(json['result']['schedules'], [
+            {unicode(self.c1.id): self.s1.id, unicode(self.c2.id): self.s3.id},
+        ])
+        self.assertEqual(json['result']['schedule_count'], 1)
+        self.assertEqual(json['result']['truncated'], False)
+        self.assertEqual(json['result']['next_cursor'], None)
+
+    def test_cached_schedules(self):
+        json = self.json_get('v4:schedules', get=self.section_ids_query(), status_code=200)
+        self.assertTrue('stats' in json['result'])
+        cached = self.json_get('v4:schedules', get=self.section_ids_query(), status_code=200)
+        self.assertFalse('stats' in cached['result'])
+        del json['result']['stats']
+        self.assertEqual(json['result'], cached['result'])
+
+        # changing the semester's data makes it compute the schedules again.
+        ScheduleResultCache().bump_version(self.semester.id)
+        json = self.json_get('v4:schedules', get=self.section_ids_query(), status_code=200)
+        self.assertTrue('stats' in json['result'])
+
+    def test_check_schedules(self):
+        json = self.json_get('v4:schedules', get=self.section_ids_query() + '&check=1', status_code=200)
+        self.assertEqual(json['result'], True)
+
+    def test_check_schedules_without_any(self):
+        s4 = SectionFactory.create(course=CourseFactory.create(), semester=self.semester)
+        SectionPeriodFactory.create(section=s4, period=self.s1.get_periods()[0], semester=self.semester)
+        json = self.json_get(
+            'v4:schedules', get='?section_id=%d&section_id=%d&check=1' % (self.s1.id, s4.id), status_code=200)
+        self.assertEqual(json['result'], False)
+
+    def test_schedules_with_cursor(self):
+        s4 = SectionFactory.create(course=self.c1, semester=self.semester)
+        query = self.section_ids_query() + '&section_id=%d&limit=1' % s4.id
+        json = self.json_get('v4:schedules', get=query, status_code=200)
+        self.assertEqual(json['result']['schedules'], [
+            {unicode(self.c1.id): self.s1.id, unicode(self.c2.id): self.s3.id},
+        ])
+        cursor = json['result']['next_cursor']
+        schedules = json['result']['schedules']
+        while cursor:
+            json = self.json_get('v4:schedules', get=query + '&cursor=' + cursor, status_code=200)
+            self.assertEqual(len(json['result']['schedules']), 1)
+            schedules.extend(json['result']['schedules'])
+            cursor = json['result']['next_cursor']
+        # s4 has no periods, so it goes with either section of c2.
+        self.assertEqual(sorted(sorted(schedule.values()) for schedule in schedules), [
+            sorted([self.s1.id, self.s3.id]),
+            sorted([s4.id, self.s2.id]),
+            sorted([s4.id, self.s3.id]),
+        ])
+
+    def test_schedules_with_blocked_times(self):
+        query = self.section_ids_query() + '&blocked_times=Monday_11:0:0,Monday_12:30:0'
+        json = self.json_get('v4:schedules', get=query, status_code=200)
+        self.assertEqual(json['result']['schedules'], [])
+        self.assertEqual(json['result']['blocked_course_ids'], [self.c2.id])
+        self.assertEqual(json['result']['schedule_count'], 0)
+
+    def test_schedules_with_invalid_blocked_times(self):
+        self.get('v4:schedules', get=self.section_ids_query() + '&blocked_times=Someday_1:0:0', status_code=400)
+
+    def test_ranked_schedules(self):
+        s4 = SectionFactory.create(course=self.c1, semester=self.semester)
+        query = self.section_ids_query() + '&section_id=%d&rank_by=days&top=2' % s4.id
+        json = self.json_get('v4:schedules', get=query, status_code=200)
+        self.assertEqual(json['result']['costs'], [1, 1])
+        self.assertEqual(len(json['result']['schedules']), 2)
+        self.assertEqual(json['result']['truncated'], False)
+
+    def test_ranked_schedules_with_unknown_cost(self):
+        self.get('v4:schedules', get=self.section_ids_query() + '&rank_by=unknown', status_code=400)
+
+    def test_schedules_with_invalid_cursor(self):
+        self.get('v4:schedules', get=self.section_ids_query() + '&cursor=invalid', status_code=400)
 
 
 class TestAPI4Semesters(ShortcutTestCase):
@@ -220,6 +319,38 @@ class TestAPI4SavedSelections(ShortcutTestCase):
         self.assertEqual(json, expected_json)
 
 
+class TestAPI4ConditionalGet(ShortcutTestCase):
+    urls = 'api.urls'
+
+    def setUp(self):
+        self.semester = SemesterFactory.create(year=2012)
+
+    def test_not_modified(self):
+        response = self.get('v4:semesters', status_code=200)
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.get('v4:semesters', headers={'If-None-Match': etag}, status_code=304)
+        self.assertEqual('', response.content)
+        self.get('v4:semesters', headers={'If-Modified-Since': response['Last-Modified']}, status_code=304)
+
+    def test_etag_depends_on_parameters(self):
+        etag = self.get('v4:semesters', status_code=200)['ETag']
+        self.assertNotEqual(etag, self.get('v4:semesters', get='?year=2012', status_code=200)['ETag'])
+        self.assertNotEqual(etag, self.get('v4:conflicts', status_code=200)['ETag'])
+        self.get('v4:semesters', get='?year=2012', headers={'If-None-Match': etag}, status_code=200)
+
+    def test_modified_when_semester_is_updated(self):
+        etag = self.get('v4:courses', status_code=200)['ETag']
+        self.semester.save()
+        self.get('v4:courses', headers={'If-None-Match': etag}, status_code=200)
+
+    def test_modified_when_semester_data_changes(self):
+        etag = self.get('v4:courses', status_code=200)['ETag']
+        semester_data_changed(self.semester)
+        self.get('v4:courses', headers={'If-None-Match': etag}, status_code=200)
+
+
 class TestAPI4Departments(ShortcutTestCase):
     urls = 'api.urls'
 
@@ -507,6 +638,25 @@ class TestAPI4Courses(ShortcutTestCase):
             ]
         })
 
+    def test_get_courses_with_fields(self):
+        c1, c2 = CourseFactory.create_batch(2)
+        json = self.json_get('v4:courses', get='?fields=id,name', status_code=200)
+        self.assertEqual(json['result'], [
+            {u"id": c1.id, u"name": c1.name},
+            {u"id": c2.id, u"name": c2.name},
+        ])
+        json = self.json_get('v4:courses', id=c2.id, get='?fields=department_id', status_code=200)
+        self.assertEqual(json['result'], {u"department_id": c2.department_id})
+
+    def test_get_missing_course(self):
+        CourseFactory.create()
+        self.get('v4:courses', id=99999, status_code=404)
+        self.get('v4:courses', id=99999, get='?fields=id,name', status_code=404)
+
+    def test_get_courses_with_unknown_fields(self):
+        CourseFactory.create()
+        self.get('v4:courses', get='?fields=id,department', status_code=400)
+
 
 class TestAPI4Sections(ShortcutTestCase):
     urls = 'api.urls'
@@ -590,6 +740,39 @@ class TestAPI4Sections(ShortcutTestCase):
             ]
         })
 
+    def test_sections_are_streamed(self):
+        s1, s2, s3 = SectionPeriodFactory.create_batch(3)
+        response = self.get('v4:sections', status_code=200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(
+            [self.to_dict(s1), self.to_dict(s2), self.to_dict(s3)],
+            loads(self.content(response))['result'])
+        # other formats are rendered at once.
+        response = self.get('v4:sections', ext='xml', status_code=200)
+        self.assertFalse(response.streaming)
+
+    def test_sections_are_read_in_chunks(self):
+        section = SectionFactory.create()
+        s1, s2 = SectionPeriodFactory.create_batch(2, section=section)
+        s3 = SectionPeriodFactory.create()
+        queryset = models.SectionPeriod.objects.select_related('section', 'period')
+        # the section ids, then a query per chunk.
+        with self.assertNumQueries(3):
+            sections = list(iter_sections(queryset, chunk_size=1))
+        self.assertEqual([section.id, s3.section.id], [s['id'] for s in sections])
+        self.assertEqual(2, len(sections[0]['section_times']))
+
+    def test_sections_sharing_a_number(self):
+        section1, section2 = SectionFactory.create(number='1'), SectionFactory.create(number='1')
+        # the ids of their section times interleave.
+        SectionPeriodFactory.create(section=section1, location='A')
+        SectionPeriodFactory.create(section=section2, location='B')
+        SectionPeriodFactory.create(section=section1, location='C')
+        json = self.json_get('v4:sections', status_code=200)
+        self.assertEqual(
+            [(section1.id, [u'A', u'C']), (section2.id, [u'B'])],
+            [(section['id'], [t['location'] for t in section['section_times']]) for section in json['result']])
+
     def test_get_section_by_id(self):
         s1, s2 = SectionPeriodFactory.create_batch(2)
         json = self.json_get('v4:sections', id=s1.id, status_code=200)
@@ -630,11 +813,139 @@ class TestAPI4Sections(ShortcutTestCase):
             ]
         })
 
+    def test_get_sections_with_fields(self):
+        s1, s2 = SectionPeriodFactory.create_batch(2)
+        json = self.json_get('v4:sections', get='?fields=id,crn', status_code=200)
+        self.assertEqual(json['result'], [
+            {u"id": s1.section.id, u"crn": s1.section.crn},
+            {u"id": s2.section.id, u"crn": s2.section.crn},
+        ])
+
+    def test_get_sections_with_section_times_fields(self):
+        section = SectionFactory.create()
+        s1, s2 = SectionPeriodFactory.create_batch(2, section=section)
+        json = self.json_get(
+            'v4:sections', id=section.id,
+            get='?fields=crn&fields[section_times]=location,days_of_the_week',
+            status_code=200)
+        self.assertEqual(json['result'], {
+            u"crn": section.crn,
+            u"section_times": [
+                {u"location": s1.location, u"days_of_the_week": s1.period.days_of_week},
+                {u"location": s2.location, u"days_of_the_week": s2.period.days_of_week},
+            ],
+        })
+
+    def test_get_sparse_sections_sharing_a_number(self):
+        section1, section2 = SectionFactory.create(number='1'), SectionFactory.create(number='1')
+        SectionPeriodFactory.create(section=section1, location='A')
+        SectionPeriodFactory.create(section=section2, location='B')
+        SectionPeriodFactory.create(section=section1, location='C')
+        json = self.json_get('v4:sections', get='?fields=id,section_times', status_code=200)
+        self.assertEqual(
+            [(section1.id, [u'A', u'C']), (section2.id, [u'B'])],
+            [(section['id'], [t['location'] for t in section['section_times']]) for section in json['result']])
+        json = self.json_get('v4:sections', get='?fields=id', status_code=200)
+        self.assertEqual([{u'id': section1.id}, {u'id': section2.id}], json['result'])
+
+    def test_get_missing_section(self):
+        SectionPeriodFactory.create()
+        self.get('v4:sections', id=99999, status_code=404)
+        self.get('v4:sections', id=99999, get='?fields=id,crn', status_code=404)
+
+    def test_get_sections_with_unknown_fields(self):
+        SectionPeriodFactory.create()
+        self.get('v4:sections', get='?fields=id,course', status_code=400)
+        self.get('v4:sections', get='?fields[section_times]=period', status_code=400)
+
+
+class TestAPI4FreeSections(ShortcutTestCase):
+    urls = 'api.urls'
+
+    def setUp(self):
+        self.semester = SemesterFactory.create()
+        self.c1, self.c2 = CourseFactory.create_batch(2)
+        tuesday = models.Period.TUESDAY
+        p1 = PeriodFactory.create(start=time(10), end=time(10, 50), days_of_week_flag=tuesday)
+        p2 = PeriodFactory.create(start=time(11), end=time(11, 50), days_of_week_flag=tuesday)
+        p3 = PeriodFactory.create(start=time(12), end=time(12, 50), days_of_week_flag=tuesday)
+        self.s1 = SectionFactory.create(course=self.c1, semester=self.semester)
+        self.s2 = SectionFactory.create(course=self.c2, semester=self.semester)
+        self.s3 = SectionFactory.create(course=self.c2, semester=self.semester)
+        SectionPeriodFactory.create(section=self.s1, period=p1, semester=self.semester)
+        SectionPeriodFactory.create(section=self.s2, period=p2, semester=self.semester)
+        SectionPeriodFactory.create(section=self.s3, period=p3, semester=self.semester)
+
+    def test_free_window(self):
+        json = self.json_get('v4:free-sections', get='?free=Tuesday_10:00-12:00', status_code=200)
+        self.assertEqual(json['result'], {
+            u'semester_id': self.semester.id,
+            u'section_ids': [self.s1.id, self.s2.id],
+            u'course_ids': [self.c1.id, self.c2.id],
+        })
+
+    def test_busy_windows(self):
+        json = self.json_get(
+            'v4:free-sections', get='?busy=Tuesday_10:30-11:00&blocked_times=Tuesday_12:30:0', status_code=200)
+        self.assertEqual(json['result']['section_ids'], [self.s2.id])
+
+    def test_selection_is_busy(self):
+        json = self.json_get(
+            'v4:free-sections', get='?semester_id=%d&section_id=%d' % (self.semester.id, self.s2.id), status_code=200)
+        self.assertEqual(json['result']['section_ids'], [self.s1.id, self.s3.id])
+
+    def test_free_rooms(self):
+        models.SectionPeriod.objects.filter(section=self.s1).update(location='DCC 308')
+        models.SectionPeriod.objects.filter(section=self.s2).update(location='Sage 3303')
+        models.SectionPeriod.objects.filter(section=self.s3).update(location='')
+        json = self.json_get('v4:free-rooms', get='?time=Tuesday_10:00-10:30', status_code=200)
+        self.assertEqual(json['result'], {u'semester_id': self.semester.id, u'locations': [u'Sage 3303']})
+        self.get('v4:free-rooms', status_code=400)
+        self.get('v4:free-rooms', get='?time=garbage', status_code=400)
+
+    def test_invalid_windows(self):
+        self.get('v4:free-sections', status_code=400)
+        self.get('v4:free-sections', get='?free=Someday_10:00-12:00', status_code=400)
+        self.get('v4:free-sections', get='?free=Tuesday_12:00-10:00', status_code=400)
+
 
-# TODO: we don't have any factories here...
 class TestAPI4SectionConflicts(ShortcutTestCase):
     urls = 'api.urls'
 
+    def setUp(self):
+        self.semester = SemesterFactory.create()
+        self.s1, self.s2, self.s3 = SectionFactory.create_batch(3, semester=self.semester)
+        SectionConflict.objects.create(section1=self.s1, section2=self.s2, semester=self.semester)
+        SectionConflict.objects.create(section1=self.s1, section2=self.s3, semester=self.semester)
+
+    def as_dict(self, result):
+        return dict((conflict['id'], sorted(conflict['conflicts'])) for conflict in result)
+
+    def test_get_conflicts(self):
+        json = self.json_get('v4:conflicts', status_code=200)
+        self.assertEqual(self.as_dict(json['result']), {
+            self.s1.id: sorted([self.s2.id, self.s3.id]),
+            self.s2.id: [self.s1.id],
+            self.s3.id: [self.s1.id],
+        })
+
+    def test_get_conflicts_by_ids(self):
+        json = self.json_get('v4:conflicts', get='?id=%d&id=%d' % (self.s2.id, self.s3.id), status_code=200)
+        self.assertEqual(self.as_dict(json['result']), {
+            self.s2.id: [self.s1.id],
+            self.s3.id: [self.s1.id],
+        })
+
+    def test_get_conflicts_by_crns(self):
+        json = self.json_get('v4:conflicts', get='?crn=%d&as_crns=1' % self.s1.crn, status_code=200)
+        self.assertEqual(self.as_dict(json['result']), {
+            self.s1.crn: sorted([self.s2.crn, self.s3.crn]),
+        })
+
+    def test_get_conflicts_by_id(self):
+        json = self.json_get('v4:conflicts', id=self.s2.id, status_code=200)
+        self.assertEqual(json['result'], {u'id': self.s2.id, u'conflicts': [self.s1.id]})
+
 
 class TestAPI4Selection(ShortcutTestCase):
     urls = 'api.urls'
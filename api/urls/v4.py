@@ -39,9 +39,14 @@ urlpatterns = patterns(
 
     url(r'^/sections/$', views.sections, api4, name='sections'),
     url(r'^/sections' + ext_re, views.sections, api4, name='sections'),
+    url(r'^/sections/free/$', views.free_sections, api4, name='free-sections'),
+    url(r'^/sections/free' + ext_re, views.free_sections, api4, name='free-sections'),
     url(r'^/sections/(?P<id>\d+)/$', views.sections, api4, name='sections'),
     url(r'^/sections/(?P<id>\d+)' + ext_re, views.sections, api4, name='sections'),
 
+    url(r'^/rooms/free/$', views.free_rooms, api4, name='free-rooms'),
+    url(r'^/rooms/free' + ext_re, views.free_rooms, api4, name='free-rooms'),
+
     url(r'^/conflicts/$', views.section_conflicts, api4, name='conflicts'),
     url(r'^/conflicts' + ext_re, views.section_conflicts, api4, name='conflicts'),
     url(r'^/conflicts/(?P<id>\d+)/$', views.section_conflicts, api4, name='conflicts'),
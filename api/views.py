@@ -1,10 +1,14 @@
+import hashlib
 import mimetypes
 import plistlib
-import json
+from itertools import groupby
+from operator import attrgetter, itemgetter
 
+from django.db.models import Max
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition
 from django.views.generic import ListView, DetailView
-from django.http import HttpResponseBadRequest, HttpResponse, HttpResponseServerError
+from django.http import HttpResponseBadRequest, HttpResponseNotFound, HttpResponse, HttpResponseServerError, StreamingHttpResponse
 from django.conf import settings
 from django.template import RequestContext
 from django.shortcuts import render_to_response
@@ -14,13 +18,30 @@ from courses.views import decorators
 from courses import models, views
 from courses import encoder as encoders
 
+from api.snapshots import snapshot
+from scheduler.conflicts import conflicts_of
 from scheduler.models import SectionProxy, Selection, SectionConflict, SavedSelection
+from scheduler.scheduling import TimeRange, parse_blocked_times, parse_time_window
+from scheduler.results import ScheduleResultCache
+from scheduler.rooms import get_room_occupancy
+from scheduler.time_index import get_section_time_index
+from scheduler.store import ScheduleStore
 from scheduler.domain import (
-    ConflictCache, has_schedule, compute_schedules, period_stats
+    has_schedule, count_schedules, search_schedules, rank_schedules, period_stats
 )
 
 
 DEBUG = getattr(settings, 'DEBUG', False)
+SCHEDULE_TIMEOUT = getattr(settings, 'SCHEDULER_TIMEOUT', 5)
+SCHEDULE_LIMIT = getattr(settings, 'SCHEDULER_SCHEDULE_LIMIT', 2000)
+SCHEDULE_COUNT_LIMIT = getattr(settings, 'SCHEDULER_COUNT_LIMIT', 100000)
+# the number of sections read at once by the streamed sections list.
+SECTIONS_CHUNK_SIZE = getattr(settings, 'API_SECTIONS_CHUNK_SIZE', 500)
+SCHEDULE_STORE = ScheduleStore(
+    max_entries=getattr(settings, 'SCHEDULER_STORE_SIZE', 100),
+    timeout=getattr(settings, 'SCHEDULER_STORE_TIMEOUT', None),
+    max_schedules=SCHEDULE_LIMIT)
+SCHEDULE_RESULTS = ScheduleResultCache(timeout=getattr(settings, 'SCHEDULER_RESULTS_TIMEOUT', None))
 
 # add some mimetypes
 mimetypes.init()
@@ -67,14 +88,35 @@ class DataFormatter(object):
         converted_data = self.convert_to_content_type(data, content_type)
         return converted_data
 
-    def convert_request(self, settings, request, *args, **kwargs):
-        context = settings['context']
+    def stream_json(self, items):
+        """Yields the JSON of the context with the given items as its list, an item at a
+        time, so the whole list is never in memory.
+        """
+        placeholder = '__streamed_items__'
+        context = placeholder
         if callable(self.context_processor):
             context = self.context_processor(context)
-        context = self.encoder.encode(context)
+        before, after = self.convert_data_to_json(self.encoder.encode(context)).split('"%s"' % placeholder, 1)
+        yield before + '['
+        encoder = ObjectJSONEncoder()
+        for i, item in enumerate(items):
+            yield (', ' if i else '') + encoder.encode(self.encoder.encode(item))
+        yield ']' + after
+
+    def convert_request(self, settings, request, *args, **kwargs):
+        context = settings['context']
         content_type = kwargs.get('ext') or self.default_content_type
         if content_type != self.default_content_type:
             content_type = self.get_context_type_from_extension(content_type)
+        # the context is an iterable of items to stream.
+        if settings.get('stream'):
+            if content_type == 'application/json':
+                response = StreamingHttpResponse(self.stream_json(context), content_type=content_type)
+                raise decorators.AlternativeResponse(response)
+            context = list(context)
+        if callable(self.context_processor):
+            context = self.context_processor(context)
+        context = self.encoder.encode(context)
         data = self.convert(context, content_type)
         response = HttpResponse(data, content_type=content_type)
         raise decorators.AlternativeResponse(response)
@@ -93,17 +135,95 @@ def wrap_request(render_settings, request, *args, **kwargs):
 render = decorators.Renderer(posthook=wrap_request)
 
 
+def data_last_modified(request, *args, **kwargs):
+    "Returns the last time the data of any semester changed, queried once per request."
+    if not hasattr(request, 'data_last_modified'):
+        dates = models.Semester.objects.aggregate(
+            date_updated=Max('date_updated'), data_updated=Max('data_updated'))
+        request.data_last_modified = max([date for date in dates.values() if date is not None] or [None])
+    return request.data_last_modified
+
+
+def data_etag(request, *args, **kwargs):
+    "Returns the ETag of the response to the request, from its path, parameters and data_last_modified()."
+    last_modified = data_last_modified(request)
+    if last_modified is None:
+        return None
+    return hashlib.sha1(repr((
+        request.path,
+        sorted(request.GET.lists()),
+        sorted(request.POST.lists()),
+        last_modified.isoformat(),
+    ))).hexdigest()
+
+# answers conditional requests with 304 Not Modified before running the view.
+conditional = condition(etag_func=data_etag, last_modified_func=data_last_modified)
+
+
 def paginate(query, page=1, per_page=1000):
     return query[(page - 1) * per_page:page * per_page]
 
 
+def not_found():
+    "Returns the exception answering a request for an object that doesn't exist."
+    return decorators.AlternativeResponse(HttpResponseNotFound('{}'))
+
+
 def get_if_id_present(queryset, id=None):
     if id is not None:
-        return queryset.get()
+        try:
+            return queryset.get()
+        except queryset.model.DoesNotExist:
+            raise not_found()
     else:
         return queryset
 
 
+def get_fields_param(params, key='fields'):
+    "Returns the field names of the comma separated fields param, or None if it isn't given."
+    names = [name.strip() for value in params.getlist(key) for name in value.split(',')]
+    return [name for name in names if name] or None
+
+
+def field_columns(model, fields=None, prefix='', excluded=()):
+    """Returns the list of (API name, column) of the given fields of the model, as encoded
+    by the API (eg - course_id for the course foreign key). All of them if ``fields`` is
+    None. Unknown fields are a bad request.
+    """
+    columns = dict(
+        (field.attname, prefix + field.name)
+        for field in model._meta.fields if field.attname not in excluded
+    )
+    if fields is None:
+        fields = sorted(columns)
+    if not set(fields) <= set(columns):
+        raise decorators.AlternativeResponse(HttpResponseBadRequest('{}'))
+    return [(name, columns[name]) for name in fields]
+
+
+def iter_values(queryset, columns):
+    "Yields a dictionary of API name to value for each row of the queryset, selecting only the given columns."
+    names = [name for name, column in columns]
+    for row in queryset.values_list(*[column for name, column in columns]).iterator():
+        yield dict(zip(names, row))
+
+
+def sparse(queryset, params, id=None, excluded=()):
+    """Returns the context of the queryset of a resource with only the fields requested by
+    the fields param, or None if all the fields are requested.
+    """
+    fields = get_fields_param(params)
+    if fields is None:
+        return None
+    rows = iter_values(queryset, field_columns(queryset.model, fields, excluded=excluded))
+    if id is not None:
+        try:
+            return next(rows)
+        except StopIteration:
+            raise not_found()
+    return list(rows)
+
+
 @csrf_exempt
 @render()
 def raw_data(request, data, version=None, ext=None):
@@ -147,6 +267,8 @@ class RequestParams(object):
 
 
 @csrf_exempt
+@snapshot
+@conditional
 @render()
 def semesters(request, id=None, version=None, ext=None):
     params = RequestParams(request)
@@ -157,10 +279,15 @@ def semesters(request, id=None, version=None, ext=None):
         year=params.get('year'), month=params.get('month'),
         id=id,
     ).distinct()
+    context = sparse(queryset, params, id, excluded=('visible', 'data_updated'))
+    if context is not None:
+        return {'context': context}
     return {'context': get_if_id_present(queryset, id)}
 
 
 @csrf_exempt
+@snapshot
+@conditional
 @render()
 def departments(request, id=None, version=None, ext=None):
     params = RequestParams(request)
@@ -171,6 +298,9 @@ def departments(request, id=None, version=None, ext=None):
         code__in=params.getlist('code') or None,
         id=id,
     ).distinct()
+    context = sparse(queryset, params, id)
+    if context is not None:
+        return {'context': context}
     return {'context': get_if_id_present(queryset, id)}
 
 
@@ -182,6 +312,8 @@ def try_int(value, default=0):
 
 
 @csrf_exempt
+@snapshot
+@conditional
 @render()
 def courses(request, id=None, version=None, ext=None):
     params = RequestParams(request)
@@ -196,10 +328,15 @@ def courses(request, id=None, version=None, ext=None):
     ).distinct()
     search_query = params.get('search')
     queryset = queryset.search(search_query)
+    context = sparse(queryset, params, id)
+    if context is not None:
+        return {'context': context}
     return {'context': get_if_id_present(queryset, id)}
 
 
 @csrf_exempt
+@snapshot
+@conditional
 @render()
 def sections(request, id=None, version=None, ext=None):
     params = RequestParams(request)
@@ -210,12 +347,32 @@ def sections(request, id=None, version=None, ext=None):
         section__crn__in=int_list(params.getlist('crn')) or None,
         section__id=id,
     ).select_related('section', 'period')
-    section_periods = encoders.default_encoder.encode(queryset)
-    sections = {}
+    section_fields = get_fields_param(params)
+    time_fields = get_fields_param(params, 'fields[section_times]')
+    if section_fields is not None or time_fields is not None:
+        sections = iter_sparse_sections(queryset, section_columns(section_fields, time_fields))
+        if id is not None:
+            section = next(sections, None)
+            if section is None:
+                raise not_found()
+            return {'context': section}
+        return {'context': sections, 'stream': True}
+    if id is not None:
+        section = encode_section(queryset.order_by('id'), encoders.get_select_related_fields(queryset))
+        if section is None:
+            raise not_found()
+        return {'context': section}
+    return {'context': iter_sections(queryset), 'stream': True}
+
+
+def encode_section(section_periods, select_related):
+    """Returns the dictionary of a section from all its SectionPeriods (and their
+    select_related fields), or None if there are none.
+    """
+    section = None
     for section_period in section_periods:
-        section = section_period['section']
-        section = sections.get(section['id'], section)
-
+        section_period = encoders.default_encoder.encode_model(section_period, select_related)
+        section = section or section_period['section']
         section.setdefault('section_times', []).append(section_period)
         # to prevent infinite recursion
         del section_period['section']
@@ -223,45 +380,120 @@ def sections(request, id=None, version=None, ext=None):
         period = section_period['period']
         del section_period['period']
         section_period.update(period)
-
-        sections[section['id']] = section
-
-    if id is not None:
-        return {'context': sections.values()[0]}
-    return {'context': sections.values()}
+    return section
+
+
+def iter_sections(queryset, chunk_size=SECTIONS_CHUNK_SIZE):
+    """Yields the dictionary of each section of the SectionPeriod queryset, in order of id.
+
+    The SectionPeriods are read ``chunk_size`` sections at a time, so only a chunk of them
+    is ever in memory.
+    """
+    select_related = encoders.get_select_related_fields(queryset)
+    # by the section ids, not order_by('section'), which sorts by the sections' numbers.
+    section_ids = list(queryset.order_by('section__id').values_list('section', flat=True).distinct())
+    for i in range(0, len(section_ids), chunk_size):
+        chunk = queryset.filter(section__id__in=section_ids[i:i + chunk_size]).order_by('section__id', 'id')
+        for section_id, section_periods in groupby(chunk.iterator(), key=attrgetter('section_id')):
+            yield encode_section(section_periods, select_related)
+
+
+# the columns of the section times of sections by their API name.
+SECTION_TIME_COLUMNS = {
+    'section_id': 'section',
+    'kind': 'kind',
+    'instructor': 'instructor',
+    'location': 'location',
+    'start': 'period__start',
+    'end': 'period__end',
+    'days_of_the_week': 'period__days_of_week_flag',
+}
+
+
+def section_columns(section_fields=None, time_fields=None):
+    """Returns the (API name, column) of the given fields of the sections and of their
+    section_times (named section_times.<name>). All the fields if None.
+
+    The section times are only included if ``section_fields`` includes section_times or
+    ``time_fields`` are given. Unknown fields are a bad request.
+    """
+    with_times = section_fields is None or 'section_times' in section_fields or time_fields is not None
+    if section_fields is not None:
+        section_fields = [name for name in section_fields if name != 'section_times']
+    columns = [('section', 'section')] + field_columns(models.Section, section_fields, prefix='section__')
+    if with_times:
+        if time_fields is None:
+            time_fields = sorted(SECTION_TIME_COLUMNS)
+        if not set(time_fields) <= set(SECTION_TIME_COLUMNS):
+            raise decorators.AlternativeResponse(HttpResponseBadRequest('{}'))
+        columns += [('section_times.' + name, SECTION_TIME_COLUMNS[name]) for name in time_fields]
+    return columns
+
+
+def iter_sparse_sections(queryset, columns, chunk_size=SECTIONS_CHUNK_SIZE):
+    "Like iter_sections, but only selects and returns the given section_columns()."
+    with_times = any('.' in name for name, column in columns)
+    section_ids = list(queryset.order_by('section__id').values_list('section', flat=True).distinct())
+    for i in range(0, len(section_ids), chunk_size):
+        chunk = queryset.filter(section__id__in=section_ids[i:i + chunk_size]).select_related(None)
+        if with_times:
+            chunk = chunk.order_by('section__id', 'id')
+        else:
+            chunk = chunk.order_by('section__id').distinct()
+        for section_id, rows in groupby(iter_values(chunk, columns), key=itemgetter('section')):
+            section = None
+            for row in rows:
+                if section is None:
+                    section = dict((name, value) for name, value in row.items() if '.' not in name)
+                    del section['section']
+                if with_times:
+                    section.setdefault('section_times', []).append(dict(
+                        (name.split('.', 1)[1], value) for name, value in row.items() if '.' in name))
+            for section_time in section.get('section_times', ()):
+                if 'days_of_the_week' in section_time:
+                    section_time['days_of_the_week'] = models.Period(
+                        days_of_week_flag=section_time['days_of_the_week']).days_of_week
+            yield section
 
 
 @csrf_exempt
+@conditional
 @render()
 def section_conflicts(request, id=None, version=None, ext=None):
     params = RequestParams(request)
-    conflicts = SectionConflict.objects.by_unless_none(
-        id=id,
-        id__in=int_list(params.getlist('id')) or None,
-        crn__in=int_list(params.getlist('crn')) or None,
-    )
-    if params.get('as_crns'):
-        conflicts = conflicts.values_list('section1__crn', 'section2__crn')
+    ids = int_list(params.getlist('id'))
+    crns = int_list(params.getlist('crn'))
+    field = 'crn' if params.get('as_crns') else 'id'
+
+    if id is not None:
+        section_ids = [int(id)]
+    elif crns:
+        section_ids = models.Section.objects.optional_filter(
+            id__in=ids or None, crn__in=crns).values_list('id', flat=True)
     else:
-        conflicts = conflicts.values_list('section1__id', 'section2__id')
+        section_ids = ids
+
+    if id is None and not ids and not crns:
+        pairs = SectionConflict.objects.values_list('section1__' + field, 'section2__' + field).iterator()
+        conflicts = (pair for s1, s2 in pairs for pair in ((s1, s2), (s2, s1)))
+    elif field == 'id':
+        conflicts = conflicts_of(section_ids)
+    else:
+        conflicts = SectionConflict.objects.conflicts_of(section_ids, field)
 
-    mapping = {}
-    for s1, s2 in conflicts:
-        mapping.setdefault(s1, set()).add(s2)
-        mapping.setdefault(s2, set()).add(s1)
     if id is not None:
         return {
             'context': {
                 'id': int(id),
-                'conflicts': list(mapping[int(id)])
+                'conflicts': list(set(s2 for s1, s2 in conflicts)),
             }
         }
 
+    mapping = {}
+    for s1, s2 in conflicts:
+        mapping.setdefault(s1, set()).add(s2)
     collection = []
-    ids = set(int_list(params.getlist('id')))
     for section_id, conflicts in mapping.items():
-        if len(ids) > 0 and section_id not in ids:
-            continue
         collection.append({
             'id': section_id,
             'conflicts': list(conflicts),
@@ -269,6 +501,71 @@ def section_conflicts(request, id=None, version=None, ext=None):
     return {'context': collection}
 
 
+def get_semester_param(params):
+    "Returns the visible semester of the semester_id param, or the latest one."
+    semesters = models.Semester.visible_objects.optional_filter(id=try_int(params.get('semester_id'), default=None))
+    if not semesters.exists():
+        raise decorators.AlternativeResponse(HttpResponseBadRequest('{}'))
+    return semesters[0]
+
+
+def get_time_windows_param(params, key):
+    "Returns the TimeRanges of the comma separated time windows of the param (eg - Tuesday_10:00-12:00)."
+    return [parse_time_window(window) for value in params.getlist(key) for window in value.split(',') if window]
+
+
+@csrf_exempt
+@render()
+def free_sections(request, version=None, ext=None):
+    params = RequestParams(request)
+    semester = get_semester_param(params)
+    try:
+        free = get_time_windows_param(params, 'free') or None
+        # blocked times, in the same format as SavedSelection.blocked_times
+        busy = get_time_windows_param(params, 'busy') + parse_blocked_times(params.get('blocked_times', '').split(','))
+    except ValueError:
+        raise decorators.AlternativeResponse(HttpResponseBadRequest('{}'))
+
+    # the times of the selected sections are busy too.
+    selected_ids = int_list(params.getlist('section_id'))
+    busy.extend(
+        TimeRange(period.start, period.end, period.days_of_week_flag)
+        for period in models.Period.objects.filter(sections__id__in=selected_ids).distinct()
+        if not period.is_to_be_announced
+    )
+    if free is None and not busy:
+        raise decorators.AlternativeResponse(HttpResponseBadRequest('{}'))
+
+    index = get_section_time_index(semester)
+    section_ids = index.find_sections(free, busy) - set(selected_ids)
+    return {
+        'context': {
+            'semester_id': semester.id,
+            'section_ids': sorted(section_ids),
+            'course_ids': sorted(set(index.course_ids[section_id] for section_id in section_ids)),
+        }
+    }
+
+
+@csrf_exempt
+@render()
+def free_rooms(request, version=None, ext=None):
+    params = RequestParams(request)
+    semester = get_semester_param(params)
+    try:
+        windows = get_time_windows_param(params, 'time')
+    except ValueError:
+        windows = None
+    if not windows:
+        raise decorators.AlternativeResponse(HttpResponseBadRequest('{}'))
+    return {
+        'context': {
+            'semester_id': semester.id,
+            'locations': get_room_occupancy(semester).free_rooms(windows),
+        }
+    }
+
+
 @csrf_exempt
 @render()
 def schedules(request, id=None, version=None):
@@ -280,7 +577,6 @@ def schedules(request, id=None, version=None):
     else:
         section_ids = int_list(params.getlist('section_id'))
 
-    created = False
     if not selection:
         selection, created = Selection.objects.get_or_create(
             section_ids=section_ids)
@@ -288,18 +584,71 @@ def schedules(request, id=None, version=None):
     sections = SectionProxy.objects.filter(id__in=section_ids) \
         .select_related('course').prefetch_periods()
     selected_courses = dict_by_attr(sections, 'course')
-    conflict_cache = ConflictCache(
-        SectionConflict.objects.as_dictionary([s.id for s in sections]))
+
+    # blocked times, in the same format as SavedSelection.blocked_times
+    try:
+        excluded_times = parse_blocked_times(params.get('blocked_times', '').split(','))
+    except ValueError:
+        raise decorators.AlternativeResponse(
+            HttpResponseBadRequest('{}')
+        )
 
     # if check flag given, return only if we have a schedule or not.
     if params.get('check'):
-        return {'context': has_schedule(selected_courses, conflict_cache)}
+        return {'context': has_schedule(selected_courses, excluded_times=excluded_times)}
+
+    # only the best schedules, ranked by the given costs.
+    rank_by = params.get('rank_by')
+    if rank_by:
+        try:
+            top = int(params.get('top') or SCHEDULE_LIMIT)
+            if top < 1:
+                raise ValueError('top must be positive')
+            result = rank_schedules(
+                selected_courses,
+                rank_by,
+                top=min(top, SCHEDULE_LIMIT),
+                timeout=SCHEDULE_TIMEOUT,
+                excluded_times=excluded_times)
+        except ValueError:
+            raise decorators.AlternativeResponse(
+                HttpResponseBadRequest('{}')
+            )
+        result['id'] = selection.id
+        return {'context': result}
+
+    # paginated schedules, resumed from the cursor of the previous page.
+    cursor, limit = params.get('cursor'), params.get('limit')
+    paginated = bool(cursor or limit)
+    # the cache only holds the schedules of the selection without blocked times.
+    cachable = not paginated and not excluded_times
 
     # check the cache
-    if not created and selection.api_cache:
-        return {'context': json.loads(selection.api_cache)}
+    if cachable:
+        result_key = SCHEDULE_RESULTS.key_of(sections)
+        context = SCHEDULE_RESULTS.get(result_key)
+        if context is not None:
+            return {'context': dict(context, id=selection.id)}
+
+    try:
+        limit = int(limit) if limit else SCHEDULE_LIMIT
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        result = search_schedules(
+            selected_courses,
+            limit=min(limit, SCHEDULE_LIMIT),
+            timeout=SCHEDULE_TIMEOUT,
+            cursor=cursor,
+            excluded_times=excluded_times,
+            store=SCHEDULE_STORE)
+    except ValueError:  # includes InvalidCursor
+        raise decorators.AlternativeResponse(
+            HttpResponseBadRequest('{}')
+        )
 
-    schedules = compute_schedules(selected_courses, conflict_cache)
+    if paginated:
+        result['id'] = selection.id
+        return {'context': result}
 
     periods = set(p for s in sections for p in s.get_periods())
     timerange, dow_used = period_stats(periods)
@@ -307,7 +656,12 @@ def schedules(request, id=None, version=None):
     # note: if you change this, caches will have to be updated somehow
     context = {
         'time_range': timerange,
-        'schedules': schedules,
+        'schedules': result['schedules'],
+        'truncated': result['truncated'],
+        'next_cursor': result['next_cursor'],
+        'schedule_count': count_schedules(
+            selected_courses, limit=SCHEDULE_COUNT_LIMIT, excluded_times=excluded_times),
+        'blocked_course_ids': result['blocked_course_ids'],
         'course_ids': list(set(
             c.id for c in selected_courses.keys())),
         'section_ids': list(set(
@@ -319,9 +673,11 @@ def schedules(request, id=None, version=None):
         'id': selection.id,
     }
 
-    selection.api_cache = json.dumps(context)
-    selection.save()
+    # a search that ran out of time may find more schedules on the next request.
+    if cachable and not result['stats']['timed_out']:
+        SCHEDULE_RESULTS.set(result_key, context)
 
+    context['stats'] = result['stats']
     return {'context': context}
 
 
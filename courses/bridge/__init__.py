@@ -1,5 +1,7 @@
 from django.utils.importlib import import_module
 
+from courses.signals import courses_imported
+
 
 def import_courses(*args, **kwargs):
     "Runs the course importer specified in settings.py"
@@ -11,3 +13,4 @@ def import_courses(*args, **kwargs):
         module, funcname = settings.COURSES_COLLEGE_PARSER.rsplit('.', 1)
         mod = import_module(module)
         getattr(mod, funcname)(*args, **kwargs)
+    courses_imported.send(sender=import_courses)
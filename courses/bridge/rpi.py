@@ -85,12 +85,24 @@ class ROCSRPIImporter(object):
         if len(self.semesters) > 0:
             self.latest_semester = max(self.semesters.values())
 
-        self.sections_changed = False
+        self.modified_section_ids = set()
         self.SectionPeriod = Synchronizer(SectionPeriod, SectionPeriod.objects.values_list('id', flat=True))
 
     def clear_unused(self, semester):
+        # sections losing periods are modified too.
+        self.modified_section_ids.update(
+            SectionPeriod.objects.filter(semester=semester)
+            .exclude(id__in=self.SectionPeriod.ids_used)
+            .values_list('section_id', flat=True)
+        )
         self.SectionPeriod.trim(semester=semester)
 
+    def notify_modified_sections(self, semester):
+        "Sends sections_modified for the sections whose periods changed since the last import, if any."
+        if self.modified_section_ids:
+            sections_modified.send(sender=self, semester=semester, section_ids=sorted(self.modified_section_ids))
+        self.modified_section_ids = set()
+
     def sync(self, get_files=None, get_catalog=None):
         "Performs the updating of the database data from RPI's SIS"
         if get_files is None:
@@ -134,10 +146,9 @@ class ROCSRPIImporter(object):
                     self.notifier.requires_notification()
                 else:
                     logger.debug(' EXISTS SEMESTER ' + repr(semester_obj))
-                if self.sections_changed:
-                    sections_modified.send(sender=self, semester=semester_obj)
 
                 self.clear_unused(semester_obj)
+                self.notify_modified_sections(semester_obj)
 
     def create_courses(self, catalog, semester_obj):
         "Inserts all the course data, including section information, into the database from the catalog."
@@ -226,14 +237,14 @@ class ROCSRPIImporter(object):
             )
 
             if not created:
+                if section_obj.course_id != course_obj.id:
+                    self.modified_section_ids.add(section_obj.id)
                 section_obj.number = section.num
                 section_obj.seats_taken = section.seats_taken
                 section_obj.seats_total = section.seats_total
                 section_obj.course = course_obj
                 section_obj.notes = '\n'.join(section.notes)
                 section_obj.save()
-            else:
-                self.sections_changed = False
 
             self.create_timeperiods(semester_obj, section, section_obj)
 
@@ -277,7 +288,9 @@ class ROCSRPIImporter(object):
                     kind=period.type,
                 )
             )
-            if not created:
+            if created:
+                self.modified_section_ids.add(section_obj.id)
+            else:
                 sectionperiod_obj.instructor = period.instructor
                 sectionperiod_obj.location = period.location
                 sectionperiod_obj.kind = period.type
@@ -372,10 +385,9 @@ class SISRPIImporter(ROCSRPIImporter):
                     self.notifier.requires_notification()
                 else:
                     logger.debug(' EXISTS SEMESTER ' + repr(semester_obj))
-                if self.sections_changed:
-                    sections_modified.send(sender=self, semester=semester_obj)
 
                 self.clear_unused(semester_obj)
+                self.notify_modified_sections(semester_obj)
 
 
 def remove_prereq_notes(section):
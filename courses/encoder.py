@@ -79,6 +79,7 @@ class CoursesEncoderDelegate(object):
             del obj['id']
         if isinstance(model, models.Semester):
             del obj['visible']
+            del obj['data_updated']
         return obj
 
 
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_auto_20150429_0304'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='semester',
+            name='data_updated',
+            field=models.DateTimeField(help_text="When the periods or conflicts of the semester's sections last changed.", null=True, blank=True),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from itertools import product
+import threading
 
 from django.db import models
 from django.conf import settings
@@ -17,7 +17,7 @@ WARN_EXTRA_QUERIES = getattr(settings, 'COURSES_WARN_EXTRA_QUERIES', DEBUG)
 
 __all__ = [
     'Department', 'Semester', 'Period', 'Section', 'SectionCrosslisting',
-    'Course', 'OfferedFor', 'SectionPeriod'
+    'Course', 'OfferedFor', 'SectionPeriod', 'PeriodConflicts', 'period_conflicts'
 ]
 
 
@@ -59,6 +59,7 @@ class Semester(models.Model):
     ref = models.CharField(max_length=150, help_text="Internally used by bridge module to refer to a semester.", unique=True)
     date_updated = models.DateTimeField(auto_now=True)
     date_created = models.DateTimeField(auto_now_add=True)
+    data_updated = models.DateTimeField(null=True, blank=True, help_text="When the periods or conflicts of the semester's sections last changed.")
     visible = models.BooleanField(default=True, help_text="Should this semester be publicly visible?")
 
     objects = managers.QuerySetManager(managers.SerializableQuerySet)
@@ -76,6 +77,11 @@ class Semester(models.Model):
     def __repr__(self):
         return "<Semester: %d-%d @ %r>" % (self.year, self.month, self.ref)
 
+    @property
+    def data_version(self):
+        "The last time the semester, or the periods and conflicts of its sections, changed."
+        return max(self.date_updated, self.data_updated or self.date_updated)
+
     def toJSON(self, select_related=()):
         json = {
             'id': self.id,
@@ -200,6 +206,103 @@ class Period(models.Model):
         return (self.start, self.end, self.days_of_week_flag)
 
 
+class PeriodConflicts(object):
+    """The table of the ids of the periods conflicting with each period (including itself).
+
+    Periods are unique by their times, so there are far fewer of them than sections, and
+    they never change once created. The table is built once and only rebuilt when asked
+    for a period it doesn't know about yet. The ids still unknown after a rebuild (eg -
+    of deleted periods) are remembered as misses, so they don't rebuild it again.
+    """
+    def __init__(self):
+        self.table = {}
+        self.misses = frozenset()
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return "<PeriodConflicts: %d periods>" % len(self.table)
+
+    def get(self, period_id):
+        "Returns the frozenset of ids of the periods conflicting with the given one, or None if it doesn't exist."
+        if period_id is not None and period_id not in self.table and period_id not in self.misses:
+            with self.lock:
+                # another thread may have rebuilt it while waiting.
+                if period_id not in self.table and period_id not in self.misses:
+                    self.rebuild()
+                    if period_id not in self.table:
+                        self.misses = self.misses | frozenset([period_id])
+        return self.table.get(period_id)
+
+    def rebuild(self):
+        self.table, self.misses = self.compute(Period.objects.all()), frozenset()
+
+    def clear(self):
+        "Forgets all the periods, so the table is rebuilt on the next lookup."
+        self.table, self.misses = {}, frozenset()
+
+    @staticmethod
+    def compute(periods):
+        """Returns the table of the given periods.
+
+        Sweeps the periods of each day in order of their start time, so only the periods
+        that overlap are ever compared. Periods with a reversed time range are compared to
+        every period with Period.conflicts_with instead, and periods to be announced only
+        conflict with themselves.
+        """
+        periods = list(periods)
+        periods_to_be_announced = [p for p in periods if p.is_to_be_announced]
+        periods = [p for p in periods if not p.is_to_be_announced]
+        conflicts = dict((period.id, set([period.id])) for period in periods)
+        irregular = [p for p in periods if p.start > p.end]
+        irregular_ids = set(p.id for p in irregular)
+        for day, name in Period.DAYS_OF_WEEK:
+            ongoing = []
+            for period in sorted((p for p in periods if p.is_on_day(day) and p.id not in irregular_ids),
+                                 key=lambda p: (p.start, p.end, p.id)):
+                ongoing = [other for other in ongoing if other.end >= period.start]
+                for other in ongoing:
+                    conflicts[period.id].add(other.id)
+                    conflicts[other.id].add(period.id)
+                ongoing.append(period)
+        for period1 in irregular:
+            for period2 in periods:
+                if period1.conflicts_with(period2):
+                    conflicts[period1.id].add(period2.id)
+                    conflicts[period2.id].add(period1.id)
+        table = dict((period_id, frozenset(ids)) for period_id, ids in conflicts.items())
+        table.update((p.id, frozenset([p.id])) for p in periods_to_be_announced)
+        return table
+
+    def periods_conflict(self, periods1, periods2):
+        """Returns True if any of the given periods conflict. Periods unknown to the table
+        (eg - unsaved ones) are compared with Period.conflicts_with.
+        """
+        known_ids, unknown = set(), []
+        for period in periods2:
+            if self.get(period.id) is None:
+                unknown.append(period)
+            else:
+                known_ids.add(period.id)
+        for period1 in periods1:
+            conflicting_ids = self.get(period1.id)
+            if conflicting_ids is None:
+                if any(period1 == period2 or period1.conflicts_with(period2) for period2 in periods2):
+                    return True
+            elif not conflicting_ids.isdisjoint(known_ids) or any(
+                    period1 == period2 or period1.conflicts_with(period2) for period2 in unknown):
+                return True
+        return False
+
+# shared by the whole process. Other processes' new periods are picked up by their unknown ids.
+period_conflicts = PeriodConflicts()
+
+
+def clear_period_conflicts(sender, **kwargs):
+    period_conflicts.clear()
+models.signals.post_save.connect(clear_period_conflicts, sender=Period, dispatch_uid='courses.clear_period_conflicts')
+models.signals.post_delete.connect(clear_period_conflicts, sender=Period, dispatch_uid='courses.clear_period_conflicts')
+
+
 class SectionCrosslisting(models.Model):
     """Interface for courses that are crosslisted. Crosslisted sections are similar to each other.
 
@@ -303,10 +406,7 @@ class Section(models.Model):
         if hasattr(self, 'conflicts'):
             return section.id in self.conflicts
         # END ---
-        for period1, period2 in product(self.get_periods(), section.get_periods()):
-            if period1 == period2 or period1.conflicts_with(period2):
-                return True
-        return False
+        return period_conflicts.periods_conflict(self.get_periods(), section.get_periods())
 
 
 class Course(models.Model):
@@ -341,8 +441,8 @@ class Course(models.Model):
 
     def conflicts_with(self, course):
         "Returns True if the provided course conflicts with this one on time periods."
-        sections = course.sections.all()
-        for section1 in self.sections.all():
+        sections = course.sections.prefetch_related('periods')
+        for section1 in self.sections.prefetch_related('periods'):
             for section2 in sections:
                 if section1.conflicts_with(section2):
                     return True
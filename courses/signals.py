@@ -3,4 +3,7 @@ from django.dispatch import Signal
 
 # when robots.txt data is being generated by the manage.py sync_robots_data
 robots_signal = Signal(providing_args=['semester', 'rule'])
-sections_modified = Signal(providing_args=['semester'])
+# when an import added, removed or changed the periods of sections (or moved them to another course)
+sections_modified = Signal(providing_args=['semester', 'section_ids'])
+# when an import finished and its data was committed
+courses_imported = Signal(providing_args=[])
@@ -144,6 +144,48 @@ class TBAPeriodTest(TestCase):
         self.assertTrue(self.period.is_to_be_announced)
 
 
+class PeriodConflictsTest(TestCase):
+    def setUp(self):
+        def period(start, end, days):
+            return PeriodFactory.create(start=start and datetime.time(*start), end=end and datetime.time(*end), days_of_week_flag=days)
+        self.periods = [
+            period((10, 0), (10, 50), models.Period.MONDAY | models.Period.WEDNESDAY),
+            period((10, 50), (11, 40), models.Period.MONDAY),
+            period((11, 0), (11, 50), models.Period.WEDNESDAY),
+            period((9, 0), (12, 0), models.Period.TUESDAY),
+            period((10, 0), (10, 50), models.Period.TUESDAY | models.Period.THURSDAY),
+            period(None, None, models.Period.MONDAY),
+            period((12, 0), (12, 50), 0),
+        ]
+
+    def test_matches_period_conflicts_with(self):
+        table = models.PeriodConflicts.compute(self.periods)
+        periods = [period for period in self.periods if not period.is_to_be_announced]
+        for period1 in periods:
+            expected = frozenset(period2.id for period2 in periods if period1.conflicts_with(period2))
+            self.assertEqual(expected, table[period1.id])
+
+    def test_periods_to_be_announced_only_conflict_with_themselves(self):
+        table = models.PeriodConflicts.compute(self.periods)
+        self.assertEqual(frozenset([self.periods[5].id]), table[self.periods[5].id])
+
+    def test_rebuilds_for_new_periods(self):
+        period_conflicts = models.PeriodConflicts()
+        self.assertEqual(frozenset([self.periods[0].id, self.periods[1].id]),
+                         period_conflicts.get(self.periods[0].id))
+        period = PeriodFactory.create(start=datetime.time(8), end=datetime.time(10), days_of_week_flag=models.Period.MONDAY)
+        self.assertTrue(self.periods[0].id in period_conflicts.get(period.id))
+        self.assertEqual(None, period_conflicts.get(period.id + 1))
+
+    def test_rebuilds_once_for_missing_periods(self):
+        period_conflicts = models.PeriodConflicts()
+        missing_id = max(period.id for period in self.periods) + 1
+        with self.assertNumQueries(1):
+            self.assertEqual(None, period_conflicts.get(missing_id))
+            self.assertEqual(None, period_conflicts.get(missing_id))
+            self.assertNotEqual(None, period_conflicts.get(self.periods[0].id))
+
+
 class SectionTest(TestCase):
     def test_to_json(self):
         section = SectionFactory.create(
@@ -26,9 +26,10 @@ class ShortcutTestCase(TestCase):
     def json_get(self, *args, **kwargs):
         prefix = kwargs.pop('prefix', '')
         response = self.get(*args, **kwargs)
-        self.assertTrue(response.content.startswith(prefix))
+        content = self.content(response)
+        self.assertTrue(content.startswith(prefix))
         try:
-            return loads(response.content[len(prefix):])
+            return loads(content[len(prefix):])
         except:
             print "Got:", response
             raise
@@ -58,6 +59,12 @@ class ShortcutTestCase(TestCase):
             print "Got:", response
             raise
 
+    def content(self, response):
+        "Returns the content of the response, reading it if it is streamed."
+        if response.streaming:
+            return ''.join(response.streaming_content)
+        return response.content
+
     def _process_headers(self, kwargs):
         headers = {}
         for key, value in kwargs.items():
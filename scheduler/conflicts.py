@@ -0,0 +1,190 @@
+"""Packed conflict matrices of semesters.
+
+The conflicts of a semester are stored in a file as a compressed sparse row matrix:
+the sorted ids of the sections with conflicts, the offsets of each section's row, and
+the ids of the sections each one conflicts with. Each process loads a semester's file
+once (and again when it changes), so looking up the conflicts of sections doesn't
+query the conflicts in the database.
+"""
+import os
+import struct
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+
+__all__ = ['ConflictMatrix', 'save_conflict_matrix', 'load_conflict_matrix', 'conflicts_of']
+
+CONFLICTS_DIR = getattr(settings, 'SCHEDULER_CONFLICTS_DIR', None)
+
+
+class ConflictMatrix(object):
+    """The symmetric conflicts between sections.
+
+    ``section_ids``: The sorted ids of the sections with conflicts.
+    ``offsets``: The conflicts of section_ids[i] are neighbours[offsets[i]:offsets[i + 1]].
+    ``neighbours``: The sorted ids of the conflicting sections of each section.
+    """
+    MAGIC = 'YACSCONF'
+    VERSION = 1
+    HEADER = struct.Struct('<8sIII')
+
+    def __init__(self, section_ids, offsets, neighbours):
+        self.section_ids = section_ids
+        self.offsets = offsets
+        self.neighbours = neighbours
+
+    def __repr__(self):
+        return "<ConflictMatrix: %d sections, %d conflicts>" % (len(self.section_ids), len(self.neighbours) // 2)
+
+    def __len__(self):
+        return len(self.section_ids)
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        "Returns the matrix of the given (section1 id, section2 id) conflicts."
+        rows = {}
+        for section1_id, section2_id in pairs:
+            rows.setdefault(section1_id, set()).add(section2_id)
+            rows.setdefault(section2_id, set()).add(section1_id)
+        section_ids, offsets, neighbours = array('i'), array('I', [0]), array('i')
+        for section_id in sorted(rows):
+            section_ids.append(section_id)
+            neighbours.extend(sorted(rows[section_id]))
+            offsets.append(len(neighbours))
+        return cls(section_ids, offsets, neighbours)
+
+    @classmethod
+    def from_string(cls, data):
+        "Returns the matrix serialized by to_string(). Raises ValueError for invalid data."
+        if len(data) < cls.HEADER.size:
+            raise ValueError('Invalid conflict matrix.')
+        magic, version, size, count = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError('Invalid conflict matrix.')
+        arrays, position = [], cls.HEADER.size
+        for typecode, length in (('i', size), ('I', size + 1), ('i', count)):
+            values = array(typecode)
+            end = position + length * values.itemsize
+            values.fromstring(data[position:end])
+            if len(values) != length:
+                raise ValueError('Invalid conflict matrix.')
+            arrays.append(values)
+            position = end
+        return cls(*arrays)
+
+    def to_string(self):
+        "Returns the matrix as a string of bytes."
+        return ''.join([
+            self.HEADER.pack(self.MAGIC, self.VERSION, len(self.section_ids), len(self.neighbours)),
+            self.section_ids.tostring(),
+            self.offsets.tostring(),
+            self.neighbours.tostring(),
+        ])
+
+    def conflicts_of(self, section_id):
+        "Returns the ids of the sections conflicting with the given one, in order."
+        index = bisect_left(self.section_ids, section_id)
+        if index == len(self.section_ids) or self.section_ids[index] != section_id:
+            return self.neighbours[0:0]
+        return self.neighbours[self.offsets[index]:self.offsets[index + 1]]
+
+    def as_dictionary(self, section_ids):
+        """Returns a dictionary of section id to a frozenset of the ids of the sections
+        conflicting with it, among the given sections.
+
+        Like SectionConflictManager.as_dictionary, sections without conflicts among the
+        given ones are left out.
+        """
+        section_ids = frozenset(section_ids)
+        result = {}
+        for section_id in section_ids:
+            conflicts = section_ids.intersection(self.conflicts_of(section_id))
+            if conflicts:
+                result[section_id] = conflicts
+        return result
+
+
+def matrix_path(year, month, directory=None):
+    return os.path.join(directory or CONFLICTS_DIR, '%d-%d.conflicts' % (year, month))
+
+
+def save_conflict_matrix(semester, pairs, directory=None):
+    """Writes the conflict matrix of the given (section1 id, section2 id) pairs for the
+    semester. Does nothing if no SCHEDULER_CONFLICTS_DIR is set.
+    """
+    directory = directory or CONFLICTS_DIR
+    if not directory:
+        return
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    # replace the file at once, so processes never read a partial matrix.
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as handle:
+        handle.write(ConflictMatrix.from_pairs(pairs).to_string())
+    os.rename(tmp_path, matrix_path(semester.year, semester.month, directory))
+
+
+_matrices = {}  # path => ((modification time, inode), matrix)
+_matrices_lock = threading.Lock()
+
+
+def load_conflict_matrix(year, month, directory=None):
+    """Returns the conflict matrix of the semester, or None if there is none.
+
+    The matrix is only read again when its file changed since it was last loaded.
+    """
+    directory = directory or CONFLICTS_DIR
+    if not directory:
+        return None
+    path = matrix_path(year, month, directory)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    version = (stat.st_mtime, stat.st_ino)
+    with _matrices_lock:
+        loaded = _matrices.get(path)
+        if loaded is None or loaded[0] != version:
+            try:
+                with open(path, 'rb') as handle:
+                    loaded = _matrices[path] = (version, ConflictMatrix.from_string(handle.read()))
+            except (IOError, ValueError):
+                return None
+        return loaded[1]
+
+
+def conflicts_of(section_ids, batch_size=500):
+    """Yields the (section id, conflicting section id) pairs of the given sections.
+
+    The conflicts of the sections of semesters with a conflict matrix are read from it,
+    only the semesters of the sections are queried. The others are looked up in the
+    database (see SectionConflictManager.conflicts_of).
+    """
+    from courses.models import Section
+    from scheduler.models import SectionConflict
+    if not CONFLICTS_DIR:
+        for pair in SectionConflict.objects.conflicts_of(section_ids, batch_size=batch_size):
+            yield pair
+        return
+    section_ids = list(section_ids)
+    missing = []
+    for i in range(0, len(section_ids), batch_size):
+        semesters = {}
+        sections = Section.objects.filter(id__in=section_ids[i:i + batch_size]) \
+            .values_list('id', 'semester__year', 'semester__month')
+        for section_id, year, month in sections.iterator():
+            semesters.setdefault((year, month), []).append(section_id)
+        for (year, month), ids in sorted(semesters.items()):
+            matrix = load_conflict_matrix(year, month)
+            if matrix is None:
+                missing.extend(ids)
+                continue
+            for section_id in ids:
+                for conflict_id in matrix.conflicts_of(section_id):
+                    yield section_id, conflict_id
+    for pair in SectionConflict.objects.conflicts_of(missing, batch_size=batch_size):
+        yield pair
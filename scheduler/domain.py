@@ -1,54 +1,135 @@
-from pyconstraints import is_nil
-
 from courses.utils import DAYS, sorted_daysofweek
 
-from scheduler.scheduling import compute_schedules as _compute_schedules
+from scheduler.scheduling import (
+    compute_schedules as _compute_schedules, count_schedules as _count_schedules,
+    compute_schedules_page as _compute_schedules_page, search_schedules as _search_schedules,
+    rank_schedules as _rank_schedules
+)
+from scheduler.store import ScheduleStore
 
 
-class ConflictCache(object):
-    _EMPTY_SET = frozenset()
+def has_schedule(selected_courses, section_constraint=None, excluded_times=()):
+    """Returns True if there is at least one schedule for the given courses.
 
-    def __init__(self, conflict_mapping):
-        self.conflict_mapping = conflict_mapping
+    Conflicts are determined from the section periods, ``section_constraint`` is only
+    kept for compatibility with older callers. The schedules are counted up to one
+    instead of searched for, which stays fast when there are none.
+    """
+    return count_schedules(selected_courses, limit=1, excluded_times=excluded_times) > 0
 
-    def __repr__(self):
-        return "<ConflictCache: %r>" % self.conflict_mapping
 
-    def __key__(self, section_id):
-        return self.conflict_mapping.get(section_id, self._EMPTY_SET)
+def count_schedules(selected_courses, limit=None, excluded_times=()):
+    """Returns the number of schedules for the given courses, without computing them.
 
-    def __call__(self, section1, section2):
-        if is_nil(section1) or is_nil(section2):
-            return True
-        self.section_conflicts(section1.id, section2.id)
+    If limit is given, the count stops at the limit.
+    """
+    return _count_schedules(
+        selected_courses,
+        excluded_times=excluded_times,
+        free_sections_only=False,
+        limit=limit)
 
-    def section_conflicts(self, section1_id, section2_id):
-        return (
-            section2_id in self[section1_id] or
-            section1_id in self[section2_id]
-        )
 
+def compute_schedules(selected_courses, section_constraint=None):
+    """Returns the schedules in a JSON-friendly format.
 
-def has_schedule(selected_courses, section_constraint=None):
+    Returns a list of dictionary of course id to section ids.
+    """
     schedules = _compute_schedules(
         selected_courses,
         free_sections_only=False,
-        generator=True,
-        section_constraint=section_constraint)
-    for schedule in schedules:
-        return True
-    return False
+        generator=True
+    )
+    return schedules_to_json(schedules)
 
 
-def compute_schedules(selected_courses, section_constraint=None):
-    """Returns the schedules in a JSON-friendly format.
+def compute_schedules_page(selected_courses, limit=None, cursor=None):
+    """Returns a tuple of the schedules in a JSON-friendly format and the cursor to
+    the next page of schedules (or None if there are no more schedules).
 
-    Returns a list of dictionary of course id to crns.
+    Raises scheduler.scheduling.InvalidCursor for cursors of other selections.
     """
-    schedules = _compute_schedules(
+    schedules, next_cursor = _compute_schedules_page(
+        selected_courses,
+        free_sections_only=False,
+        limit=limit,
+        cursor=cursor
+    )
+    return schedules_to_json(schedules), next_cursor
+
+
+def search_schedules(selected_courses, limit=None, timeout=None, cursor=None, excluded_times=(), store=None):
+    """Returns the schedules found within the given limit and timeout (in seconds) in a
+    JSON-friendly format.
+
+    Returns a dictionary of the ``schedules``, if the search was ``truncated``, the
+    ``next_cursor`` to continue it from, the solver ``stats`` and the
+    ``blocked_course_ids`` of the courses without sections outside the excluded times.
+
+    If a ScheduleStore is given, the schedules of the first page without excluded times
+    are looked up or derived from it, and stored once they are complete. Those schedules
+    are sorted by section ids, whether they came from the store or not.
+    """
+    use_store = store is not None and cursor is None and not excluded_times
+    if use_store:
+        versions = store.versions_of(selected_courses)
+        schedules = store.get(selected_courses, versions)
+        if schedules is not None and (limit is None or len(schedules) <= limit):
+            return {
+                'schedules': schedules,
+                'truncated': False,
+                'next_cursor': None,
+                'stats': {'solutions': len(schedules), 'nodes': 0, 'elapsed': 0, 'timed_out': False, 'stored': True},
+                'blocked_course_ids': [],
+            }
+    result = _search_schedules(
         selected_courses,
-        free_sections_only=False
+        excluded_times=excluded_times,
+        free_sections_only=False,
+        limit=limit,
+        timeout=timeout,
+        cursor=cursor
     )
+    schedules = schedules_to_json(result.schedules)
+    if use_store and not result.truncated:
+        store.set(selected_courses, schedules, versions)
+        course_ids = sorted(str(course.id) for course in selected_courses)
+        schedules.sort(key=lambda schedule: tuple(schedule[course_id] for course_id in course_ids))
+    return {
+        'schedules': schedules,
+        'truncated': result.truncated,
+        'next_cursor': result.next_cursor,
+        'stats': result.stats,
+        'blocked_course_ids': [course.id for course in result.blocked_courses],
+    }
+
+
+def rank_schedules(selected_courses, rank_by, top=None, timeout=None, excluded_times=()):
+    """Returns the ``top`` schedules with the lowest cost in a JSON-friendly format.
+
+    Returns a dictionary of the ``schedules``, their ``costs``, if the search was
+    ``truncated``, the solver ``stats`` and the ``blocked_course_ids``. Raises
+    ValueError for unknown costs.
+    """
+    result = _rank_schedules(
+        selected_courses,
+        excluded_times=excluded_times,
+        free_sections_only=False,
+        rank_by=rank_by,
+        top=top,
+        timeout=timeout
+    )
+    return {
+        'schedules': schedules_to_json(result.schedules),
+        'costs': result.costs,
+        'truncated': result.truncated,
+        'stats': result.stats,
+        'blocked_course_ids': [course.id for course in result.blocked_courses],
+    }
+
+
+def schedules_to_json(schedules):
+    "Returns a list of dictionary of course id to section ids."
     results = []
     for schedule in schedules:
         s = {}
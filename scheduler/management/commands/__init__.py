@@ -0,0 +1,18 @@
+from django.core.management.base import CommandError
+
+from courses import models as courses
+
+
+def get_semester(value):
+    "Returns the semester given as YEAR-MONTH by a --semester option, or the latest one if not given."
+    semesters = courses.Semester.objects.all()
+    if value:
+        try:
+            year, month = map(int, value.split('-'))
+        except ValueError:
+            raise CommandError('Semester should be given as YEAR-MONTH.')
+        semesters = semesters.filter(year=year, month=month)
+    try:
+        return semesters[0]
+    except IndexError:
+        raise CommandError('No semester found.')
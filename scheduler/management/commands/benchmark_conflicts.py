@@ -0,0 +1,55 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from courses import models as courses
+from courses.utils import dict_by_attr
+from scheduler import models, overlaps
+from scheduler.management.commands import get_semester
+
+
+class Command(BaseCommand):
+    help = "Times the ways of finding the section conflicts of a semester, without saving them."
+    option_list = BaseCommand.option_list + (
+        make_option('--semester', '-s',
+                    dest='semester',
+                    default=None,
+                    help='The semester to use, as YEAR-MONTH. Defaults to the latest one.'),
+        make_option('--repeat', '-r',
+                    dest='repeat',
+                    type='int',
+                    default=3,
+                    help='The number of times to run each method. The fastest run is reported.'),
+    )
+
+    def run(self, name, find_conflicts, section_courses, repeat, before=None):
+        timings = []
+        for i in range(repeat):
+            if before:
+                before()
+            started_at = time.time()
+            conflicts = find_conflicts(section_courses)
+            timings.append(time.time() - started_at)
+        self.stdout.write('%-10s %10.3fs %10d conflicts' % (name, min(timings), len(conflicts)))
+        return [(section1.id, section2.id) for section1, section2 in conflicts]
+
+    def handle(self, *args, **options):
+        semester = get_semester(options.get('semester'))
+        repeat = max(1, options.get('repeat') or 1)
+        sections = courses.Section.objects.select_related('course', 'semester') \
+            .by_semester(semester).prefetch_periods()
+        section_courses = dict_by_attr(sections, 'course')
+        self.stdout.write('%s: %d courses, %d sections' % (semester, len(section_courses), len(sections)))
+
+        expected = self.run('reference', models.find_section_conflicts_reference, section_courses, repeat)
+        # include building the table of conflicting periods.
+        results = [self.run('table', models.find_section_conflicts, section_courses, repeat,
+                            before=courses.period_conflicts.clear)]
+        if overlaps.HAS_NUMPY:
+            results.append(self.run('numpy', overlaps.find_section_conflicts, section_courses, repeat))
+        else:
+            self.stdout.write('numpy      skipped, NumPy is not installed.')
+
+        if any(result != expected for result in results):
+            raise CommandError('The conflicts found differ from the reference.')
@@ -1,15 +1,11 @@
-from optparse import make_option
-
 from django.core.management.base import BaseCommand
-from django.db import transaction
 
-from scheduler import models
+from scheduler.tasks import clear_selection_cache
 
 
 class Command(BaseCommand):
-    help = "Removes all caches on Selection model"
+    help = "Removes the cached schedules API results and the stored schedules"
     option_list = BaseCommand.option_list
 
     def handle(self, *args, **options):
-        with transaction.atomic():
-            models.Selection.objects.all().update(api_cache='')
+        clear_selection_cache()
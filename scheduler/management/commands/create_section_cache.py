@@ -20,8 +20,32 @@ class Command(BaseCommand):
                     action='store_false',
                     default=True,
                     help='Use manual SQL Insertion instead of Django objects to insert conflicts.'),
+        make_option('--reference', '-r',
+                    dest='reference',
+                    action='store_true',
+                    default=False,
+                    help='Compare every period of every pair of sections. Slower, used for verification.'),
+        make_option('--numpy', '-n',
+                    dest='vectorized',
+                    action='store_true',
+                    default=False,
+                    help='Compare the periods of all sections in blocks with NumPy. Requires NumPy.'),
+        make_option('--processes', '-p',
+                    dest='processes',
+                    type='int',
+                    default=None,
+                    help='Number of semesters to compute at once. Defaults to the number of CPUs.'),
+        make_option('--resume',
+                    dest='resume',
+                    action='store_true',
+                    default=False,
+                    help='Skip the semesters already computed by an interrupted run.'),
     )
 
     def handle(self, *args, **options):
-        compute_conflicts(all_semester=options.get('all', False),
-                          sql=options.get('sql'))
+        compute_conflicts(all_semesters=options.get('all', False),
+                          sql=options.get('sql'),
+                          reference=options.get('reference', False),
+                          vectorized=options.get('vectorized', False),
+                          processes=options.get('processes'),
+                          resume=options.get('resume', False))
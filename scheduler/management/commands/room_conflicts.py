@@ -0,0 +1,27 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from courses import models as courses
+from scheduler.management.commands import get_semester
+from scheduler.rooms import get_room_occupancy
+
+
+class Command(BaseCommand):
+    help = "Lists the rooms used by more than one section at the same time."
+    option_list = BaseCommand.option_list + (
+        make_option('--semester', '-s',
+                    dest='semester',
+                    default=None,
+                    help='The semester to use, as YEAR-MONTH. Defaults to the latest one.'),
+    )
+
+    def handle(self, *args, **options):
+        semester = get_semester(options.get('semester'))
+        double_bookings = get_room_occupancy(semester).double_bookings()
+        sections = courses.Section.objects.in_bulk(
+            set(b[1] for b in double_bookings) | set(b[2] for b in double_bookings))
+        for location, section1_id, section2_id in double_bookings:
+            self.stdout.write('%s: CRN %s and CRN %s' % (
+                location, sections[section1_id].crn, sections[section2_id].crn))
+        self.stdout.write('%s: %d double-booked rooms' % (semester, len(set(b[0] for b in double_bookings))))
@@ -76,6 +76,23 @@ class SectionConflictManager(Manager):
                 attrs[key] = value
         return self.by(**attrs)
 
+    def conflicts_of(self, section_ids, field='id', batch_size=500):
+        """Yields the (section, conflicting section) pairs of the given ``field`` of the
+        sections conflicting with the given sections.
+
+        Each side of the conflicts is queried separately by its own index, instead of
+        OR-ing them together, so the cost depends on the number of sections given rather
+        than the number of conflicts stored.
+        """
+        section_ids = list(section_ids)
+        for i in range(0, len(section_ids), batch_size):
+            batch = section_ids[i:i + batch_size]
+            for side, other in ((1, 2), (2, 1)):
+                queryset = self.filter(**{'section%d__in' % side: batch}).values_list(
+                    'section%d__%s' % (side, field), 'section%d__%s' % (other, field))
+                for pair in queryset.iterator():
+                    yield pair
+
     def among(self, **attributes):
         format = 'section%d__%s'
         attrs = {}
@@ -1,15 +1,23 @@
 import itertools
+import logging
 
 from django.db import models, transaction, connection
+from django.utils import timezone
 
-from courses.signals import robots_signal
+from courses.signals import robots_signal, sections_modified, courses_imported
 from courses import models as courses
 from courses import managers as courses_managers
-from courses.utils import dict_by_attr, Synchronizer
-from scheduler import managers
+from courses.utils import dict_by_attr
+from scheduler import managers, overlaps
+from scheduler.conflicts import save_conflict_matrix
+from scheduler.results import ScheduleResultCache
+from scheduler.rooms import get_room_occupancy
 from scheduler.utils import slugify, deserialize_numbers, serialize_numbers
 
 
+logger = logging.getLogger(__name__)
+
+
 class SavedSelection(models.Model):
     "Represents a unique set of selected sections and blocked times."
     internal_section_ids = models.CommaSeparatedIntegerField(max_length=1024, db_index=True)
@@ -58,7 +66,6 @@ class Selection(models.Model):
     """Represents a unique set of selected CRNs. It also offers a unique URL for each set.
     """
     internal_section_ids = models.CommaSeparatedIntegerField(max_length=255)
-    api_cache = models.TextField(default='', blank=True)
 
     objects = managers.SelectionManager()
 
@@ -112,72 +119,248 @@ class SectionConflict(models.Model):
 # TODO: move into manager
 
 
-def cache_conflicts(semester_year=None, semester_month=None, semester=None, sql=True, stdout=False):
+def find_section_conflicts(section_courses, section_ids=None):
+    """Returns the sorted list of (section1, section2) pairs of conflicting sections of
+    different courses, where section1 has the lower id. If ``section_ids`` is given, only
+    the conflicts involving those sections are returned.
+
+    Groups the sections by period and looks up the conflicting periods of each one in
+    courses.models.period_conflicts, so only the sections that conflict are ever paired.
+    """
+    conflicts = set()
+
+    def add(section1, section2):
+        if section_ids is not None and section1.id not in section_ids and section2.id not in section_ids:
+            return
+        if section1.course_id != section2.course_id:
+            conflicts.add((section1, section2) if section1.id < section2.id else (section2, section1))
+
+    sections_by_period = {}
+    for sections in section_courses.values():
+        for section in sections:
+            for period in section.get_periods():
+                sections_by_period.setdefault(period.id, set()).add(section)
+
+    for period_id, sections1 in sections_by_period.items():
+        for other_id in courses.period_conflicts.get(period_id) or ():
+            if other_id < period_id or other_id not in sections_by_period:
+                continue
+            for section1 in sections1:
+                for section2 in sections_by_period[other_id]:
+                    add(section1, section2)
+
+    return sorted(conflicts, key=lambda pair: (pair[0].id, pair[1].id))
+
+
+def find_section_conflicts_reference(section_courses):
+    """Same as find_section_conflicts, but compares every period of every pair of sections
+    of different courses with Period.conflicts_with. Used to verify the faster version.
+    """
+    def sections_conflict(section1, section2):
+        return any(
+            period1 == period2 or period1.conflicts_with(period2)
+            for period1, period2 in itertools.product(section1.get_periods(), section2.get_periods())
+        )
+
+    conflicts = []
+    for course1, course2 in itertools.combinations(section_courses.keys(), 2):
+        for section1, section2 in itertools.product(section_courses[course1], section_courses[course2]):
+            if sections_conflict(section1, section2):
+                if section1.id > section2.id:
+                    section1, section2 = section2, section1
+                conflicts.append((section1, section2))
+    return sorted(conflicts, key=lambda pair: (pair[0].id, pair[1].id))
+
+
+def cache_conflicts(semester_year=None, semester_month=None, semester=None, sql=True, stdout=False,
+                    reference=False, vectorized=False):
     assert (semester_year and semester_month) or semester, "Semester year & month must be provided or the semester object."
     import sys
     # trash existing conflict data...
     if not semester:
         semester = courses.Semester.objects.get(year=semester_year, month=semester_month)
 
-    with transaction.atomic():
-        # we don't want to increment IDs too quickly (ev 25 minutes)
-        Syncer = Synchronizer(SectionConflict, SectionConflict.objects.values_list('id', flat=True))
+    def log(msg):
+        sys.stdout.write(msg)
+        sys.stdout.flush()
 
+    with transaction.atomic():
         sections = courses.Section.objects.select_related('course', 'semester') \
             .by_semester(semester).prefetch_periods()
         section_courses = dict_by_attr(sections, 'course')
 
+        if reference:
+            find_conflicts = find_section_conflicts_reference
+        elif vectorized:
+            find_conflicts = overlaps.find_section_conflicts
+        else:
+            find_conflicts = find_section_conflicts
+        pairs = [(section1.id, section2.id) for section1, section2 in find_conflicts(section_courses)]
+
+        sync = sync_section_conflicts if sql else sync_section_conflicts_in_memory
+        added, removed = sync(semester, pairs)
+        log('%d conflicts: %d added, %d removed\n' % (len(pairs), added, removed))
+    semester_data_changed(semester)
+
+
+STAGED_CONFLICTS_TABLE = 'scheduler_staged_conflicts'
+# the number of pairs staged per statement, within SQLite's limit of 999 parameters.
+STAGED_CONFLICTS_CHUNK_SIZE = 400
+
+
+def sync_section_conflicts(semester, pairs, chunk_size=STAGED_CONFLICTS_CHUNK_SIZE):
+    """Replaces the cached conflicts of the semester with the given (section1 id, section2 id)
+    pairs, where section1 has the lower id. Returns the number of added and removed conflicts.
+
+    The pairs are staged in a temporary table with multi-row inserts of ``chunk_size``
+    pairs, then the conflicts are removed and added with one statement each, so only the
+    semester's rows are ever touched.
+
+    The temporary table is emptied before use instead of dropped after it: a failed
+    statement aborts the transaction on PostgreSQL, where the table is dropped on commit
+    (or rollback) anyway.
+    """
+    qn = connection.ops.quote_name
+    table, staged = qn(SectionConflict._meta.db_table), qn(STAGED_CONFLICTS_TABLE)
+    on_commit = ' ON COMMIT DROP' if connection.vendor == 'postgresql' else ''
+    pairs = list(pairs)
+    with transaction.atomic():
+        cursor = connection.cursor()
+        cursor.execute(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS %s (section1_id integer NOT NULL, section2_id integer NOT NULL)%s'
+            % (staged, on_commit))
+        cursor.execute('DELETE FROM %s' % staged)
+        for i in range(0, len(pairs), chunk_size):
+            chunk = pairs[i:i + chunk_size]
+            cursor.execute(
+                'INSERT INTO %s (section1_id, section2_id) VALUES %s' % (staged, ', '.join(['(%s, %s)'] * len(chunk))),
+                list(itertools.chain.from_iterable(chunk)))
+        cursor.execute(
+            'DELETE FROM %(table)s WHERE semester_id = %%s AND NOT EXISTS ('
+            'SELECT 1 FROM %(staged)s s WHERE s.section1_id = %(table)s.section1_id '
+            'AND s.section2_id = %(table)s.section2_id)' % {'table': table, 'staged': staged},
+            [semester.id])
+        removed = cursor.rowcount
+        cursor.execute(
+            'INSERT INTO %(table)s (section1_id, section2_id, semester_id) '
+            'SELECT DISTINCT s.section1_id, s.section2_id, %%s FROM %(staged)s s WHERE NOT EXISTS ('
+            'SELECT 1 FROM %(table)s c WHERE c.semester_id = %%s '
+            'AND c.section1_id = s.section1_id AND c.section2_id = s.section2_id)' % {'table': table, 'staged': staged},
+            [semester.id, semester.id])
+        added = cursor.rowcount
+        cursor.execute('DELETE FROM %s' % staged)
+    return added, removed
+
+
+def sync_section_conflicts_in_memory(semester, pairs):
+    """Same as sync_section_conflicts, but compares the pairs to the semester's conflicts in
+    memory and uses Django objects to add and remove them.
+    """
+    pairs = set(pairs)
+    existing = {}
+    for id, sid1, sid2 in SectionConflict.objects.filter(semester=semester).values_list('id', 'section1', 'section2'):
+        existing[(sid1, sid2)] = id
+    removed_ids = [id for pair, id in existing.items() if pair not in pairs]
+    added = [pair for pair in sorted(pairs) if pair not in existing]
+    with transaction.atomic():
+        for i in range(0, len(removed_ids), 500):
+            SectionConflict.objects.filter(semester=semester, id__in=removed_ids[i:i + 500]).delete()
+        SectionConflict.objects.bulk_create([
+            SectionConflict(section1_id=sid1, section2_id=sid2, semester=semester)
+            for sid1, sid2 in added
+        ], batch_size=500)
+    return len(added), len(removed_ids)
+
+
+def update_section_conflicts(semester, section_ids):
+    """Updates the cached conflicts of the given sections of the semester, without
+    recomputing the conflicts between the other sections.
+    """
+    section_ids = set(section_ids)
+    if not section_ids:
+        return
+    with transaction.atomic():
+        sections = courses.Section.objects.select_related('course', 'semester') \
+            .by_semester(semester).prefetch_periods()
+        conflicts = set(
+            (section1.id, section2.id)
+            for section1, section2 in find_section_conflicts(dict_by_attr(sections, 'course'), section_ids)
+        )
+
+        existing = SectionConflict.objects.filter(semester=semester).filter(
+            models.Q(section1__in=section_ids) | models.Q(section2__in=section_ids))
         mapping = {}
-        for id, sid1, sid2 in SectionConflict.objects.filter(semester=semester).values_list('id', 'section1', 'section2'):
+        for id, sid1, sid2 in existing.values_list('id', 'section1', 'section2'):
             mapping[(sid1, sid2)] = id
 
-        conflicts = []
-
-        def log(msg):
-            sys.stdout.write(msg)
-            sys.stdout.flush()
-
-        def perform_insert(conflicts):
-            SectionConflict.objects.bulk_create(conflicts)
-
-        count = 0
-        for course1, course2 in itertools.combinations(section_courses.keys(), 2):
-            for section1, section2 in itertools.product(section_courses[course1], section_courses[course2]):
-                if section1.conflicts_with(section2):
-                    if section1.id > section2.id:
-                        section1, section2 = section2, section1
-
-                    count += 1
-                    if sql:
-                        if count % 500 == 0:
-                            perform_insert(conflicts)
-                            conflicts = []
-                            log('.')
-                        if (section1.id, section2.id) not in mapping:
-                            log('C')
-                            conflicts.append(
-                                SectionConflict(section1=section1, section2=section2, semester=semester)
-                            )
-                        else:
-                            Syncer.exclude_id(mapping[(section1.id, section2.id)])
-                    else:
-                        log('C')
-                        Syncer.get_or_create(
-                            section1=section1,
-                            section2=section2,
-                            semester=semester,
-                        )
-
-        if sql and conflicts:
-            log('C')
-            perform_insert(conflicts)
-
-        log('\n')
-        Syncer.trim(semester=semester)
-        log('\n')
+        SectionConflict.objects.filter(
+            id__in=[id for pair, id in mapping.items() if pair not in conflicts]
+        ).delete()
+        SectionConflict.objects.bulk_create([
+            SectionConflict(section1_id=sid1, section2_id=sid2, semester=semester)
+            for sid1, sid2 in sorted(conflicts) if (sid1, sid2) not in mapping
+        ])
+    semester_data_changed(semester)
+
+
+def semester_data_changed(semester):
+    """Marks the periods or conflicts of the semester's sections as changed: updates its
+    data_updated, which versions the API responses and time indices of the semester, then
+    publishes the changes (see publish_semester_changes) once they are committed.
+
+    Inside a transaction (eg - of an import), the changes are published by
+    publish_committed_changes when the import commits. Until then, other requests
+    still see the old data, and their results must not be cached as the new data's.
+    """
+    semester.data_updated = timezone.now()
+    # date_updated is left to the importers, which compare it with their sources' dates.
+    courses.Semester.objects.filter(id=semester.id).update(data_updated=semester.data_updated)
+    if connection.in_atomic_block:
+        _uncommitted_semesters[semester.id] = semester
+    else:
+        publish_semester_changes(semester)
+
+
+def save_semester_conflict_matrix(semester):
+    "Writes the conflict matrix of the semester from its cached conflicts."
+    save_conflict_matrix(
+        semester, SectionConflict.objects.filter(semester=semester).values_list('section1', 'section2'))
+
+
+_uncommitted_semesters = {}  # semester id => semester whose data changed in an open transaction
+
+
+def publish_semester_changes(semester):
+    """Writes the conflict matrix of the semester and makes its cached schedule results
+    and stored schedules unreachable. Only call it once the changes are committed, so a
+    rollback never leaves a matrix that doesn't match the database.
+    """
+    save_semester_conflict_matrix(semester)
+    # the cached results and stored schedules of the semester are keyed by its version.
+    ScheduleResultCache().bump_version(semester.id)
+
+
+def publish_committed_changes():
+    "Publishes the changes of the semesters whose data changed in the committed transaction."
+    while _uncommitted_semesters:
+        semester_id, semester = _uncommitted_semesters.popitem()
+        publish_semester_changes(semester)
 
 
 # attach to signals
+def update_conflicts_of_modified_sections(sender, semester, section_ids=(), **kwargs):
+    update_section_conflicts(semester, section_ids)
+    double_bookings = get_room_occupancy(semester, rebuild=True).double_bookings()
+    if double_bookings:
+        logger.warning('%d double-booked rooms in %s' % (len(set(b[0] for b in double_bookings)), semester))
+sections_modified.connect(update_conflicts_of_modified_sections, dispatch_uid='scheduler.update_conflicts_of_modified_sections')
+
+
+def publish_changes_of_import(sender, **kwargs):
+    publish_committed_changes()
+courses_imported.connect(publish_changes_of_import, dispatch_uid='scheduler.publish_changes_of_import')
+
+
 def sitemap_for_scheduler(sender, semester, rule, **kwargs):
     url = sender.get_or_create_url('schedules', year=semester.year, month=semester.month)
     rule.disallowed.add(url)
@@ -0,0 +1,96 @@
+"""Vectorized conflict checks for offline jobs, using NumPy if it is installed.
+
+Every section period of a semester becomes a row of parallel arrays (section id, course
+id, period id, days of the week, start and end minute). Blocks of rows are compared to
+all the following rows at once with broadcasting, using the same rules as
+Period.conflicts_with, and the conflicting section ids come out as arrays.
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+__all__ = ['HAS_NUMPY', 'section_period_arrays', 'find_conflicting_pairs', 'find_section_conflicts']
+
+HAS_NUMPY = numpy is not None
+
+# rows compared at once: a block uses about BLOCK_SIZE * rows bytes per comparison.
+BLOCK_SIZE = 512
+
+
+def minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def section_period_arrays(section_courses):
+    """Returns a dictionary of parallel arrays of all the periods of the sections of the
+    given dictionary of course to sections.
+
+    Periods to be announced get an empty time range, so they only conflict with the
+    same period.
+    """
+    columns = dict((name, []) for name in ('section', 'course', 'period', 'days', 'start', 'end'))
+    for course, sections in section_courses.items():
+        for section in sections:
+            for period in section.get_periods():
+                columns['section'].append(section.id)
+                columns['course'].append(course.id)
+                columns['period'].append(period.id)
+                columns['days'].append(period.days_of_week_flag)
+                if period.is_to_be_announced:
+                    columns['start'].append(-1)
+                    columns['end'].append(-2)
+                else:
+                    columns['start'].append(minutes(period.start))
+                    columns['end'].append(minutes(period.end))
+    return dict((name, numpy.array(values, dtype=numpy.int64)) for name, values in columns.items())
+
+
+def find_conflicting_pairs(arrays, block_size=BLOCK_SIZE):
+    """Returns the (section1 ids, section2 ids) arrays of the conflicting sections of
+    different courses in the given section_period_arrays(), where section1 has the lower
+    id, sorted and without duplicates.
+    """
+    section, course, period = arrays['section'], arrays['course'], arrays['period']
+    days, start, end = arrays['days'], arrays['start'], arrays['end']
+    found1, found2 = [], []
+    for offset in range(0, len(section), block_size):
+        block = slice(offset, offset + block_size)
+        rest = slice(offset, None)
+        start1, end1 = start[block, None], end[block, None]
+        start2, end2 = start[None, rest], end[None, rest]
+        overlap = (
+            ((start1 <= start2) & (start2 <= end1)) |
+            ((start1 <= end2) & (end2 <= end1)) |
+            ((start2 <= start1) & (start1 <= end2)) |
+            ((start2 <= end1) & (end1 <= end2))
+        )
+        conflicts = ((days[block, None] & days[None, rest]) != 0) & overlap
+        conflicts |= period[block, None] == period[None, rest]
+        conflicts &= course[block, None] != course[None, rest]
+        rows, columns = numpy.nonzero(conflicts)
+        sections1, sections2 = section[block][rows], section[rest][columns]
+        found1.append(numpy.minimum(sections1, sections2))
+        found2.append(numpy.maximum(sections1, sections2))
+    if not found1:
+        return numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64)
+    # sort and remove duplicates as single keys, ids fit in 32 bits.
+    keys = numpy.unique((numpy.concatenate(found1) << 32) | numpy.concatenate(found2))
+    return keys >> 32, keys & 0xffffffff
+
+
+def find_section_conflicts(section_courses, block_size=BLOCK_SIZE):
+    """Same as scheduler.models.find_section_conflicts, computed with find_conflicting_pairs.
+
+    Raises ImportError if NumPy is not installed.
+    """
+    if not HAS_NUMPY:
+        raise ImportError('NumPy is required for vectorized conflict checks.')
+    sections = dict(
+        (section.id, section)
+        for section_list in section_courses.values()
+        for section in section_list
+    )
+    sections1, sections2 = find_conflicting_pairs(section_period_arrays(section_courses), block_size)
+    return [(sections[id1], sections[id2]) for id1, id2 in zip(sections1.tolist(), sections2.tolist())]
@@ -0,0 +1,151 @@
+"""Cost functions used to rank schedules.
+
+A cost takes the week mask of a schedule (see scheduler.solver) and returns a number,
+lower is better. The ranking search also asks each cost for a lower bound of the
+partial schedules it visits, so it can skip the branches that cannot beat the best
+schedules found so far.
+"""
+from scheduler.solver import MINUTES_PER_DAY, DAYS_PER_WEEK
+
+
+__all__ = [
+    'Cost', 'FunctionCost', 'LexicographicCost', 'DaysOnCampus', 'EarlyClasses', 'Gaps',
+    'COSTS', 'get_cost',
+]
+
+DAY_MASK = (1 << MINUTES_PER_DAY) - 1
+
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+
+def days_of(mask):
+    "Returns a generator of the masks of each day of the week mask, skipping empty days."
+    for day in range(DAYS_PER_WEEK):
+        day_mask = (mask >> (day * MINUTES_PER_DAY)) & DAY_MASK
+        if day_mask:
+            yield day, day_mask
+
+
+class Cost(object):
+    "The base class of the costs to rank schedules by."
+    def __call__(self, mask):
+        raise NotImplementedError("Please override __call__ method.")
+
+    def lower_bound(self, mask, remaining):
+        """Returns the lowest cost of any schedule that extends the partial schedule
+        ``mask`` with sections that only use bits of ``remaining``.
+
+        Defaults to the cost of the partial schedule, which is correct for costs that
+        never decrease as sections are added.
+        """
+        return self(mask)
+
+
+class FunctionCost(Cost):
+    """Wraps a function of the week mask as a cost.
+
+    Unless ``monotonic`` is True (the cost never decreases as sections are added), no
+    branches of the search can be skipped for it.
+    """
+    def __init__(self, function, monotonic=False):
+        self.function = function
+        self.monotonic = monotonic
+
+    def __repr__(self):
+        return "<FunctionCost: %r>" % self.function
+
+    def __call__(self, mask):
+        return self.function(mask)
+
+    def lower_bound(self, mask, remaining):
+        if self.monotonic:
+            return self.function(mask)
+        return float('-inf')
+
+
+class LexicographicCost(Cost):
+    """Ranks by the first cost, then breaks ties with the following ones.
+
+    The cost is the tuple of the given costs, so the tuple of their lower bounds is a
+    lower bound too.
+    """
+    def __init__(self, costs):
+        self.costs = tuple(costs)
+
+    def __repr__(self):
+        return "<LexicographicCost: %r>" % (self.costs,)
+
+    def __call__(self, mask):
+        return tuple(cost(mask) for cost in self.costs)
+
+    def lower_bound(self, mask, remaining):
+        return tuple(cost.lower_bound(mask, remaining) for cost in self.costs)
+
+
+class DaysOnCampus(Cost):
+    "The number of days with at least one class."
+    def __call__(self, mask):
+        return sum(1 for day in days_of(mask))
+
+
+class EarlyClasses(Cost):
+    "The number of days with a class before the given minute of the day (9am by default)."
+    def __init__(self, before=9 * 60):
+        self.before = before
+        self.early_mask = (1 << before) - 1
+
+    def __call__(self, mask):
+        return sum(1 for day, day_mask in days_of(mask) if day_mask & self.early_mask)
+
+
+class Gaps(Cost):
+    "The number of free minutes between the classes of each day."
+    def day_gaps(self, day_mask):
+        "Returns the mask of the free minutes between the first and last class of the day."
+        first = (day_mask & -day_mask).bit_length() - 1
+        last = day_mask.bit_length()
+        return ((1 << last) - (1 << first)) & ~day_mask
+
+    def __call__(self, mask):
+        return sum(popcount(self.day_gaps(day_mask)) for day, day_mask in days_of(mask))
+
+    def lower_bound(self, mask, remaining):
+        # a free minute between two classes stays a gap unless a later section fills it.
+        minutes = 0
+        for day, day_mask in days_of(mask):
+            fillable = (remaining >> (day * MINUTES_PER_DAY)) & DAY_MASK
+            minutes += popcount(self.day_gaps(day_mask) & ~fillable)
+        return minutes
+
+
+COSTS = {
+    'days': DaysOnCampus(),
+    'early': EarlyClasses(),
+    'gaps': Gaps(),
+}
+
+
+def get_cost(rank_by):
+    """Returns the Cost for the given ranking.
+
+    ``rank_by`` can be a Cost, a function of the week mask, or the names of the costs in
+    COSTS to rank by in order of importance, either as a collection or a comma separated
+    string (eg - 'days,gaps'). Raises ValueError for unknown names.
+    """
+    if isinstance(rank_by, Cost):
+        return rank_by
+    if callable(rank_by):
+        return FunctionCost(rank_by)
+    if isinstance(rank_by, basestring):
+        rank_by = rank_by.split(',')
+    names = [name.strip().lower() for name in rank_by if name.strip()]
+    if not names:
+        raise ValueError('No costs to rank by.')
+    for name in names:
+        if name not in COSTS:
+            raise ValueError('Unknown cost to rank by: %r' % name)
+    if len(names) == 1:
+        return COSTS[names[0]]
+    return LexicographicCost(COSTS[name] for name in names)
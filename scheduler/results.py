@@ -0,0 +1,75 @@
+"""Caches the schedules API results of selections in the Django cache.
+
+Results are keyed by the sorted section ids of the selection and the data version of
+each of their semesters. A semester's version changes whenever its periods or conflicts
+change (see scheduler.models), which makes every result computed from the older data
+unreachable, so nothing ever has to be cleared. Unused results are removed by the
+cache's own eviction and timeout.
+"""
+import hashlib
+import random
+
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+__all__ = ['ScheduleResultCache']
+
+
+class ScheduleResultCache(object):
+    """Stores JSON-friendly results of selections by their sections.
+
+    ``cache``: The Django cache to use. Defaults to the default cache.
+    ``timeout``: The number of seconds to keep results for. Defaults to the cache's timeout.
+    """
+    prefix = 'scheduler:results:'
+    version_prefix = 'scheduler:version:'
+
+    def __init__(self, cache=None, timeout=None):
+        self.cache = cache or default_cache
+        self.timeout = timeout
+
+    def __repr__(self):
+        return "<ScheduleResultCache>"
+
+    def version_key(self, semester_id):
+        return '%s%d' % (self.version_prefix, semester_id)
+
+    def get_versions(self, semester_ids):
+        "Returns a dictionary of semester id to its data version, creating the missing ones."
+        keys = dict((self.version_key(semester_id), semester_id) for semester_id in set(semester_ids))
+        versions = dict((keys[key], version) for key, version in self.cache.get_many(keys.keys()).items())
+        for semester_id in set(keys.values()) - set(versions):
+            # versions start at random, so an evicted version never comes back.
+            self.cache.add(self.version_key(semester_id), random.getrandbits(48), None)
+            versions[semester_id] = self.cache.get(self.version_key(semester_id)) or 0
+        return versions
+
+    def bump_version(self, semester_id):
+        "Changes the data version of the semester, so its cached results are never used again."
+        try:
+            self.cache.incr(self.version_key(semester_id))
+        except ValueError:  # not in the cache, a new one is created when needed.
+            pass
+
+    def key(self, section_ids, versions):
+        data = '%s|%s' % (
+            ','.join(str(section_id) for section_id in sorted(set(section_ids))),
+            ','.join('%d:%d' % item for item in sorted(versions.items())),
+        )
+        return self.prefix + hashlib.sha1(data).hexdigest()
+
+    def key_of(self, sections):
+        """Returns the key of the result of the selection of the given sections, with the
+        current versions of their semesters. Get it before computing the result, so a
+        result is never stored with a version newer than its data.
+        """
+        sections = list(sections)
+        versions = self.get_versions(section.semester_id for section in sections)
+        return self.key([section.id for section in sections], versions)
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, result):
+        self.cache.set(key, result, DEFAULT_TIMEOUT if self.timeout is None else self.timeout)
@@ -0,0 +1,79 @@
+"""The occupancy of the rooms of a semester, from the locations of its section periods.
+
+The periods of each room are kept in a TimeIndex, so the rooms free during some time
+windows are found by bisection. Rooms booked twice at once are found like section
+conflicts: the sections of each room are grouped by period, and only the periods
+conflicting in courses.models.period_conflicts are paired.
+"""
+import threading
+
+from courses.models import SectionPeriod, period_conflicts
+from scheduler.time_index import TimeIndex
+
+
+__all__ = ['RoomOccupancy', 'get_room_occupancy']
+
+
+class RoomOccupancy(TimeIndex):
+    """The periods of rooms by day of the week.
+
+    ``rows``: An iterable of (location, section id, crosslisting id, period id, start, end,
+    days of the week flag). Rows without a location are ignored.
+    """
+    def __init__(self, rows):
+        self.sections = {}  # location => {period id => set of (section id, crosslisting id)}
+        periods = []
+        for location, section_id, crosslisted_id, period_id, start, end, flag in rows:
+            location = location.strip()
+            if not location:
+                continue
+            self.sections.setdefault(location, {}).setdefault(period_id, set()).add((section_id, crosslisted_id))
+            periods.append((location, start, end, flag))
+        super(RoomOccupancy, self).__init__(periods)
+
+    @classmethod
+    def for_semester(cls, semester):
+        "Returns the occupancy of the rooms of the given semester."
+        return cls(SectionPeriod.objects.filter(semester=semester).values_list(
+            'location', 'section_id', 'section__crosslisted_id', 'period_id',
+            'period__start', 'period__end', 'period__days_of_week_flag'))
+
+    locations = TimeIndex.keys
+
+    def free_rooms(self, windows):
+        "Returns the sorted locations of the rooms not used during any of the given time windows."
+        return sorted(self.find(busy=windows))
+
+    def double_bookings(self):
+        """Returns the sorted list of (location, section1 id, section2 id) of the sections
+        using a room at the same time, where section1 has the lower id. Crosslisted
+        sections share their rooms, so they are never included.
+        """
+        bookings = set()
+        for location, sections_by_period in self.sections.items():
+            for period_id, sections1 in sections_by_period.items():
+                for other_id in period_conflicts.get(period_id) or ():
+                    if other_id < period_id or other_id not in sections_by_period:
+                        continue
+                    for section1, crosslisted1 in sections1:
+                        for section2, crosslisted2 in sections_by_period[other_id]:
+                            if section1 == section2 or (crosslisted1 is not None and crosslisted1 == crosslisted2):
+                                continue
+                            bookings.add((location, min(section1, section2), max(section1, section2)))
+        return sorted(bookings)
+
+
+_occupancies = {}  # semester id => (data version, occupancy)
+_occupancies_lock = threading.Lock()
+
+
+def get_room_occupancy(semester, rebuild=False):
+    """Returns the RoomOccupancy of the semester, built again only when the semester is
+    updated (or if ``rebuild`` is given).
+    """
+    with _occupancies_lock:
+        version, occupancy = _occupancies.get(semester.id, (None, None))
+        if rebuild or occupancy is None or version != semester.data_version:
+            occupancy = RoomOccupancy.for_semester(semester)
+            _occupancies[semester.id] = (semester.data_version, occupancy)
+        return occupancy
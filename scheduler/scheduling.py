@@ -1,7 +1,36 @@
-from pyconstraints import Problem, is_nil
+import datetime
+import hashlib
+import multiprocessing
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from itertools import islice
 
+from pyconstraints import is_nil
 
-__all__ = ['compute_schedules', 'TimeRange', 'Scheduler']
+from scheduler.solver import (
+    search, search_parallel, search_space, search_ranked, count_solutions, period_mask,
+    section_mask, time_range_mask, days_flag, SearchBudget, MINUTES_PER_DAY
+)
+from scheduler.ranking import get_cost
+
+
+__all__ = [
+    'compute_schedules', 'compute_schedules_page', 'search_schedules', 'rank_schedules',
+    'count_schedules', 'TimeRange', 'Scheduler', 'ScheduleSearch', 'InvalidCursor',
+    'PARALLEL_THRESHOLD', 'PARALLEL_LIMIT', 'parse_blocked_time', 'parse_blocked_times', 'parse_time_window',
+]
+
+# the number of combinations of distinct section times to search in parallel from.
+PARALLEL_THRESHOLD = 10 ** 6
+# searches needing fewer schedules than this are faster in-process. A full page of the
+# schedules API (SCHEDULER_SCHEDULE_LIMIT, 2000 by default) is searched in parallel.
+PARALLEL_LIMIT = 2000
+
+# the length of the time slots users can block.
+BLOCKED_TIME_MINUTES = 30
+
+
+class InvalidCursor(ValueError):
+    "Raised when a schedule cursor is malformed or was made for a different selection."
 
 
 class TimeRange(object):
@@ -10,6 +39,7 @@ class TimeRange(object):
         self.start = start
         self.end = end
         self.days_of_week = dow
+        self.mask = time_range_mask(start, end, dow)
 
     def __repr__(self):
         return "<TimeRange: %r to %r on %r>" % (
@@ -17,22 +47,91 @@ class TimeRange(object):
         )
 
     def __contains__(self, period):
-        days, start, end = period.days_of_week_flag, period.start, period.end
-
-        return days & self.days_of_week > 0 and (
-            self.start <= start <= self.end or
-            start <= self.start <= end or
-            self.start <= end <= self.end or
-            start <= self.end <= end
-        )
+        return bool(period_mask(period) & self.mask)
 
     def conflicts_with(self, section):
         "Returns True if the given section conflicts with this time range."
-        for p in section.periods:
-            t = (p.int_days, p.start, p.end)
-            if t in self:
-                return True
-        return False
+        return bool(section_mask(section) & self.mask)
+
+
+class ScheduleSearch(object):
+    """The schedules found by Scheduler.search_schedules.
+
+    ``schedules``: The list of schedules found.
+    ``next_cursor``: The cursor to continue the search from, or None if all the
+                     schedules were found.
+    ``stats``: A dictionary of the number of ``solutions`` found, the ``nodes``
+               visited by the search, the ``elapsed`` seconds and if the search
+               ``timed_out``.
+    ``costs``: The cost of each schedule when they are ranked, otherwise None.
+    ``blocked_courses``: The courses that have no sections left outside the excluded
+                         times. There are no schedules if there are any.
+    """
+    def __init__(self, schedules, next_cursor, stats, costs=None, blocked_courses=()):
+        self.schedules = schedules
+        self.next_cursor = next_cursor
+        self.stats = stats
+        self.costs = costs
+        self.blocked_courses = list(blocked_courses)
+
+    def __repr__(self):
+        return "<ScheduleSearch: %d schedules%s>" % (
+            len(self.schedules), ' (truncated)' if self.truncated else ''
+        )
+
+    @property
+    def truncated(self):
+        """Returns True if the search stopped before finding all the schedules (or
+        before it was sure to have the best ones when ranking).
+        """
+        return self.next_cursor is not None or self.stats['timed_out']
+
+
+def parse_blocked_time(blocked_time):
+    """Returns the TimeRange of a blocked time slot, as stored in
+    SavedSelection.blocked_times (eg - 'Wednesday_12:0:0' blocks 12:00 to 12:29 on
+    wednesdays).
+
+    Raises ValueError if the blocked time is malformed.
+    """
+    try:
+        day, clock = blocked_time.split('_', 1)
+        hour, minute = [int(value) for value in clock.split(':')[:2]]
+        start = datetime.time(hour, minute)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid blocked time: %r' % blocked_time)
+    if not days_flag([day]):
+        raise ValueError('Invalid day of the blocked time: %r' % blocked_time)
+    minutes = min(hour * 60 + minute + BLOCKED_TIME_MINUTES - 1, MINUTES_PER_DAY - 1)
+    end = datetime.time(minutes // 60, minutes % 60)
+    return TimeRange(start, end, [day])
+
+
+def parse_blocked_times(blocked_times):
+    "Returns the TimeRanges of the given blocked times, ignoring empty strings."
+    return [parse_blocked_time(blocked_time) for blocked_time in blocked_times if blocked_time]
+
+
+def parse_time_window(window):
+    """Returns the TimeRange of a time window of a day, from its start to the minute
+    before its end (eg - 'Tuesday_10:00-12:00' is 10:00 to 11:59 on tuesdays).
+
+    Raises ValueError if the time window is malformed or empty.
+    """
+    try:
+        day, clock = window.split('_', 1)
+        first, last = [
+            int(hour) * 60 + int(minute)
+            for hour, minute in [value.split(':')[:2] for value in clock.split('-')]
+        ]
+    except (AttributeError, TypeError, ValueError):
+        raise ValueError('Invalid time window: %r' % window)
+    if not days_flag([day]):
+        raise ValueError('Invalid day of the time window: %r' % window)
+    last = min(last, MINUTES_PER_DAY) - 1
+    if not 0 <= first <= last:
+        raise ValueError('Empty time window: %r' % window)
+    return TimeRange(datetime.time(first // 60, first % 60), datetime.time(last // 60, last % 60), [day])
 
 
 def section_constraint(section1, section2):
@@ -42,16 +141,36 @@ def section_constraint(section1, section2):
 class Scheduler(object):
     """High-level API that wraps the course scheduling feature.
 
+    Sections are converted into week bitmasks (see scheduler.solver) and combined with a
+    backtracking search, so conflicts are checked with a single AND per section. Courses
+    that can never conflict with each other are solved separately and sections that meet
+    at the same times are only searched once. Sections during the excluded times are
+    removed before the search starts.
+
     ``free_sections_only``: bool. Determines if the only the available sections should be
                             used when using courses provided. Defaults to True.
-    ``problem``: Optional problem instance to provide. If None, the default one is created.
+    ``problem``: Optional pyconstraints problem instance to provide. If given, the problem
+                 is solved instead of using the bitmask search.
+    ``processes``: The number of worker processes used to search large selections.
+                   Defaults to the number of CPUs, 1 always searches in-process.
+    ``parallel_threshold``: Selections with at least this many combinations of distinct
+                            section times are searched by worker processes. Smaller ones
+                            are not worth the cost of starting them.
+    ``parallel_limit``: Searches needing fewer schedules than this are searched
+                        in-process, since they end before the workers pay off.
+
+    ``blocked_courses`` is set to the courses that have no sections left outside the
+    excluded times by the last search.
 
     """
-    def __init__(self, free_sections_only=True, problem=None):
-        self.p = Problem()
-        if problem is not None:
-            self.p = problem
+    def __init__(self, free_sections_only=True, problem=None, processes=None,
+                 parallel_threshold=PARALLEL_THRESHOLD, parallel_limit=PARALLEL_LIMIT):
+        self.p = problem
         self.free_sections_only = free_sections_only
+        self.processes = processes
+        self.parallel_threshold = parallel_threshold
+        self.parallel_limit = parallel_limit
+        self.blocked_courses = []
         self.clear_excluded_times()
 
     def clear_excluded_times(self):
@@ -84,27 +203,292 @@ class Scheduler(object):
                 self.exclude_time(*item)
         return self
 
-    def find_schedules(self, courses=None, generator=False, start=0):
+    def find_schedules(self, courses=None, generator=False, start=0, rank_by=None, top=None, timeout=None, limit=None):
         """Returns all the possible course combinations. Assumes no duplicate courses.
 
         ``return_generator``: If True, returns a generator instead of collection. Generators
             are friendlier to your memory and save computation time if not all solutions are
             used.
+        ``start``: The number of schedules to skip.
+        ``rank_by``: If given, returns the schedules with the lowest cost first. See
+            rank_schedules.
+        ``top``: The number of schedules to rank. All of them are ranked if not given.
+        ``timeout``: If given, the search (including the schedules skipped) stops after
+            this many seconds, and only the schedules found so far are returned.
+        ``limit``: If given, at most this many schedules are returned after the skipped
+            ones, and the search stops once they are found.
         """
-        self.p.reset()
-        self.create_variables(courses)
-        self.create_constraints(courses)
-        self.p.restore_point(start)
+        if self.p is not None:
+            return self.find_schedules_with_problem(courses, generator, start)
+        end = None if limit is None else start + limit
+        if rank_by is not None:
+            schedules = iter(self.rank_schedules(courses, rank_by, top, timeout).schedules)
+        else:
+            schedules = self.iter_schedules(courses, SearchBudget(timeout), end)
+        if start or end is not None:
+            schedules = islice(schedules, start, end)
         if generator:
-            return self.p.iter_solutions()
-        return self.p.get_solutions()
+            return schedules
+        return tuple(schedules)
+
+    def count_schedules(self, courses=None, limit=None):
+        """Returns the number of possible course combinations without computing them.
+
+        ``limit``: If given, counting stops once this many schedules are found and
+            the limit is returned instead.
+        """
+        if self.p is not None:
+            schedules = self.find_schedules_with_problem(courses, generator=True)
+            return sum(1 for schedule in islice(schedules, limit))
+        order, domains, mask_domains = self.build_search(courses)
+        return count_solutions(mask_domains, limit=limit)
+
+    def find_schedules_page(self, courses=None, limit=None, cursor=None):
+        """Returns a tuple of (schedules, next_cursor).
+
+        ``limit``: The maximum number of schedules to return. All the remaining schedules
+            are returned if not given.
+        ``cursor``: A token from a previous call to continue from. The search resumes at
+            its position instead of walking the schedules before it again.
+
+        ``next_cursor`` is None when there are no more schedules. Raises InvalidCursor if
+        the cursor was not made for the same courses.
+        """
+        result = self.search_schedules(courses, limit=limit, cursor=cursor)
+        return result.schedules, result.next_cursor
+
+    def search_schedules(self, courses=None, limit=None, timeout=None, cursor=None):
+        """Returns a ScheduleSearch of the schedules found within the given bounds.
+
+        ``limit``: The maximum number of schedules to find.
+        ``timeout``: The number of seconds to search for. Once it has passed, the
+            schedules found so far are returned.
+        ``cursor``: A token from a previous call to continue from.
+
+        When either bound is hit, the result is truncated and its next_cursor continues
+        the search after the last schedule found (or from the same cursor if none were
+        found in time). Raises InvalidCursor if the cursor was not made for
+        the same courses.
+        """
+        order, domains, mask_domains = self.build_search(courses)
+        fingerprint = self.get_fingerprint(order, domains)
+        start, after = None, False
+        if cursor:
+            start, after = self.decode_cursor(cursor, fingerprint, mask_domains)
+        budget = SearchBudget(timeout)
+        page, next_cursor = [], None
+        needed = None if limit is None else limit + 1
+        for indices in self.search(mask_domains, start, budget, needed):
+            if after and indices == start:
+                continue
+            if limit is not None and len(page) >= limit:
+                next_cursor = self.encode_cursor(fingerprint, indices)
+                break
+            page.append(indices)
+        else:
+            if budget.expired:
+                if page:
+                    next_cursor = self.encode_cursor(fingerprint, page[-1], after=True)
+                else:
+                    next_cursor = cursor or self.encode_cursor(fingerprint, [0] * len(mask_domains))
+        stats = {
+            'solutions': len(page),
+            'nodes': budget.nodes,
+            'elapsed': budget.elapsed(),
+            'timed_out': budget.expired,
+        }
+        schedules = [self.as_schedule(order, domains, indices) for indices in page]
+        return ScheduleSearch(schedules, next_cursor, stats, blocked_courses=self.blocked_courses)
+
+    def rank_schedules(self, courses=None, rank_by='days', top=None, timeout=None):
+        """Returns a ScheduleSearch of the ``top`` schedules with the lowest cost, best
+        first.
+
+        ``rank_by``: A scheduler.ranking.Cost, a function of the week mask of a schedule or
+            the names of the costs in scheduler.ranking.COSTS (eg - 'days,gaps').
+        ``top``: The number of schedules to return. All of them are ranked if not given.
+        ``timeout``: The number of seconds to search for. Once it has passed, the best
+            schedules found so far are returned and the result is truncated.
+
+        Only the schedules that can still beat the ``top`` ones found so far are searched,
+        so asking for a few schedules is much cheaper than ranking all of them.
+        """
+        cost = get_cost(rank_by)
+        order, domains, mask_domains = self.build_search(courses)
+        budget = SearchBudget(timeout)
+        ranked = search_ranked(mask_domains, cost, top, budget=budget)
+        stats = {
+            'solutions': len(ranked),
+            'nodes': budget.nodes,
+            'elapsed': budget.elapsed(),
+            'timed_out': budget.expired,
+        }
+        schedules = [self.as_schedule(order, domains, indices) for value, indices in ranked]
+        return ScheduleSearch(
+            schedules, None, stats,
+            costs=[value for value, indices in ranked],
+            blocked_courses=self.blocked_courses)
+
+    def iter_schedules(self, courses, budget=None, limit=None):
+        """Returns a generator of schedules (dictionaries of course to section), which
+        stops early once the given SearchBudget expires. ``limit`` is the number of
+        schedules needed, if known.
+        """
+        order, domains, mask_domains = self.build_search(courses)
+        for indices in self.search(mask_domains, budget=budget, limit=limit):
+            yield self.as_schedule(order, domains, indices)
+
+    def as_schedule(self, order, domains, indices):
+        "Internal use. Returns the schedule for the given solution of the search."
+        return dict((course, domains[course][i]) for course, i in zip(order, indices))
+
+    def build_search(self, courses):
+        """Internal use. Returns a tuple of the courses in search order, the dictionary of
+        course to sections and the list of section masks for each course.
+
+        The sections during excluded times are left out of the search.
+        """
+        domains = self.get_domains(courses)
+        masks = self.get_masks(domains)
+        domains = self.exclude_sections(domains, masks)
+        order = self.get_variable_order(domains, masks)
+        mask_domains = [[masks[section] for section in domains[course]] for course in order]
+        return order, domains, mask_domains
 
     # internal methods -- can be overriden for custom use.
+    def search(self, mask_domains, start=None, budget=None, limit=None):
+        """Internal use. Returns a generator of the solutions of the search.
+
+        Large selections are searched by worker processes, unless the search resumes from
+        a ``start`` position. ``limit`` is the number of solutions needed, if known.
+        """
+        processes = self.get_processes()
+        if start is None and self.use_parallel_search(mask_domains, limit, processes):
+            return search_parallel(mask_domains, 0, processes, limit, budget)
+        return search(mask_domains, 0, start, budget)
+
+    def get_processes(self):
+        "Internal use. Returns the number of worker processes to search with."
+        if self.processes is not None:
+            return self.processes
+        try:
+            return multiprocessing.cpu_count()
+        except NotImplementedError:
+            return 1
+
+    def use_parallel_search(self, mask_domains, limit=None, processes=None):
+        """Internal use. Returns True if the search is large enough to run in parallel:
+        it has enough combinations and needs all (or very many) of its schedules.
+        """
+        if processes is None:
+            processes = self.get_processes()
+        if processes <= 1:
+            return False
+        if limit is not None and limit < self.parallel_limit:
+            return False
+        return search_space(mask_domains) >= self.parallel_threshold
+
     def get_sections(self, course):
         """Internal use. Returns the sections to use for the solver for a given course.
         """
         return course.available_sections if self.free_sections_only else course.sections
 
+    def get_domains(self, courses):
+        """Internal use. Returns a dictionary of course to the list of its sections.
+        If given a dict of {course: sections}, will use the provided sections.
+
+        Sections are ordered by id, so the schedules (and cursors) are in the same order
+        between requests.
+        """
+        has_sections = isinstance(courses, dict)
+        domains = {}
+        for course in courses:
+            sections = courses.get(course, []) if has_sections else self.get_sections(course)
+            domains[course] = sorted(sections, key=lambda section: getattr(section, 'id', None))
+        return domains
+
+    def get_masks(self, domains):
+        "Internal use. Returns a dictionary of section to its week mask."
+        masks = {}
+        for sections in domains.values():
+            for section in sections:
+                if section not in masks:
+                    masks[section] = section_mask(section)
+        return masks
+
+    def get_variable_order(self, domains, masks):
+        """Internal use. Returns the courses in the order they are searched.
+
+        Courses with the fewest distinct meeting times are searched first, since they
+        are the most likely to cut off the search early.
+        """
+        def key(course):
+            sections = domains[course]
+            distinct_times = len(set(masks[section] for section in sections))
+            return (distinct_times, len(sections), getattr(course, 'id', None))
+        return sorted(domains, key=key)
+
+    def exclude_sections(self, domains, masks):
+        """Internal use. Returns the domains without the sections that are held during the
+        excluded times, and sets blocked_courses to the courses left without sections.
+        """
+        excluded = self.get_excluded_mask()
+        filtered = dict(
+            (course, [section for section in sections if not masks[section] & excluded])
+            for course, sections in domains.items()
+        )
+        self.blocked_courses = [
+            course for course in domains
+            if domains[course] and not filtered[course]
+        ]
+        return filtered
+
+    def get_excluded_mask(self):
+        "Internal use. Returns the week mask of all the excluded times."
+        mask = 0
+        for timerange in self._excluded_times:
+            mask |= timerange.mask
+        return mask
+
+    def get_fingerprint(self, order, domains):
+        "Internal use. Returns a short hash of the courses and sections being searched."
+        ids = [
+            (getattr(course, 'id', None), [getattr(section, 'id', None) for section in domains[course]])
+            for course in order
+        ]
+        return hashlib.sha1(repr(ids)).hexdigest()[:12]
+
+    def encode_cursor(self, fingerprint, indices, after=False):
+        """Internal use. Returns the cursor token for the given position of the search.
+
+        The position itself is included when resuming, unless ``after`` is True.
+        """
+        data = '%s:%s' % (fingerprint, ','.join(str(i) for i in indices))
+        if after:
+            data += '+'
+        return urlsafe_b64encode(data).rstrip('=')
+
+    def decode_cursor(self, cursor, fingerprint, mask_domains):
+        """Internal use. Returns a tuple of the position of the search the cursor token
+        refers to and if the search resumes after it.
+
+        Raises InvalidCursor if the token is malformed or has a different fingerprint.
+        """
+        try:
+            cursor = str(cursor)
+            data = urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            cursor_fingerprint, raw_indices = data.split(':', 1)
+            after = raw_indices.endswith('+')
+            indices = tuple(int(i) for i in raw_indices.rstrip('+').split(',') if i)
+        except (TypeError, ValueError, UnicodeError):
+            raise InvalidCursor('Malformed schedule cursor.')
+        if cursor_fingerprint != fingerprint or len(indices) != len(mask_domains):
+            raise InvalidCursor('The schedule cursor is for a different selection.')
+        for index, domain in zip(indices, mask_domains):
+            if not 0 <= index < len(domain):
+                raise InvalidCursor('The schedule cursor is for a different selection.')
+        return indices, after
+
     def time_conflict(self, schedule):
         """Internal use. Determines when the given time range conflicts with the set of
         excluded time ranges.
@@ -114,30 +498,79 @@ class Scheduler(object):
                 return False
         return True
 
+    def find_schedules_with_problem(self, courses, generator=False, start=0):
+        "Internal use. Solves the courses with the provided pyconstraints problem."
+        self.p.reset()
+        self.create_variables(courses)
+        self.create_constraints(courses)
+        self.p.restore_point(start)
+        if generator:
+            return self.p.iter_solutions()
+        return self.p.get_solutions()
+
     def create_variables(self, courses):
         """Internal use. Creates all variables in the problem instance for the given
         courses. If given a dict of {course: sections}, will use the provided sections.
         """
-        has_sections = isinstance(courses, dict)
-        for course in courses:
-            self.p.add_variable(course, courses.get(course, []) if has_sections else self.get_sections(course))
+        domains = self.get_domains(courses)
+        domains = self.exclude_sections(domains, self.get_masks(domains))
+        for course, sections in domains.items():
+            self.p.add_variable(course, sections)
 
     def create_constraints(self, courses):
         """Internal use. Creates all constraints in the problem instance for the given
-        courses.
+        courses. The excluded times are already removed by create_variables.
         """
         for i, course1 in enumerate(courses):
             for j, course2 in enumerate(courses):
                 if i <= j:
                     continue
                 self.p.add_constraint(section_constraint, [course1, course2])
-            self.p.add_constraint(self.time_conflict, [course1])
 
 
-def compute_schedules(courses=None, excluded_times=(), free_sections_only=True, problem=None, generator=False, start=0):
+def compute_schedules(courses=None, excluded_times=(), free_sections_only=True, problem=None, generator=False, start=0, rank_by=None, top=None, timeout=None, limit=None):
     """
-    Returns all possible schedules for the given courses.
+    Returns all possible schedules for the given courses, or the ``top`` ones with the
+    lowest cost if ``rank_by`` is given. Only the schedules found within the timeout (in
+    seconds), and at most ``limit`` of them after ``start``, are returned if given.
     """
     s = Scheduler(free_sections_only, problem)
     s.exclude_times(*tuple(excluded_times))
-    return s.find_schedules(courses, generator, start)
+    return s.find_schedules(courses, generator, start, rank_by, top, timeout, limit)
+
+
+def rank_schedules(courses=None, excluded_times=(), free_sections_only=True, rank_by='days', top=None, timeout=None):
+    """
+    Returns a ScheduleSearch of the ``top`` schedules with the lowest cost.
+    """
+    s = Scheduler(free_sections_only)
+    s.exclude_times(*tuple(excluded_times))
+    return s.rank_schedules(courses, rank_by, top, timeout)
+
+
+def compute_schedules_page(courses=None, excluded_times=(), free_sections_only=True, limit=None, cursor=None):
+    """
+    Returns a tuple of the schedules after the given cursor and the cursor for the next page.
+    """
+    s = Scheduler(free_sections_only)
+    s.exclude_times(*tuple(excluded_times))
+    return s.find_schedules_page(courses, limit, cursor)
+
+
+def search_schedules(courses=None, excluded_times=(), free_sections_only=True, limit=None, timeout=None, cursor=None):
+    """
+    Returns a ScheduleSearch of the schedules found for the given courses within the
+    limit of schedules and the timeout in seconds.
+    """
+    s = Scheduler(free_sections_only)
+    s.exclude_times(*tuple(excluded_times))
+    return s.search_schedules(courses, limit, timeout, cursor)
+
+
+def count_schedules(courses=None, excluded_times=(), free_sections_only=True, limit=None):
+    """
+    Returns the number of possible schedules for the given courses.
+    """
+    s = Scheduler(free_sections_only)
+    s.exclude_times(*tuple(excluded_times))
+    return s.count_schedules(courses, limit)
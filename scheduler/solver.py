@@ -0,0 +1,738 @@
+"""The bitmask schedule search used by the scheduler.
+
+A week is represented as a single integer where bit ``day * MINUTES_PER_DAY + minute``
+is set when something is held during that minute of that day. Two sections conflict
+exactly when their masks share a bit, so the search only needs bitwise ANDs instead of
+comparing period objects for every pair of sections.
+
+The functions in this module only deal with integers and indices, callers are
+responsible for mapping the results back to their section objects.
+"""
+import atexit
+import datetime
+import multiprocessing
+import threading
+import time
+from array import array
+from bisect import insort
+from itertools import product
+from operator import or_, mul
+
+from courses.models import Period
+
+
+__all__ = [
+    'MINUTES_PER_DAY', 'DAYS_PER_WEEK', 'minute_of_day', 'days_flag',
+    'time_range_mask', 'period_mask', 'section_mask', 'backtrack',
+    'components', 'LazySequence', 'lazy_product', 'seek_product', 'equivalence_classes',
+    'search_components', 'search', 'count', 'count_solutions', 'SearchBudget',
+    'rank', 'search_ranked', 'search_space', 'split_prefixes', 'search_parallel',
+    'TaskBudget', 'get_pool', 'close_pool',
+]
+
+MINUTES_PER_DAY = 24 * 60
+DAYS_PER_WEEK = len(Period.DAYS_OF_WEEK)
+
+_DAY_NAMES = dict((name.lower(), value) for value, name in Period.DAYS_OF_WEEK)
+_PERIOD_MASKS = {}  # (start, end, days_of_week_flag) => mask
+
+
+def minute_of_day(value):
+    """Returns the minute of the day for a datetime.time or a military integer
+    time (eg - 1430). Returns None if no time was given.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime.time):
+        return value.hour * 60 + value.minute
+    value = int(value)
+    return (value // 100) * 60 + value % 100
+
+
+def days_flag(days):
+    """Returns the Period.days_of_week_flag for the given days.
+
+    ``days`` can be an existing flag or a collection of Period.MONDAY-SUNDAY constants
+    or day names (eg - 'monday').
+    """
+    if isinstance(days, (int, long)):
+        return days
+    flag = 0
+    for day in days:
+        if isinstance(day, basestring):
+            flag |= _DAY_NAMES.get(day.lower(), 0)
+        else:
+            flag |= int(day)
+    return flag
+
+
+def time_range_mask(start, end, days):
+    """Returns the week mask for the time range on the given days.
+
+    Both ``start`` and ``end`` are inclusive, which matches Period.conflicts_with
+    (a class ending at 10:50 conflicts with one starting at 10:50).
+    """
+    first, last = minute_of_day(start), minute_of_day(end)
+    if first is None or last is None or last < first:
+        return 0
+    run = ((1 << (last - first + 1)) - 1) << first
+    flag = days_flag(days)
+    mask = 0
+    for day in range(DAYS_PER_WEEK):
+        if flag & (1 << day):
+            mask |= run << (day * MINUTES_PER_DAY)
+    return mask
+
+
+def period_mask(period):
+    "Returns the week mask of the given period. Masks are shared between identical periods."
+    key = period.to_tuple()
+    mask = _PERIOD_MASKS.get(key)
+    if mask is None:
+        mask = _PERIOD_MASKS[key] = time_range_mask(*key)
+    return mask
+
+
+def section_mask(section):
+    "Returns the week mask of all the periods of the given section."
+    mask = 0
+    for period in section.get_periods():
+        mask |= period_mask(period)
+    return mask
+
+
+class SearchBudget(object):
+    """Bounds the wall-clock time spent by a search.
+
+    The search calls step() for every node it visits and stops as soon as it returns
+    False. The clock is only read every ``check_interval`` nodes to keep the overhead
+    of the checks low. ``nodes`` is the number of nodes visited so far, across all the
+    searches using this budget.
+    """
+    def __init__(self, timeout=None, check_interval=256, clock=time.time):
+        self.clock = clock
+        self.started_at = clock()
+        self.deadline = None if timeout is None else self.started_at + timeout
+        self.check_interval = check_interval
+        self.nodes = 0
+        self.expired = False
+
+    def __repr__(self):
+        return "<SearchBudget: %d nodes, %.3fs%s>" % (
+            self.nodes, self.elapsed(), ' (expired)' if self.expired else ''
+        )
+
+    def elapsed(self):
+        "Returns the number of seconds since the budget was created."
+        return self.clock() - self.started_at
+
+    def step(self):
+        "Counts a node of the search. Returns False once the time is up."
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes % self.check_interval:
+            self.expired = self.expired or self.clock() >= self.deadline
+        return not self.expired
+
+
+def backtrack(domains, occupied=0, start=None, budget=None):
+    """Returns a generator of index tuples, one index into each domain, whose masks
+    do not share any bits with each other or with ``occupied``.
+
+    ``domains`` is a sequence of lists of masks. Solutions are produced in
+    lexicographic order of their indices. If ``start`` is given, the search resumes
+    from that index tuple instead of the first one, without visiting the solutions
+    before it. If a SearchBudget is given, the search stops early once it expires.
+    """
+    size = len(domains)
+    if any(len(domain) == 0 for domain in domains):
+        return
+    if size == 0:
+        yield ()
+        return
+    seeking = start is not None
+    indices = list(start) if seeking else [0] * size
+    used = [occupied] * (size + 1)
+    depth = 0
+    while depth >= 0:
+        if budget is not None and not budget.step():
+            return
+        domain, index, mask = domains[depth], indices[depth], used[depth]
+        length = len(domain)
+        while index < length and domain[index] & mask:
+            index += 1
+        if seeking and (index != indices[depth] or index == length):
+            # we moved past the starting point, the following domains start over.
+            seeking = False
+            for i in range(depth + 1, size):
+                indices[i] = 0
+        if index == length:
+            indices[depth] = 0
+            depth -= 1
+            if depth >= 0:
+                indices[depth] += 1
+            continue
+        indices[depth] = index
+        used[depth + 1] = mask | domain[index]
+        if depth + 1 == size:
+            seeking = False
+            yield tuple(indices)
+            indices[depth] += 1
+        else:
+            depth += 1
+
+
+def domains_conflict(domain1, domain2):
+    "Returns True if any mask of the first domain shares a bit with a mask of the second."
+    if not (reduce(or_, domain1, 0) & reduce(or_, domain2, 0)):
+        return False
+    return any(mask1 & mask2 for mask1 in domain1 for mask2 in domain2)
+
+
+def components(domains):
+    """Splits the domains into connected components of the conflict graph, where two
+    domains are connected if any of their masks conflict.
+
+    Returns a list of lists of domain indices. Both the components and the indices
+    inside them are sorted.
+    """
+    size = len(domains)
+    neighbors = [[] for i in range(size)]
+    for i in range(size):
+        for j in range(i + 1, size):
+            if domains_conflict(domains[i], domains[j]):
+                neighbors[i].append(j)
+                neighbors[j].append(i)
+
+    groups, seen = [], set()
+    for i in range(size):
+        if i in seen:
+            continue
+        seen.add(i)
+        group, stack = [], [i]
+        while stack:
+            index = stack.pop()
+            group.append(index)
+            for neighbor in neighbors[index]:
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    stack.append(neighbor)
+        groups.append(sorted(group))
+    return groups
+
+
+class LazySequence(object):
+    """Caches the items of an iterable as they are consumed, so it can be iterated
+    multiple times without computing the items again.
+    """
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self._items = []
+        self._exhausted = False
+
+    def __repr__(self):
+        return "<LazySequence: %d items seen%s>" % (len(self._items), '' if self._exhausted else '+')
+
+    def _fetch(self):
+        "Fetches the next item into the cache. Returns False if there are no more items."
+        if self._exhausted:
+            return False
+        try:
+            self._items.append(self._iterator.next())
+            return True
+        except StopIteration:
+            self._exhausted = True
+            return False
+
+    def is_empty(self):
+        return not self._items and not self._fetch()
+
+    def __iter__(self):
+        index = 0
+        while index < len(self._items) or self._fetch():
+            yield self._items[index]
+            index += 1
+
+
+def lazy_product(sequences):
+    """Like itertools.product, but only consumes the given sequences as far as the
+    caller iterates. Sequences are expected to be re-iterable (eg - LazySequence).
+    """
+    if not sequences:
+        yield ()
+        return
+    first, rest = sequences[0], sequences[1:]
+    for item in first:
+        for items in lazy_product(rest):
+            yield (item,) + items
+
+
+def seek_product(sequences, start, seek):
+    """Like lazy_product(), but begins at the tuple ``start`` instead of the first items.
+
+    ``seek(i, item)`` returns the items of ``sequences[i]`` from ``item`` onwards. It
+    does not need to include ``item`` itself, in which case the product begins with the
+    next item.
+    """
+    def visit(position):
+        if position == len(sequences):
+            yield ()
+            return
+        for item in seek(position, start[position]):
+            if item == start[position]:
+                rest = visit(position + 1)
+            else:
+                rest = lazy_product(sequences[position + 1:])
+            for items in rest:
+                yield (item,) + items
+    return visit(0)
+
+
+def equivalence_classes(domains):
+    """Groups the identical masks of each domain together, since sections that meet at
+    the same times are interchangeable for the search.
+
+    Returns a tuple of (class_domains, members). ``class_domains[i]`` is the list of
+    distinct masks of ``domains[i]`` and ``members[i][k]`` lists the indices into
+    ``domains[i]`` that have the mask ``class_domains[i][k]``.
+    """
+    class_domains, members = [], []
+    for domain in domains:
+        masks, indices, positions = [], [], {}
+        for index, mask in enumerate(domain):
+            position = positions.get(mask)
+            if position is None:
+                position = positions[mask] = len(masks)
+                masks.append(mask)
+                indices.append([])
+            indices[position].append(index)
+        class_domains.append(masks)
+        members.append(indices)
+    return class_domains, members
+
+
+def search_components(domains, occupied=0, start=None, budget=None):
+    """Like backtrack(), but solves each connected component of the conflict graph
+    separately and combines their solutions lazily.
+
+    The work grows with the size of the largest component instead of the whole
+    selection. Solutions are ordered by the indices of the first component, then by
+    the indices of the second one and so on. ``start`` resumes the search from the
+    given index tuple and ``budget`` is passed on to backtrack().
+    """
+    if any(len(domain) == 0 for domain in domains):
+        return
+    groups = components(domains)
+    group_domains = [[domains[i] for i in group] for group in groups]
+    sequences = [
+        LazySequence(backtrack(sub_domains, occupied, budget=budget))
+        for sub_domains in group_domains
+    ]
+    # avoid walking the first components when a later one has no solutions at all.
+    if any(sequence.is_empty() for sequence in sequences):
+        return
+    if start is None:
+        parts_iter = lazy_product(sequences)
+    else:
+        parts_iter = seek_product(
+            sequences,
+            [tuple(start[i] for i in group) for group in groups],
+            lambda position, part: backtrack(group_domains[position], occupied, part, budget))
+    size = len(domains)
+    for parts in parts_iter:
+        indices = [0] * size
+        for group, part in zip(groups, parts):
+            for i, index in zip(group, part):
+                indices[i] = index
+        yield tuple(indices)
+
+
+def search(domains, occupied=0, start=None, budget=None):
+    """Returns a generator of index tuples, one index into each domain, whose masks
+    do not conflict.
+
+    The search runs over the equivalence classes of each domain (see
+    equivalence_classes) and each solution is only expanded back into the
+    individual indices as the caller iterates.
+
+    ``start`` is an index tuple to resume the search from (inclusive), usually a
+    solution produced by a previous search over the same domains. The solutions before
+    it are skipped without being searched again.
+
+    If a SearchBudget is given, the search stops early once it expires. Check
+    ``budget.expired`` to tell an expired search apart from a complete one.
+    """
+    class_domains, members = equivalence_classes(domains)
+    if start is None:
+        for class_indices in search_components(class_domains, occupied, budget=budget):
+            for indices in product(*[members[i][k] for i, k in enumerate(class_indices)]):
+                yield indices
+        return
+
+    start = tuple(start)
+    class_start = tuple(
+        next(k for k, indices in enumerate(members[i]) if index in indices)
+        for i, index in enumerate(start))
+    for class_indices in search_components(class_domains, occupied, class_start, budget):
+        member_lists = [members[i][k] for i, k in enumerate(class_indices)]
+        if class_indices == class_start:
+            solutions = seek_product(
+                member_lists, start,
+                lambda i, index: [member for member in member_lists[i] if member >= index])
+        else:
+            solutions = product(*member_lists)
+        for indices in solutions:
+            yield indices
+
+
+def count(domains, occupied=0, weights=None, limit=None):
+    """Returns the number of solutions backtrack() would produce without enumerating them.
+
+    ``weights[i][k]`` is the number of solutions each mask of ``domains[i]`` stands for
+    (defaults to 1). If ``limit`` is given, counting stops once it is reached and the
+    limit is returned.
+
+    Partial results are memoized by the depth and the occupied bits that later domains
+    can still conflict with, so identical sub-searches are only counted once.
+    """
+    size = len(domains)
+    if weights is None:
+        weights = [[1] * len(domain) for domain in domains]
+    remaining = [0] * (size + 1)
+    for depth in reversed(range(size)):
+        remaining[depth] = remaining[depth + 1] | reduce(or_, domains[depth], 0)
+    memo = {}
+
+    def visit(depth, used):
+        if depth == size:
+            return 1
+        key = (depth, used & remaining[depth])
+        total = memo.get(key)
+        if total is not None:
+            return total
+        total = 0
+        for mask, weight in zip(domains[depth], weights[depth]):
+            if not mask & used:
+                total += weight * visit(depth + 1, used | mask)
+                if limit is not None and total >= limit:
+                    total = limit
+                    break
+        memo[key] = total
+        return total
+    return visit(0, occupied)
+
+
+def count_solutions(domains, occupied=0, limit=None):
+    """Returns the number of solutions search() would produce, or ``limit`` if there
+    are at least that many.
+
+    Counts each component over its equivalence classes and multiplies the results.
+    """
+    class_domains, members = equivalence_classes(domains)
+    if any(len(domain) == 0 for domain in class_domains):
+        return 0
+    counts = [
+        count(
+            [class_domains[i] for i in group],
+            occupied,
+            weights=[[len(indices) for indices in members[i]] for i in group],
+            limit=limit)
+        for group in components(class_domains)
+    ]
+    total = reduce(mul, counts, 1)
+    if limit is not None:
+        return min(total, limit)
+    return total
+
+
+def rank(domains, cost, top=None, occupied=0, weights=None, budget=None):
+    """Returns the ``top`` solutions with the lowest cost as a sorted list of
+    (cost, indices) tuples. Ties are broken by the indices.
+
+    ``cost`` is a scheduler.ranking.Cost of the combined mask of a solution (without
+    ``occupied``). This is a branch-and-bound search: the values of each domain are
+    tried in order of their lower bound and once ``top`` solutions are found, branches
+    whose lower bound is worse than the last of them are skipped.
+
+    ``weights[i][k]`` is the number of solutions each mask of ``domains[i]`` stands for
+    (defaults to 1), solutions count as the product of their weights towards ``top``.
+    If a SearchBudget is given, the best solutions found before it expired are returned.
+    """
+    size = len(domains)
+    if any(len(domain) == 0 for domain in domains):
+        return []
+    if weights is None:
+        weights = [[1] * len(domain) for domain in domains]
+    remaining = [0] * (size + 1)
+    for depth in reversed(range(size)):
+        remaining[depth] = remaining[depth + 1] | reduce(or_, domains[depth], 0)
+    best = []  # sorted list of (cost, indices, weight)
+    state = {'total': 0}  # the sum of the weights in best
+    indices = [0] * size
+
+    def keep(value, weight):
+        insort(best, (value, tuple(indices), weight))
+        state['total'] += weight
+        while top is not None and state['total'] - best[-1][2] >= top:
+            state['total'] -= best.pop()[2]
+
+    def visit(depth, mask, used, weight):
+        if budget is not None and not budget.step():
+            return False
+        if depth == size:
+            keep(cost(mask), weight)
+            return True
+        candidates = []
+        for index, domain_mask in enumerate(domains[depth]):
+            if domain_mask & used:
+                continue
+            fillable = remaining[depth + 1] & ~(used | domain_mask)
+            candidates.append((cost.lower_bound(mask | domain_mask, fillable), index, domain_mask))
+        candidates.sort()
+        for lower_bound, index, domain_mask in candidates:
+            indices[depth] = index
+            if top is not None and state['total'] >= top:
+                worst_value, worst_indices = best[-1][:2]
+                if lower_bound > worst_value:
+                    break
+                # ties with the worst solution only win with smaller indices.
+                if lower_bound == worst_value and tuple(indices[:depth + 1]) > worst_indices[:depth + 1]:
+                    continue
+            if not visit(depth + 1, mask | domain_mask, used | domain_mask, weight * weights[depth][index]):
+                return False
+        return True
+
+    if top is None or top > 0:
+        visit(0, 0, occupied, 1)
+    return [(value, solution) for value, solution, weight in best]
+
+
+def search_ranked(domains, cost, top=None, occupied=0, budget=None):
+    """Returns the ``top`` solutions with the lowest cost as a sorted list of
+    (cost, indices) tuples.
+
+    Like search(), only the equivalence classes of the domains are searched (see
+    rank()) and the best ones are expanded into the individual indices.
+    """
+    class_domains, members = equivalence_classes(domains)
+    weights = [[len(indices) for indices in domain_members] for domain_members in members]
+    solutions = []
+    for value, class_indices in rank(class_domains, cost, top, occupied, weights, budget):
+        for indices in product(*[members[i][k] for i, k in enumerate(class_indices)]):
+            if top is not None and len(solutions) >= top:
+                return solutions
+            solutions.append((value, indices))
+    return solutions
+
+
+def search_space(domains):
+    "Returns the number of combinations of the distinct masks of the domains."
+    return reduce(mul, [len(set(domain)) for domain in domains], 1)
+
+
+def split_prefixes(domains, occupied=0, target=1):
+    """Returns the solutions of the first domains, using as many domains as needed to
+    get at least ``target`` of them (or all the domains).
+
+    Each prefix is the root of an independent part of the search tree.
+    """
+    depth, prefixes = 0, [()]
+    while len(prefixes) < target and depth < len(domains):
+        depth += 1
+        prefixes = list(backtrack(domains[:depth], occupied))
+    return prefixes
+
+
+# the share of the time left that the workers leave to the parent to get their results.
+RESULTS_MARGIN = 0.2
+
+_search_generation = None  # shared by the pool, changes whenever searches are cancelled.
+
+
+def _init_worker(generation):
+    global _search_generation
+    _search_generation = generation
+
+
+class TaskBudget(SearchBudget):
+    """The budget of a task of search_parallel(). Runs out at the absolute ``deadline``
+    (a time.time()) or once the searches of its ``generation`` are cancelled.
+    """
+    def __init__(self, deadline=None, generation=None, check_interval=256):
+        super(TaskBudget, self).__init__(check_interval=check_interval)
+        self.deadline = deadline
+        self.generation = generation
+
+    def cancelled(self):
+        return self.generation is not None and _search_generation.value != self.generation
+
+    def step(self):
+        self.nodes += 1
+        if not self.nodes % self.check_interval:
+            self.expired = self.expired or self.cancelled() or (
+                self.deadline is not None and self.clock() >= self.deadline)
+        return not self.expired
+
+
+def _backtrack_prefix(task):
+    """Runs backtrack() below the given prefix in a worker process of search_parallel().
+
+    Returns a tuple of the solutions, if the search ran out of time and the number of
+    nodes visited. The solutions are packed into the bytes of an array of their indices,
+    which is much faster to send back than a list of tuples.
+    """
+    domains, occupied, prefix, limit, deadline, generation = task
+    budget = TaskBudget(deadline, generation)
+    if budget.cancelled() or (deadline is not None and budget.clock() >= deadline):
+        return '', True, 0
+    depth = len(prefix)
+    restricted = [[domains[i][k]] for i, k in enumerate(prefix)] + list(domains[depth:])
+    solutions = array('L')
+    count = 0
+    for indices in backtrack(restricted, occupied, budget=budget):
+        solutions.extend(prefix + indices[depth:])
+        count += 1
+        if limit is not None and count >= limit:
+            break
+    return solutions.tostring(), budget.expired, budget.nodes
+
+
+def _unpack_solutions(data, width):
+    "Returns the solutions packed by _backtrack_prefix() as a list of index tuples."
+    solutions = array('L')
+    solutions.fromstring(data)
+    return zip(*[iter(solutions)] * width)
+
+
+def _merge_prefix_results(results, width, budget):
+    """Yields the solutions of each prefix of ``width`` domains in order, stopping after
+    one that ran out of time or once the deadline of the budget has passed.
+    """
+    while True:
+        timeout = None
+        if budget is not None and budget.deadline is not None:
+            timeout = max(budget.deadline - budget.clock(), 0)
+        try:
+            data, expired, nodes = results.next(timeout)
+        except StopIteration:
+            return
+        except multiprocessing.TimeoutError:
+            budget.expired = True
+            return
+        if budget is not None:
+            budget.nodes += nodes
+        for solution in _unpack_solutions(data, width):
+            yield solution
+        if expired:
+            if budget is not None:
+                budget.expired = True
+            return
+
+
+_pool = None
+_pool_processes = None
+_pool_generation = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(processes):
+    """Returns the pool of worker processes of search_parallel() and the generation of
+    its searches. The pool is started once per process, and again only if a different
+    number of processes is needed.
+    """
+    global _pool, _pool_processes, _pool_generation
+    with _pool_lock:
+        if _pool is None or _pool_processes != processes:
+            if _pool is not None:
+                _close_pool()
+            generation = multiprocessing.RawValue('L', 0)
+            _pool = multiprocessing.Pool(processes, _init_worker, (generation,))
+            _pool_processes, _pool_generation = processes, generation
+        return _pool, _pool_generation.value
+
+
+def cancel_searches(generation):
+    "Stops the tasks of the searches of the given generation that are still running."
+    with _pool_lock:
+        if _pool_generation is not None and _pool_generation.value == generation:
+            _pool_generation.value += 1
+
+
+def _close_pool():
+    # the workers are never terminated: one killed while sending its results would
+    # keep the lock of the results queue forever.
+    global _pool, _pool_processes, _pool_generation
+    if _pool is not None:
+        _pool_generation.value += 1
+        _pool.close()
+        _pool, _pool_processes, _pool_generation = None, None, None
+
+
+@atexit.register
+def close_pool():
+    "Stops the pool of worker processes, waiting for their tasks to be cancelled."
+    with _pool_lock:
+        pool = _pool
+        _close_pool()
+    if pool is not None:
+        pool.join()
+
+
+def search_parallel(domains, occupied=0, processes=None, limit=None, budget=None):
+    """Like search(), but the backtracking is done by a pool of worker processes.
+
+    Each component of the conflict graph is split by the values of its first domains
+    (see split_prefixes) and every prefix is searched by a worker. The results are
+    merged in the same order search() produces them. Only ``limit`` solutions are
+    needed from each prefix if given.
+
+    The workers only get lists of integers, so there is nothing to pickle but the
+    masks. The deadline of the budget applies to the whole search: workers stop a little
+    before it, skip the prefixes they start after it and the results are not waited for
+    past it. The tasks of a search stopped early are cancelled, and the pool is kept for
+    the next searches. Falls back to search() if worker processes cannot be started
+    (eg - inside a daemon process).
+    """
+    class_domains, members = equivalence_classes(domains)
+    if any(len(domain) == 0 for domain in class_domains):
+        return
+    processes = processes or multiprocessing.cpu_count()
+    deadline = None
+    if budget is not None and budget.deadline is not None:
+        # the budget may have its own clock, the workers use time.time().
+        deadline = time.time() + (1 - RESULTS_MARGIN) * max(budget.deadline - budget.clock(), 0)
+    try:
+        pool, generation = get_pool(processes)
+    except (AssertionError, OSError):
+        for indices in search(domains, occupied, budget=budget):
+            yield indices
+        return
+
+    finished = False
+    try:
+        groups = components(class_domains)
+        sequences = []
+        for group in groups:
+            sub_domains = [class_domains[i] for i in group]
+            tasks = [
+                (sub_domains, occupied, prefix, limit, deadline, generation)
+                for prefix in split_prefixes(sub_domains, occupied, target=processes * 4)
+            ]
+            results = pool.imap(_backtrack_prefix, tasks)
+            sequences.append(LazySequence(_merge_prefix_results(results, len(sub_domains), budget)))
+        if any(sequence.is_empty() for sequence in sequences):
+            return
+        size = len(domains)
+        for count, parts in enumerate(lazy_product(sequences), 1):
+            if deadline is not None and not count % budget.check_interval and budget.clock() >= budget.deadline:
+                budget.expired = True
+                break
+            class_indices = [0] * size
+            for group, part in zip(groups, parts):
+                for i, index in zip(group, part):
+                    class_indices[i] = index
+            for indices in product(*[members[i][k] for i, k in enumerate(class_indices)]):
+                yield indices
+        finished = True
+    finally:
+        if not finished:
+            cancel_searches(generation)
@@ -0,0 +1,247 @@
+"""Memoizes the schedules of selections in the Django cache.
+
+Selections usually change one course at a time, so the schedules of a selection can
+often be derived from a selection computed earlier instead of searching again:
+
+- Adding a course extends each cached schedule with the sections of the new course that
+  fit in it.
+- Removing a course drops it from each cached schedule and removes the duplicates. This
+  is only done when every schedule of the smaller selection is sure to be in the cached
+  ones, which is when the removed courses still fit in any schedule of it.
+
+Only complete results are stored. The store keeps an index of the most recently used
+selections and removes the least recently used ones once it is full.
+
+Like the ScheduleResultCache, selections are keyed with the data version of their
+semesters, so a change of periods or conflicts makes the older selections unreachable.
+Stored periods must still match the selection's, in case they changed without a new
+version (eg - in a transaction that is not committed yet).
+"""
+import hashlib
+
+from django.core.cache import cache as default_cache
+
+from scheduler.results import ScheduleResultCache
+from scheduler.solver import backtrack, section_mask, time_range_mask
+
+
+__all__ = ['ScheduleStore']
+
+
+class ScheduleStore(object):
+    """Stores the schedules of selections, keyed by their sorted section ids and the data
+    versions of their semesters.
+
+    ``cache``: The Django cache to use. Defaults to the default cache.
+    ``max_entries``: The number of selections to keep.
+    ``timeout``: The number of seconds to keep them for. Defaults to the cache's timeout.
+    ``max_schedules``: Selections with more schedules than this are not stored or derived.
+
+    Schedules are JSON-friendly dictionaries of course id (as a string) to section id.
+    """
+    prefix = 'scheduler:schedules:'
+
+    def __init__(self, cache=None, max_entries=100, timeout=None, max_schedules=2000):
+        self.cache = cache or default_cache
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.max_schedules = max_schedules
+        self.results = ScheduleResultCache(cache=self.cache)
+
+    def __repr__(self):
+        return "<ScheduleStore: %d entries>" % len(self.get_index())
+
+    def versions_of(self, selected_courses):
+        """Returns the current data versions of the semesters of the given dictionary of
+        course to sections. Get them before computing the schedules to set, so schedules
+        are never stored with a version newer than their data.
+        """
+        return self.results.get_versions(
+            section.semester_id for sections in selected_courses.values() for section in sections)
+
+    def get(self, selected_courses, versions=None):
+        """Returns the schedules of the given dictionary of course to sections, or None
+        if they cannot be found or derived from the stored selections of the given (or
+        current) data versions.
+        """
+        if versions is None:
+            versions = self.versions_of(selected_courses)
+        sections = self.sections_by_course(selected_courses)
+        section_ids = self.section_ids(sections)
+        periods = self.section_periods(selected_courses)
+        key = self.key(section_ids, versions)
+        entry = self.cache.get(key)
+        if entry is not None and entry['sections'] == sections and entry['periods'] == periods:
+            self.touch(key, section_ids)
+            return self.as_schedules(entry['course_ids'], entry['schedules'])
+
+        masks = self.section_masks(selected_courses)
+        schedules = self.extend(sections, periods, masks, versions)
+        if schedules is None:
+            schedules = self.project(sections, periods, masks, versions)
+        if schedules is not None:
+            self.set(selected_courses, schedules, versions)
+        return schedules
+
+    def set(self, selected_courses, schedules, versions=None):
+        """Stores the complete list of schedules of the given dictionary of course to
+        sections, computed from the data of the given (or current) versions.
+        """
+        if len(schedules) > self.max_schedules:
+            return
+        if versions is None:
+            versions = self.versions_of(selected_courses)
+        sections = self.sections_by_course(selected_courses)
+        section_ids = self.section_ids(sections)
+        course_ids = sorted(sections)
+        entry = {
+            'sections': sections,
+            'course_ids': course_ids,
+            'versions': versions,
+            'periods': self.section_periods(selected_courses),
+            'schedules': sorted(
+                tuple(schedule[str(course_id)] for course_id in course_ids)
+                for schedule in schedules
+            ),
+        }
+        key = self.key(section_ids, versions)
+        self.cache.set(key, entry, self.timeout)
+        self.touch(key, section_ids)
+
+    def clear(self):
+        "Removes all the stored selections."
+        index = self.get_index()
+        self.cache.delete_many([key for key, section_ids in index] + [self.index_key()])
+
+    # internal methods
+    def key(self, section_ids, versions):
+        "Internal use. Returns the cache key of the sorted section ids and the semester versions."
+        data = '%s|%s' % (
+            ','.join(str(i) for i in section_ids),
+            ','.join('%d:%d' % item for item in sorted(versions.items())),
+        )
+        return self.prefix + hashlib.sha1(data).hexdigest()
+
+    def index_key(self):
+        return self.prefix + 'index'
+
+    def is_current(self, entry, versions):
+        "Internal use. Returns True if the entry was stored with the current versions of its semesters."
+        versions = dict(versions)
+        versions.update(self.results.get_versions(set(entry['versions']) - set(versions)))
+        return all(versions[semester_id] == version for semester_id, version in entry['versions'].items())
+
+    def get_index(self):
+        "Internal use. Returns the list of (key, section ids) of the stored selections, oldest first."
+        return self.cache.get(self.index_key()) or []
+
+    def touch(self, key, section_ids):
+        """Internal use. Marks the given selection as the most recently used one and
+        removes the least recently used ones if the store is full.
+        """
+        index = [item for item in self.get_index() if item[0] != key]
+        index.append((key, frozenset(section_ids)))
+        evicted = index[:-self.max_entries]
+        index = index[-self.max_entries:]
+        if evicted:
+            self.cache.delete_many([item[0] for item in evicted])
+        self.cache.set(self.index_key(), index, self.timeout)
+
+    def sections_by_course(self, selected_courses):
+        "Internal use. Returns a dictionary of course id to the sorted ids of its sections."
+        return dict(
+            (course.id, sorted(section.id for section in sections))
+            for course, sections in selected_courses.items()
+        )
+
+    def section_ids(self, sections):
+        "Internal use. Returns the sorted section ids of the dictionary of course id to section ids."
+        return sorted(section_id for section_ids in sections.values() for section_id in section_ids)
+
+    def section_periods(self, selected_courses):
+        "Internal use. Returns a dictionary of section id to the tuples of its periods."
+        return dict(
+            (section.id, [period.to_tuple() for period in section.get_periods()])
+            for sections in selected_courses.values()
+            for section in sections
+        )
+
+    def section_masks(self, selected_courses):
+        "Internal use. Returns a dictionary of section id to its week mask."
+        return dict(
+            (section.id, section_mask(section))
+            for sections in selected_courses.values()
+            for section in sections
+        )
+
+    def as_schedules(self, course_ids, schedules):
+        "Internal use. Returns the stored schedules as dictionaries of course id to section id."
+        course_ids = [str(course_id) for course_id in course_ids]
+        return [dict(zip(course_ids, schedule)) for schedule in schedules]
+
+    def extend(self, sections, periods, masks, versions):
+        """Internal use. Returns the schedules derived from a stored selection with one
+        course less, or None if there is none.
+        """
+        section_ids = self.section_ids(sections)
+        candidates = {}
+        for course_id in sorted(sections):
+            subset = [i for i in section_ids if i not in set(sections[course_id])]
+            # a selection of fewer semesters is not found, as its key has fewer versions.
+            candidates[self.key(subset, versions)] = (course_id, subset)
+        entries = self.cache.get_many(candidates.keys())
+        for key in sorted(entries, key=lambda key: candidates[key][0]):
+            course_id, subset = candidates[key]
+            entry = entries[key]
+            expected = dict((cid, ids) for cid, ids in sections.items() if cid != course_id)
+            if entry['sections'] != expected or any(entry['periods'][i] != periods[i] for i in subset):
+                continue
+            self.touch(key, subset)
+            # the new course's section goes at its place among the sorted course ids.
+            position = sorted(sections).index(course_id)
+            schedules = []
+            for schedule in entry['schedules']:
+                used = reduce(lambda mask, section_id: mask | masks[section_id], schedule, 0)
+                for section_id in sections[course_id]:
+                    if not masks[section_id] & used:
+                        schedules.append(schedule[:position] + (section_id,) + schedule[position:])
+                if len(schedules) > self.max_schedules:
+                    return None
+            return self.as_schedules(sorted(sections), sorted(schedules))
+        return None
+
+    def project(self, sections, periods, masks, versions):
+        """Internal use. Returns the schedules derived from a stored selection with more
+        courses, or None if there is none or the projection could miss schedules.
+        """
+        section_ids = frozenset(self.section_ids(sections))
+        for key, stored_ids in reversed(self.get_index()):
+            if not section_ids < stored_ids:
+                continue
+            entry = self.cache.get(key)
+            if entry is None:
+                continue
+            extra_courses = [cid for cid in entry['sections'] if cid not in sections]
+            if any(entry['sections'].get(cid) != ids for cid, ids in sections.items()):
+                continue
+            if any(entry['periods'][i] != periods[i] for i in section_ids):
+                continue
+            if not self.is_current(entry, versions):
+                continue
+            # every schedule of the selection extends to one of the stored selection if the
+            # removed courses fit in the time left by all of the selection's sections.
+            used = reduce(lambda mask, section_id: mask | masks[section_id], section_ids, 0)
+            extra_domains = [
+                [
+                    reduce(lambda mask, period: mask | time_range_mask(*period), entry['periods'][section_id], 0)
+                    for section_id in entry['sections'][cid]
+                ]
+                for cid in extra_courses
+            ]
+            if not any(True for solution in backtrack(extra_domains, used)):
+                continue
+            self.touch(key, stored_ids)
+            positions = [entry['course_ids'].index(cid) for cid in sorted(sections)]
+            projected = sorted(set(tuple(schedule[i] for i in positions) for schedule in entry['schedules']))
+            return self.as_schedules(sorted(sections), projected)
+        return None
@@ -1,4 +1,7 @@
-from django.db import transaction
+import multiprocessing
+import os
+
+from django.db import connection
 from django.conf import settings
 
 from celery import shared_task
@@ -7,20 +10,99 @@ from yacs import celery_app
 from courses.bridge import import_courses as bridge_import_courses
 from courses.models import Semester
 from scheduler import models
+from scheduler.results import ScheduleResultCache
+from scheduler.store import ScheduleStore
+
+
+# the file listing the ids of the semesters computed by an unfinished compute_conflicts().
+CONFLICTS_PROGRESS_FILE = getattr(settings, 'SCHEDULER_CONFLICTS_PROGRESS_FILE', None)
+
+
+def read_progress(path):
+    "Returns the set of semester ids in the progress file, empty if there is none."
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path) as handle:
+        return set(int(line) for line in handle if line.strip().isdigit())
+
+
+def write_progress(path, semester_ids):
+    "Replaces the progress file with the given semester ids. Does nothing without a path."
+    if not path:
+        return
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as handle:
+        handle.writelines('%d\n' % semester_id for semester_id in sorted(semester_ids))
+
+
+def _cache_semester_conflicts(args):
+    "Computes the conflicts of a semester in a worker process. Returns the semester's id."
+    semester_id, options = args
+    models.cache_conflicts(semester=Semester.objects.get(id=semester_id), **options)
+    return semester_id
+
+
+def _imap_unordered(function, tasks, processes):
+    """Yields the results of the function for each task as they are done, from a pool of
+    processes. Runs the tasks in this process if only one process is used or worker
+    processes cannot be started (eg - inside a daemon process).
+    """
+    if processes > 1 and len(tasks) > 1:
+        # each worker opens its own connection.
+        connection.close()
+        try:
+            pool = multiprocessing.Pool(min(processes, len(tasks)))
+        except (AssertionError, OSError):
+            pass
+        else:
+            try:
+                for result in pool.imap_unordered(function, tasks):
+                    yield result
+            finally:
+                pool.terminate()
+            return
+    for task in tasks:
+        yield function(task)
 
 
 @shared_task
-def compute_conflicts(all_semesters=False, sql=True):
-    with transaction.atomic():
-        semesters = Semester.objects.all()
-        if not all_semesters:
-            semesters = semesters[:1]
-        for semester in semesters:
-            print "Computing conflicts for %d-%d..." % (semester.year, semester.month)
-            models.cache_conflicts(semester=semester, sql=sql)
+def compute_conflicts(all_semesters=False, sql=True, reference=False, vectorized=False, processes=None,
+                      resume=False, progress_file=CONFLICTS_PROGRESS_FILE):
+    """Computes the conflicts of the latest semester, or of all of them.
+
+    The semesters are computed concurrently by ``processes`` worker processes (the number
+    of CPUs by default), each in its own transaction. The completed semesters are written
+    to the ``progress_file`` until all of them are, so an interrupted run can be
+    continued with ``resume``.
+    """
+    semesters = Semester.objects.all()
+    if not all_semesters:
+        semesters = semesters[:1]
+    semesters = list(semesters)
+    completed = read_progress(progress_file) if resume else set()
+    remaining = [semester for semester in semesters if semester.id not in completed]
+    if len(remaining) < len(semesters):
+        print "Resuming: %d of %d semesters already computed." % (len(semesters) - len(remaining), len(semesters))
+    write_progress(progress_file, completed)
+
+    names = dict((semester.id, '%d-%d' % (semester.year, semester.month)) for semester in remaining)
+    options = dict(sql=sql, reference=reference, vectorized=vectorized)
+    tasks = [(semester.id, options) for semester in remaining]
+    for count, semester_id in enumerate(_imap_unordered(
+            _cache_semester_conflicts, tasks, processes or multiprocessing.cpu_count())):
+        completed.add(semester_id)
+        write_progress(progress_file, completed)
+        print "Computed conflicts for %s (%d of %d)" % (names[semester_id], count + 1, len(tasks))
+    if progress_file and os.path.exists(progress_file):
+        os.remove(progress_file)
 
 
 @shared_task
 def clear_selection_cache():
-    with transaction.atomic():
-        models.Selection.objects.all().update(api_cache='')
+    "Forgets the stored schedules and the cached results of every semester."
+    ScheduleStore().clear()
+    results = ScheduleResultCache()
+    for semester_id in Semester.objects.values_list('id', flat=True):
+        results.bump_version(semester_id)
@@ -0,0 +1,97 @@
+import shutil
+import tempfile
+
+from django.test import TestCase
+from mock import patch
+
+from courses import models as courses
+from scheduler import conflicts
+from courses.signals import courses_imported
+from scheduler.conflicts import ConflictMatrix, conflicts_of, load_conflict_matrix
+from scheduler.models import (
+    SectionConflict, cache_conflicts, update_section_conflicts, publish_committed_changes
+)
+from scheduler.tests.test_scheduling import SchedulingTestCase, MWF, TR
+
+
+class ConflictMatrixTest(TestCase):
+    def setUp(self):
+        self.matrix = ConflictMatrix.from_pairs([(1, 5), (1, 3), (3, 5), (7, 9)])
+
+    def test_conflicts_of(self):
+        self.assertEqual([3, 5], list(self.matrix.conflicts_of(1)))
+        self.assertEqual([1, 3], list(self.matrix.conflicts_of(5)))
+        self.assertEqual([], list(self.matrix.conflicts_of(2)))
+        self.assertEqual([], list(self.matrix.conflicts_of(10)))
+
+    def test_as_dictionary(self):
+        self.assertEqual({
+            1: frozenset([5]),
+            5: frozenset([1]),
+        }, self.matrix.as_dictionary([1, 5, 7, 8]))
+
+    def test_to_string(self):
+        matrix = ConflictMatrix.from_string(self.matrix.to_string())
+        self.assertEqual(list(self.matrix.section_ids), list(matrix.section_ids))
+        self.assertEqual(list(self.matrix.offsets), list(matrix.offsets))
+        self.assertEqual(list(self.matrix.neighbours), list(matrix.neighbours))
+
+    def test_invalid_string(self):
+        self.assertRaises(ValueError, ConflictMatrix.from_string, '')
+        self.assertRaises(ValueError, ConflictMatrix.from_string, 'NOTCONFS' + self.matrix.to_string()[8:])
+        self.assertRaises(ValueError, ConflictMatrix.from_string, self.matrix.to_string()[:-1])
+
+
+class SemesterConflictMatrixTest(SchedulingTestCase):
+    def setUp(self):
+        super(SemesterConflictMatrixTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.patcher = patch.object(conflicts, 'CONFLICTS_DIR', self.directory)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        shutil.rmtree(self.directory)
+
+    def test_conflicts_of(self):
+        course1, (section1, section2) = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((12, 0), (12, 50), TR)],
+        )
+        course2, (section3,) = self.create_course([((10, 0), (10, 50), courses.Period.MONDAY)])
+        section_ids = [section1.id, section2.id, section3.id]
+        year, month = self.semester.year, self.semester.month
+        self.assertEqual(None, load_conflict_matrix(year, month))
+
+        cache_conflicts(semester=self.semester)
+        # the matrix is written once the conflicts are committed.
+        self.assertEqual(None, load_conflict_matrix(year, month))
+        publish_committed_changes()
+        self.assertNotEqual(None, load_conflict_matrix(year, month))
+        expected = sorted(SectionConflict.objects.conflicts_of(section_ids))
+        self.assertEqual([(section1.id, section3.id), (section3.id, section1.id)], expected)
+        # only the semesters of the sections are queried.
+        with self.assertNumQueries(1):
+            self.assertEqual(expected, sorted(conflicts_of(section_ids)))
+
+    def test_conflicts_of_semesters_without_matrix(self):
+        course1, (section1,) = self.create_course([((10, 0), (10, 50), MWF)])
+        course2, (section2,) = self.create_course([((10, 0), (10, 50), MWF)])
+        cache_conflicts(semester=self.semester)
+        self.assertEqual(
+            [(section1.id, section2.id), (section2.id, section1.id)],
+            sorted(conflicts_of([section1.id, section2.id])))
+
+    def test_updates_matrix_with_conflicts(self):
+        course1, (section1,) = self.create_course([((10, 0), (10, 50), MWF)])
+        course2, (section2,) = self.create_course([((12, 0), (12, 50), MWF)])
+        cache_conflicts(semester=self.semester)
+        publish_committed_changes()
+        self.assertEqual([], list(conflicts_of([section1.id, section2.id])))
+
+        courses.SectionPeriod.objects.filter(section=section2).update(period=section1.get_periods()[0])
+        update_section_conflicts(self.semester, [section2.id])
+        courses_imported.send(sender=self)
+        self.assertEqual(
+            [(section1.id, section2.id), (section2.id, section1.id)],
+            sorted(conflicts_of([section1.id, section2.id])))
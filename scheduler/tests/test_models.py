@@ -0,0 +1,156 @@
+import itertools
+import random
+from datetime import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from courses import models as courses
+from courses.signals import sections_modified
+from courses.tests.factories import SemesterFactory, SectionFactory
+from scheduler.models import (
+    SectionConflict, cache_conflicts, find_section_conflicts, find_section_conflicts_reference,
+    sync_section_conflicts, sync_section_conflicts_in_memory
+)
+from scheduler.tests.test_scheduling import SchedulingTestCase, MWF, TR
+
+
+class FindSectionConflictsTest(SchedulingTestCase):
+    def as_ids(self, conflicts):
+        return [(section1.id, section2.id) for section1, section2 in conflicts]
+
+    def test_matches_reference(self):
+        rand = random.Random(7)
+        days = [MWF, TR, courses.Period.MONDAY, courses.Period.FRIDAY]
+        selection = self.selection(*[
+            self.create_course(*[
+                [
+                    ((hour, 0), (hour + rand.choice([0, 1]), rand.choice([0, 50])), rand.choice(days))
+                    for hour in rand.sample(range(8, 18), rand.randint(0, 2))
+                ]
+                for j in range(rand.randint(1, 3))
+            ])
+            for i in range(8)
+        ])
+        expected = self.as_ids(find_section_conflicts_reference(selection))
+        self.assertTrue(expected)
+        self.assertEqual(expected, self.as_ids(find_section_conflicts(selection)))
+
+    def test_touching_periods_conflict(self):
+        course1, (section1,) = c1 = self.create_course([((10, 0), (10, 50), MWF)])
+        course2, (section2,) = c2 = self.create_course([((10, 50), (11, 40), courses.Period.MONDAY)])
+        course3, (section3,) = c3 = self.create_course([((11, 0), (11, 50), MWF)])
+        conflicts = find_section_conflicts(self.selection(c1, c2, c3))
+        self.assertEqual([(section1.id, section2.id), (section2.id, section3.id)], self.as_ids(conflicts))
+
+    def test_ignores_sections_of_the_same_course(self):
+        c1 = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((10, 0), (10, 50), MWF)],
+        )
+        self.assertEqual([], find_section_conflicts(self.selection(c1)))
+
+    def test_cache_conflicts(self):
+        course1, (section1,) = self.create_course([((10, 0), (10, 50), MWF)])
+        course2, (section2, section3) = self.create_course(
+            [((10, 30), (11, 20), courses.Period.MONDAY)],
+            [((10, 0), (10, 50), TR)],
+        )
+        cache_conflicts(semester=self.semester)
+        self.assertEqual(
+            [(section1.id, section2.id)],
+            list(SectionConflict.objects.values_list('section1', 'section2')))
+
+
+class UpdateSectionConflictsTest(SchedulingTestCase):
+    def conflicts(self):
+        return sorted(SectionConflict.objects.values_list('section1', 'section2'))
+
+    def test_updates_conflicts_of_modified_sections(self):
+        course1, (section1, section2) = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((12, 0), (12, 50), MWF)],
+        )
+        course2, (section3,) = self.create_course([((10, 0), (10, 50), courses.Period.MONDAY)])
+        course3, (section4,) = self.create_course([((12, 0), (12, 50), courses.Period.FRIDAY)])
+        cache_conflicts(semester=self.semester)
+        self.assertEqual([(section1.id, section3.id), (section2.id, section4.id)], self.conflicts())
+
+        # section3 moves to noon.
+        period, created = courses.Period.objects.get_or_create(start=time(12), end=time(12, 50), days_of_week_flag=MWF)
+        courses.SectionPeriod.objects.filter(section=section3).update(period=period)
+        sections_modified.send(sender=self, semester=self.semester, section_ids=[section3.id])
+        self.assertEqual(
+            [(section2.id, section3.id), (section2.id, section4.id), (section3.id, section4.id)],
+            self.conflicts())
+
+    def test_ignores_imports_without_modified_sections(self):
+        course1, (section1,) = self.create_course([((10, 0), (10, 50), MWF)])
+        course2, (section2,) = self.create_course([((10, 0), (10, 50), MWF)])
+        sections_modified.send(sender=self, semester=self.semester, section_ids=[])
+        self.assertEqual([], self.conflicts())
+
+
+class SyncSectionConflictsTest(SchedulingTestCase):
+    def setUp(self):
+        super(SyncSectionConflictsTest, self).setUp()
+        self.other_semester = SemesterFactory.create(year=self.semester.year + 1)
+        self.sections = [SectionFactory.create(semester=self.semester) for i in range(4)]
+        ids = [section.id for section in self.sections]
+        self.pairs = [(ids[0], ids[1]), (ids[0], ids[2]), (ids[1], ids[3])]
+        SectionConflict.objects.create(section1=self.sections[0], section2=self.sections[1], semester=self.other_semester)
+
+    def conflicts(self, semester):
+        return sorted(SectionConflict.objects.filter(semester=semester).values_list('section1', 'section2'))
+
+    def assert_syncs(self, sync):
+        ids = [section.id for section in self.sections]
+        self.assertEqual((3, 0), sync(self.semester, self.pairs))
+        self.assertEqual(self.pairs, self.conflicts(self.semester))
+        self.assertEqual((1, 2), sync(self.semester, [(ids[0], ids[1]), (ids[2], ids[3])]))
+        self.assertEqual([(ids[0], ids[1]), (ids[2], ids[3])], self.conflicts(self.semester))
+        self.assertEqual([(ids[0], ids[1])], self.conflicts(self.other_semester))
+
+    def test_sync_section_conflicts(self):
+        self.assert_syncs(sync_section_conflicts)
+
+    def test_sync_section_conflicts_in_memory(self):
+        self.assert_syncs(sync_section_conflicts_in_memory)
+
+    def test_sync_section_conflicts_query_count_is_flat(self):
+        ids = [section.id for section in self.sections]
+        pairs = list(itertools.combinations(ids, 2))
+        with CaptureQueriesContext(connection) as few:
+            sync_section_conflicts(self.semester, self.pairs[:1])
+        with CaptureQueriesContext(connection) as many:
+            sync_section_conflicts(self.semester, pairs)
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        # a statement per chunk of staged pairs.
+        with CaptureQueriesContext(connection) as chunked:
+            sync_section_conflicts(self.semester, pairs, chunk_size=2)
+        self.assertEqual(len(few.captured_queries) + (len(pairs) + 1) // 2 - 1, len(chunked.captured_queries))
+        self.assertEqual(sorted(pairs), self.conflicts(self.semester))
+
+
+class SectionConflictManagerTest(SchedulingTestCase):
+    def setUp(self):
+        super(SectionConflictManagerTest, self).setUp()
+        self.sections = [SectionFactory.create(semester=self.semester) for i in range(4)]
+        s = self.sections
+        for section1, section2 in [(s[0], s[1]), (s[0], s[2]), (s[2], s[3])]:
+            SectionConflict.objects.create(section1=section1, section2=section2, semester=self.semester)
+
+    def test_conflicts_of(self):
+        s = self.sections
+        self.assertEqual(
+            sorted([(s[0].id, s[1].id), (s[0].id, s[2].id), (s[2].id, s[0].id), (s[2].id, s[3].id)]),
+            sorted(SectionConflict.objects.conflicts_of([s[0].id, s[2].id])))
+        self.assertEqual(
+            [(s[3].crn, s[2].crn)], list(SectionConflict.objects.conflicts_of([s[3].id], field='crn')))
+
+    def test_conflicts_of_queries_each_side_per_batch(self):
+        section_ids = [section.id for section in self.sections]
+        with self.assertNumQueries(2):
+            list(SectionConflict.objects.conflicts_of(section_ids))
+        with self.assertNumQueries(4):
+            self.assertEqual(6, len(list(SectionConflict.objects.conflicts_of(section_ids, batch_size=2))))
@@ -0,0 +1,58 @@
+import random
+from StringIO import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+
+from courses import models as courses
+from scheduler import overlaps
+from scheduler.models import find_section_conflicts_reference
+from scheduler.tests.test_scheduling import SchedulingTestCase, MWF, TR
+
+
+class OverlapsTestCase(SchedulingTestCase):
+    def create_courses(self, seed=3, count=8):
+        rand = random.Random(seed)
+        days = [MWF, TR, courses.Period.MONDAY, courses.Period.FRIDAY]
+        return self.selection(*[
+            self.create_course(*[
+                [
+                    ((hour, 0), (hour + rand.choice([0, 1]), rand.choice([0, 50])), rand.choice(days))
+                    for hour in rand.sample(range(8, 18), rand.randint(0, 2))
+                ]
+                for j in range(rand.randint(1, 3))
+            ])
+            for i in range(count)
+        ])
+
+
+@skipUnless(overlaps.HAS_NUMPY, 'NumPy is not installed.')
+class FindConflictingPairsTest(OverlapsTestCase):
+    def as_ids(self, conflicts):
+        return [(section1.id, section2.id) for section1, section2 in conflicts]
+
+    def test_matches_reference(self):
+        selection = self.create_courses()
+        expected = self.as_ids(find_section_conflicts_reference(selection))
+        for block_size in (1, 5, overlaps.BLOCK_SIZE):
+            self.assertEqual(expected, self.as_ids(overlaps.find_section_conflicts(selection, block_size)))
+
+    def test_returns_arrays(self):
+        course1, (section1,) = c1 = self.create_course([((10, 0), (10, 50), MWF)])
+        course2, (section2,) = c2 = self.create_course([((10, 50), (11, 40), courses.Period.MONDAY)])
+        sections1, sections2 = overlaps.find_conflicting_pairs(overlaps.section_period_arrays(self.selection(c1, c2)))
+        self.assertEqual([section1.id], sections1.tolist())
+        self.assertEqual([section2.id], sections2.tolist())
+
+    def test_no_periods(self):
+        self.assertEqual([], overlaps.find_section_conflicts({}))
+
+
+class BenchmarkConflictsCommandTest(OverlapsTestCase):
+    def test_benchmark_conflicts(self):
+        self.create_courses()
+        stdout = StringIO()
+        call_command('benchmark_conflicts', repeat=1, stdout=stdout)
+        output = stdout.getvalue()
+        self.assertTrue('reference' in output)
+        self.assertTrue('table' in output)
@@ -0,0 +1,112 @@
+from datetime import time
+from itertools import product
+
+from django.test import TestCase
+
+from courses import models
+from scheduler import ranking, solver
+from scheduler.scheduling import compute_schedules, rank_schedules
+from scheduler.tests.test_scheduling import SchedulingTestCase, MWF, TR
+
+
+def mask(start, end, days):
+    return solver.time_range_mask(time(*start), time(*end), days)
+
+
+class CostTest(TestCase):
+    def test_days_on_campus(self):
+        self.assertEqual(0, ranking.DaysOnCampus()(0))
+        self.assertEqual(3, ranking.DaysOnCampus()(mask((10, 0), (10, 50), MWF)))
+
+    def test_early_classes(self):
+        week = mask((8, 0), (8, 50), models.Period.MONDAY) | mask((10, 0), (10, 50), MWF)
+        self.assertEqual(1, ranking.EarlyClasses()(week))
+        self.assertEqual(3, ranking.EarlyClasses(before=11 * 60)(week))
+
+    def test_gaps(self):
+        week = mask((10, 0), (10, 50), MWF) | mask((12, 0), (12, 50), models.Period.MONDAY)
+        self.assertEqual(69, ranking.Gaps()(week))
+
+    def test_gaps_lower_bound(self):
+        week = mask((10, 0), (10, 50), MWF) | mask((12, 0), (12, 50), models.Period.MONDAY)
+        fillable = mask((11, 0), (11, 50), models.Period.MONDAY)
+        self.assertEqual(69, ranking.Gaps().lower_bound(week, 0))
+        self.assertEqual(18, ranking.Gaps().lower_bound(week, fillable))
+
+    def test_get_cost(self):
+        self.assertTrue(isinstance(ranking.get_cost('days'), ranking.DaysOnCampus))
+        cost = ranking.get_cost('days, gaps')
+        self.assertEqual((3, 0), cost(mask((10, 0), (10, 50), MWF)))
+        self.assertTrue(isinstance(ranking.get_cost(len), ranking.FunctionCost))
+        self.assertRaises(ValueError, ranking.get_cost, 'days,unknown')
+        self.assertRaises(ValueError, ranking.get_cost, '')
+
+
+class RankTest(TestCase):
+    def brute_force(self, domains, cost):
+        values = []
+        for indices in product(*[range(len(domain)) for domain in domains]):
+            masks = [domain[i] for domain, i in zip(domains, indices)]
+            if not any(m1 & m2 for i, m1 in enumerate(masks) for m2 in masks[i + 1:]):
+                values.append(cost(reduce(lambda a, b: a | b, masks, 0)))
+        return sorted(values)
+
+    def setUp(self):
+        self.domains = [
+            [mask((8, 0), (8, 50), MWF), mask((10, 0), (10, 50), MWF), mask((14, 0), (15, 15), TR)],
+            [mask((9, 0), (9, 50), TR), mask((10, 0), (11, 15), TR), mask((12, 0), (12, 50), MWF)],
+            [mask((13, 0), (13, 50), MWF), mask((8, 0), (9, 15), TR), mask((13, 0), (13, 50), MWF)],
+        ]
+
+    def test_rank_matches_brute_force(self):
+        for name in ('days', 'early', 'gaps', 'gaps,days'):
+            cost = ranking.get_cost(name)
+            expected = self.brute_force(self.domains, cost)
+            for top in (1, 2, 5, None):
+                values = [value for value, indices in solver.search_ranked(self.domains, cost, top)]
+                self.assertEqual(expected[:top], values)
+
+    def test_rank_skips_branches(self):
+        cost = ranking.get_cost('days')
+        full, pruned = solver.SearchBudget(), solver.SearchBudget()
+        solver.search_ranked(self.domains, cost, budget=full)
+        solver.search_ranked(self.domains, cost, top=1, budget=pruned)
+        self.assertTrue(pruned.nodes < full.nodes)
+
+    def test_function_cost(self):
+        ranked = solver.search_ranked(self.domains, ranking.FunctionCost(lambda mask: -mask), top=1)
+        best = max(
+            reduce(lambda a, b: a | b, [self.domains[i][k] for i, k in enumerate(indices)])
+            for indices in solver.search(self.domains))
+        self.assertEqual([-best], [value for value, indices in ranked])
+
+
+class RankSchedulesTest(SchedulingTestCase):
+    def test_rank_schedules(self):
+        c1 = self.create_course(
+            [((8, 0), (8, 50), MWF)],
+            [((10, 0), (10, 50), TR)],
+        )
+        c2 = self.create_course(
+            [((9, 0), (9, 50), MWF)],
+            [((11, 0), (11, 50), TR)],
+        )
+        course1, sections1 = c1
+        course2, sections2 = c2
+        result = rank_schedules(self.selection(c1, c2), free_sections_only=False, rank_by='days', top=1)
+        self.assertEqual([{course1: sections1[1], course2: sections2[1]}], result.schedules)
+        self.assertEqual([2], result.costs)
+        self.assertFalse(result.truncated)
+
+    def test_compute_schedules_with_rank_by(self):
+        c1 = self.create_course(
+            [((8, 0), (8, 50), MWF)],
+            [((10, 0), (10, 50), TR)],
+            [((12, 0), (12, 50), MWF)],
+        )
+        selection = self.selection(c1)
+        schedules = compute_schedules(selection, free_sections_only=False, rank_by='early,days')
+        course, sections = c1
+        self.assertEqual([sections[1], sections[2], sections[0]], [s[course] for s in schedules])
+        schedules = compute_schedules(selection, free_sections_only=False, rank_by='early,days', top=2)
+        self.assertEqual([sections[1], sections[2]], [s[course] for s in schedules])
@@ -0,0 +1,57 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase
+
+from courses.signals import sections_modified, courses_imported
+from courses.tests.factories import SemesterFactory, SectionFactory
+from scheduler.models import update_section_conflicts, publish_committed_changes
+from scheduler.results import ScheduleResultCache
+
+
+class ScheduleResultCacheTest(TestCase):
+    def setUp(self):
+        self.results = ScheduleResultCache(cache=LocMemCache('schedule-results-test', {}))
+        self.results.cache.clear()
+        self.semester1, self.semester2 = SemesterFactory.create(year=2012), SemesterFactory.create(year=2013)
+        self.section1 = SectionFactory.create(semester=self.semester1)
+        self.section2 = SectionFactory.create(semester=self.semester2)
+
+    def test_key_of_is_canonical(self):
+        self.assertEqual(
+            self.results.key_of([self.section1, self.section2]),
+            self.results.key_of([self.section2, self.section1, self.section2]))
+        self.assertNotEqual(self.results.key_of([self.section1]), self.results.key_of([self.section2]))
+
+    def test_bumping_a_version_hides_results(self):
+        key = self.results.key_of([self.section1, self.section2])
+        self.results.set(key, {'schedules': []})
+        self.assertEqual({'schedules': []}, self.results.get(self.results.key_of([self.section1, self.section2])))
+
+        self.results.bump_version(self.semester2.id)
+        self.assertEqual(None, self.results.get(self.results.key_of([self.section1, self.section2])))
+
+    def test_evicted_versions_are_not_reused(self):
+        key = self.results.key_of([self.section1])
+        self.results.cache.delete(self.results.version_key(self.semester1.id))
+        self.results.bump_version(self.semester1.id)
+        self.assertNotEqual(key, self.results.key_of([self.section1]))
+
+
+class BumpVersionTest(TestCase):
+    def test_updating_conflicts_bumps_version(self):
+        section = SectionFactory.create()
+        results = ScheduleResultCache()
+        key = results.key_of([section])
+        update_section_conflicts(section.semester, [section.id])
+        # not until the changes are committed.
+        self.assertEqual(key, results.key_of([section]))
+        publish_committed_changes()
+        self.assertNotEqual(key, results.key_of([section]))
+
+    def test_import_bumps_version_once_committed(self):
+        section = SectionFactory.create()
+        results = ScheduleResultCache()
+        key = results.key_of([section])
+        sections_modified.send(sender=self, semester=section.semester, section_ids=[section.id])
+        self.assertEqual(key, results.key_of([section]))
+        courses_imported.send(sender=self)
+        self.assertNotEqual(key, results.key_of([section]))
@@ -0,0 +1,64 @@
+from StringIO import StringIO
+
+from django.core.management import call_command
+
+from courses import models as courses
+from courses.tests.factories import SectionCrosslistingFactory
+from scheduler import rooms
+from scheduler.rooms import RoomOccupancy, get_room_occupancy
+from scheduler.scheduling import parse_time_window
+from scheduler.tests.test_scheduling import SchedulingTestCase, MWF, TR
+
+
+class RoomOccupancyTest(SchedulingTestCase):
+    def setUp(self):
+        super(RoomOccupancyTest, self).setUp()
+        self.course1, (self.section1, self.section2) = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((10, 30), (11, 20), courses.Period.MONDAY)],
+        )
+        self.course2, (self.section3,) = self.create_course([((12, 0), (12, 50), TR)])
+        self.set_location(self.section1, 'DCC 308')
+        self.set_location(self.section2, 'DCC 308')
+        self.set_location(self.section3, ' Sage 3303 ')
+
+    def tearDown(self):
+        rooms._occupancies.clear()
+
+    def set_location(self, section, location):
+        courses.SectionPeriod.objects.filter(section=section).update(location=location)
+
+    def windows(self, *windows):
+        return [parse_time_window(window) for window in windows]
+
+    def test_free_rooms(self):
+        occupancy = RoomOccupancy.for_semester(self.semester)
+        self.assertEqual(set(['DCC 308', 'Sage 3303']), occupancy.locations)
+        self.assertEqual(['Sage 3303'], occupancy.free_rooms(self.windows('Monday_10:00-11:00')))
+        self.assertEqual(['DCC 308'], occupancy.free_rooms(self.windows('Tuesday_12:50-13:00')))
+        self.assertEqual(['DCC 308', 'Sage 3303'], occupancy.free_rooms(self.windows('Wednesday_11:00-12:00')))
+
+    def test_double_bookings(self):
+        self.assertEqual(
+            [('DCC 308', self.section1.id, self.section2.id)],
+            RoomOccupancy.for_semester(self.semester).double_bookings())
+
+        self.set_location(self.section2, 'Sage 3303')
+        self.assertEqual([], RoomOccupancy.for_semester(self.semester).double_bookings())
+
+    def test_crosslisted_sections_share_rooms(self):
+        crosslisting = SectionCrosslistingFactory.create(semester=self.semester)
+        courses.Section.objects.filter(id__in=[self.section1.id, self.section2.id]).update(crosslisted=crosslisting)
+        self.assertEqual([], RoomOccupancy.for_semester(self.semester).double_bookings())
+
+    def test_rebuilds_when_asked(self):
+        occupancy = get_room_occupancy(self.semester)
+        self.assertTrue(occupancy is get_room_occupancy(self.semester))
+        self.assertFalse(occupancy is get_room_occupancy(self.semester, rebuild=True))
+
+    def test_room_conflicts_command(self):
+        stdout = StringIO()
+        call_command('room_conflicts', stdout=stdout)
+        output = stdout.getvalue()
+        self.assertTrue('DCC 308: CRN %s and CRN %s' % (self.section1.crn, self.section2.crn) in output)
+        self.assertTrue('1 double-booked rooms' in output)
@@ -0,0 +1,471 @@
+from datetime import time
+from itertools import islice, product
+import random
+
+from django.test import TestCase
+
+from courses import models
+from courses.tests.factories import (
+    SemesterFactory, CourseFactory, PeriodFactory, SectionFactory, SectionPeriodFactory
+)
+from scheduler import solver, scheduling
+from scheduler.scheduling import (
+    Scheduler, InvalidCursor, compute_schedules, compute_schedules_page, count_schedules,
+    search_schedules, parse_blocked_time, parse_blocked_times, parse_time_window
+)
+
+
+class FakeClock(object):
+    "A clock that moves forward a second every time it is read."
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+MWF = models.Period.MONDAY | models.Period.WEDNESDAY | models.Period.FRIDAY
+TR = models.Period.TUESDAY | models.Period.THURSDAY
+
+
+class SchedulingTestCase(TestCase):
+    def setUp(self):
+        self.semester = SemesterFactory.create()
+
+    def create_course(self, *sections):
+        """Creates a course with a section for each list of (start, end, dow) tuples.
+
+        Returns a tuple of the course and its sections.
+        """
+        course = CourseFactory.create()
+        section_objs = []
+        for periods in sections:
+            section = SectionFactory.create(course=course, semester=self.semester)
+            for start, end, dow in periods:
+                period, created = models.Period.objects.get_or_create(
+                    start=time(*start), end=time(*end), days_of_week_flag=dow)
+                SectionPeriodFactory.create(period=period, section=section, semester=self.semester)
+            section_objs.append(section)
+        return course, section_objs
+
+    def selection(self, *courses):
+        "Returns the {course: sections} dictionary the scheduler expects."
+        return dict((course, sections) for course, sections in courses)
+
+    def brute_force(self, selection):
+        "Reference implementation using Section.conflicts_with."
+        courses = selection.keys()
+        schedules = []
+        for sections in product(*[selection[c] for c in courses]):
+            if not any(s1.conflicts_with(s2) for i, s1 in enumerate(sections) for s2 in sections[i + 1:]):
+                schedules.append(dict(zip(courses, sections)))
+        return schedules
+
+    def as_ids(self, schedules):
+        return sorted(tuple(sorted((c.id, s.id) for c, s in schedule.items())) for schedule in schedules)
+
+
+class SolverTest(TestCase):
+    def test_time_range_mask_is_inclusive(self):
+        mask1 = solver.time_range_mask(time(10), time(10, 50), models.Period.MONDAY)
+        mask2 = solver.time_range_mask(time(10, 50), time(11, 40), models.Period.MONDAY)
+        mask3 = solver.time_range_mask(time(11), time(11, 50), models.Period.MONDAY)
+        self.assertTrue(mask1 & mask2)
+        self.assertFalse(mask1 & mask3)
+
+    def test_time_range_mask_by_days(self):
+        mask1 = solver.time_range_mask(1000, 1050, ['monday', 'wednesday'])
+        mask2 = solver.time_range_mask(time(10), time(10, 50), models.Period.TUESDAY)
+        mask3 = solver.time_range_mask(time(10), time(10, 50), models.Period.WEDNESDAY)
+        self.assertFalse(mask1 & mask2)
+        self.assertTrue(mask1 & mask3)
+
+    def test_time_range_mask_for_tba(self):
+        self.assertEqual(0, solver.time_range_mask(None, None, MWF))
+
+    def test_backtrack(self):
+        domains = [[0b001, 0b010], [0b011, 0b100]]
+        self.assertEqual([(0, 1), (1, 1)], list(solver.backtrack(domains)))
+
+    def test_backtrack_with_occupied(self):
+        domains = [[0b001, 0b010], [0b011, 0b100]]
+        self.assertEqual([(1, 1)], list(solver.backtrack(domains, occupied=0b001)))
+
+    def test_backtrack_without_domains(self):
+        self.assertEqual([()], list(solver.backtrack([])))
+        self.assertEqual([], list(solver.backtrack([[1], []])))
+
+    def test_backtrack_from_start(self):
+        domains = [[0b001, 0b010, 0b100], [0b001, 0b010, 0b100]]
+        solutions = list(solver.backtrack(domains))
+        self.assertEqual(solutions[2:], list(solver.backtrack(domains, start=solutions[2])))
+        self.assertEqual(solutions[3:], list(solver.backtrack(domains, start=(1, 1))))
+
+    def test_search_from_start(self):
+        domains = [[0b0001, 0b0010, 0b0001], [0b1000], [0b0011, 0b0100], [0b1100, 0b0100, 0b10000]]
+        solutions = list(solver.search(domains))
+        for i, start in enumerate(solutions):
+            self.assertEqual(solutions[i:], list(solver.search(domains, start=start)))
+
+    def test_search_stops_when_the_budget_expires(self):
+        domains = [[0b001, 0b010, 0b100], [0b001, 0b010, 0b100], [0b1000, 0b10000]]
+        budget = solver.SearchBudget(timeout=3, check_interval=1, clock=FakeClock())
+        solutions = list(solver.search(domains, budget=budget))
+        self.assertTrue(budget.expired)
+        self.assertEqual(3, budget.nodes)
+        self.assertEqual(list(solver.search(domains))[:len(solutions)], solutions)
+
+    def test_search_without_timeout(self):
+        domains = [[0b001, 0b010, 0b100], [0b001, 0b010, 0b100]]
+        budget = solver.SearchBudget()
+        self.assertEqual(6, len(list(solver.search(domains, budget=budget))))
+        self.assertFalse(budget.expired)
+        self.assertTrue(budget.nodes > 0)
+
+    def test_search_parallel_matches_search(self):
+        domains = [[0b0001, 0b0010, 0b0001], [0b1000], [0b0011, 0b0100], [0b1100, 0b0100, 0b10000], [0b100000, 0b1]]
+        self.assertEqual(list(solver.search(domains)), list(solver.search_parallel(domains, processes=2)))
+
+    def test_search_parallel_stops_at_the_deadline(self):
+        domains = [[1 << i for i in range(12)]] * 9
+        budget = solver.SearchBudget(0.2)
+        solutions = list(solver.search_parallel(domains, processes=2, budget=budget))
+        self.assertTrue(budget.elapsed() < 1)
+        self.assertTrue(budget.expired)
+        self.assertEqual(list(islice(solver.search(domains), len(solutions))), solutions)
+
+    def test_split_prefixes(self):
+        domains = [[0b01, 0b10], [0b01, 0b10, 0b100], [0b1000]]
+        self.assertEqual([(0,), (1,)], solver.split_prefixes(domains, target=2))
+        self.assertEqual([(0, 1), (0, 2), (1, 0), (1, 2)], solver.split_prefixes(domains, target=3))
+        self.assertEqual([(0, 1, 0), (0, 2, 0), (1, 0, 0), (1, 2, 0)], solver.split_prefixes(domains, target=10))
+
+    def test_components(self):
+        domains = [[0b0001], [0b1000], [0b0011], [0b1100, 0b0100], [0b10000]]
+        self.assertEqual([[0, 2], [1, 3], [4]], solver.components(domains))
+
+    def test_search_matches_backtrack(self):
+        domains = [[0b0001, 0b0010], [0b1000], [0b0011, 0b0100], [0b1100, 0b0100], [0b10000]]
+        self.assertEqual(
+            sorted(solver.backtrack(domains)),
+            sorted(solver.search(domains)))
+
+    def test_search_stops_if_a_component_has_no_solutions(self):
+        domains = [[0b01, 0b10], [0b0100], [0b0100]]
+        self.assertEqual([], list(solver.search(domains)))
+
+    def test_equivalence_classes(self):
+        class_domains, members = solver.equivalence_classes([[0b01, 0b10, 0b01], [0b100]])
+        self.assertEqual([[0b01, 0b10], [0b100]], class_domains)
+        self.assertEqual([[[0, 2], [1]], [[0]]], members)
+
+    def test_search_expands_equivalent_masks(self):
+        domains = [[0b001, 0b010, 0b001], [0b001, 0b100, 0b100]]
+        self.assertEqual(
+            sorted(solver.backtrack(domains)),
+            sorted(solver.search(domains)))
+
+    def test_count_solutions_matches_search(self):
+        rand = random.Random(1337)
+        for attempt in range(20):
+            domains = [
+                [rand.getrandbits(12) & rand.getrandbits(12) for i in range(rand.randint(1, 6))]
+                for j in range(rand.randint(1, 5))
+            ]
+            self.assertEqual(len(list(solver.search(domains))), solver.count_solutions(domains))
+
+    def test_count_solutions_with_limit(self):
+        domains = [[0b001, 0b010, 0b100], [0b1000, 0b10000]]
+        self.assertEqual(6, solver.count_solutions(domains))
+        self.assertEqual(4, solver.count_solutions(domains, limit=4))
+        self.assertEqual(0, solver.count_solutions(domains + [[0b1000], [0b1000]], limit=4))
+
+    def test_lazy_product_only_consumes_what_is_needed(self):
+        consumed = []
+
+        def numbers(name, amount):
+            for i in range(amount):
+                consumed.append((name, i))
+                yield i
+        sequences = [solver.LazySequence(numbers('a', 3)), solver.LazySequence(numbers('b', 3))]
+        product = solver.lazy_product(sequences)
+        self.assertEqual([(0, 0), (0, 1)], [product.next(), product.next()])
+        self.assertEqual([('a', 0), ('b', 0), ('b', 1)], consumed)
+
+
+class SchedulerTest(SchedulingTestCase):
+    def test_schedules_exclude_conflicts(self):
+        c1 = self.create_course(
+            [((10, 0), (11, 50), MWF)],
+            [((13, 0), (13, 50), MWF)],
+        )
+        c2 = self.create_course(
+            [((11, 0), (11, 50), models.Period.MONDAY)],
+            [((14, 0), (15, 50), TR)],
+        )
+        selection = self.selection(c1, c2)
+        schedules = compute_schedules(selection, free_sections_only=False)
+        self.assertEqual(3, len(schedules))
+        self.assertEqual(self.as_ids(self.brute_force(selection)), self.as_ids(schedules))
+
+    def test_independent_courses(self):
+        c1 = self.create_course(
+            [((8, 0), (8, 50), MWF)],
+            [((9, 0), (9, 50), MWF)],
+        )
+        c2 = self.create_course(
+            [((8, 30), (9, 20), MWF)],
+            [((11, 0), (11, 50), MWF)],
+        )
+        c3 = self.create_course(
+            [((18, 0), (19, 50), TR)],
+            [((17, 0), (18, 20), TR)],
+        )
+        c4 = self.create_course(
+            [((18, 0), (18, 50), models.Period.THURSDAY)],
+            [((20, 0), (20, 50), TR)],
+        )
+        selection = self.selection(c1, c2, c3, c4)
+        schedules = compute_schedules(selection, free_sections_only=False)
+        self.assertEqual(4, len(schedules))
+        self.assertEqual(self.as_ids(self.brute_force(selection)), self.as_ids(schedules))
+
+    def test_sections_at_the_same_time(self):
+        lecture = [((10, 0), (10, 50), MWF)]
+        c1 = self.create_course(lecture, lecture, lecture, [((14, 0), (14, 50), MWF)])
+        c2 = self.create_course(
+            [((10, 0), (10, 50), models.Period.MONDAY)],
+            [((13, 0), (13, 50), TR)],
+            [((13, 0), (13, 50), TR)],
+        )
+        selection = self.selection(c1, c2)
+        schedules = compute_schedules(selection, free_sections_only=False)
+        self.assertEqual(9, len(schedules))
+        self.assertEqual(self.as_ids(self.brute_force(selection)), self.as_ids(schedules))
+
+    def test_touching_periods_conflict(self):
+        c1 = self.create_course([((10, 0), (10, 50), MWF)])
+        c2 = self.create_course([((10, 50), (11, 40), models.Period.FRIDAY)])
+        self.assertEqual((), compute_schedules(self.selection(c1, c2), free_sections_only=False))
+
+    def test_matches_brute_force(self):
+        c1 = self.create_course(
+            [((8, 0), (8, 50), MWF)],
+            [((9, 0), (9, 50), MWF)],
+            [((10, 0), (11, 50), TR)],
+        )
+        c2 = self.create_course(
+            [((9, 0), (10, 50), TR)],
+            [((8, 30), (9, 20), MWF), ((16, 0), (17, 50), models.Period.THURSDAY)],
+        )
+        c3 = self.create_course(
+            [((17, 0), (18, 50), TR)],
+            [((9, 0), (9, 50), models.Period.FRIDAY)],
+            [((12, 0), (12, 50), MWF)],
+        )
+        selection = self.selection(c1, c2, c3)
+        schedules = compute_schedules(selection, free_sections_only=False)
+        self.assertEqual(self.as_ids(self.brute_force(selection)), self.as_ids(schedules))
+
+    def test_excluded_times(self):
+        c1 = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((13, 0), (13, 50), MWF)],
+        )
+        course, sections = c1
+        schedules = compute_schedules(
+            self.selection(c1),
+            excluded_times=[(1000, 1100, ['wednesday'])],
+            free_sections_only=False)
+        self.assertEqual([{course: sections[1]}], list(schedules))
+
+    def test_excluded_times_remove_sections_before_searching(self):
+        c1 = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((13, 0), (13, 50), MWF)],
+        )
+        c2 = self.create_course([((12, 0), (12, 50), TR)])
+        scheduler = Scheduler(free_sections_only=False)
+        scheduler.exclude_times(*parse_blocked_times(['Tuesday_12:30:0', 'Monday_13:0:0']))
+        order, domains, mask_domains = scheduler.build_search(self.selection(c1, c2))
+        self.assertEqual([[], [c1[1][0]]], [domains[c2[0]], domains[c1[0]]])
+        self.assertEqual([c2[0]], scheduler.blocked_courses)
+        result = scheduler.search_schedules(self.selection(c1, c2))
+        self.assertEqual([], result.schedules)
+        self.assertEqual([c2[0]], result.blocked_courses)
+
+    def test_parse_blocked_time(self):
+        timerange = parse_blocked_time('Wednesday_12:30:0')
+        self.assertEqual((time(12, 30), time(12, 59)), (timerange.start, timerange.end))
+        self.assertEqual(solver.time_range_mask(1230, 1259, ['wednesday']), timerange.mask)
+        self.assertEqual([], parse_blocked_times(['']))
+        self.assertRaises(ValueError, parse_blocked_time, 'Someday_12:0:0')
+        self.assertRaises(ValueError, parse_blocked_time, 'Monday_25:0:0')
+        self.assertRaises(ValueError, parse_blocked_time, 'garbage')
+
+    def test_parse_time_window(self):
+        timerange = parse_time_window('Tuesday_10:00-12:00')
+        self.assertEqual((time(10), time(11, 59)), (timerange.start, timerange.end))
+        self.assertEqual(['Tuesday'], timerange.days_of_week)
+        self.assertEqual(time(23, 59), parse_time_window('Friday_20:00-24:00').end)
+        self.assertRaises(ValueError, parse_time_window, 'Someday_10:00-12:00')
+        self.assertRaises(ValueError, parse_time_window, 'Tuesday_12:00-10:00')
+        self.assertRaises(ValueError, parse_time_window, 'Tuesday_10:00')
+        self.assertRaises(ValueError, parse_time_window, 'garbage')
+
+    def test_start_skips_schedules(self):
+        c1 = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((13, 0), (13, 50), MWF)],
+            [((15, 0), (15, 50), MWF)],
+        )
+        all_schedules = compute_schedules(self.selection(c1), free_sections_only=False)
+        schedules = compute_schedules(self.selection(c1), free_sections_only=False, start=1)
+        self.assertEqual(all_schedules[1:], schedules)
+
+    def test_pages_with_cursors(self):
+        c1 = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((13, 0), (13, 50), MWF)],
+            [((15, 0), (15, 50), MWF)],
+        )
+        c2 = self.create_course(
+            [((10, 0), (10, 50), models.Period.MONDAY)],
+            [((13, 0), (13, 50), TR)],
+        )
+        selection = self.selection(c1, c2)
+        all_schedules = compute_schedules(selection, free_sections_only=False)
+        schedules, cursor = [], None
+        while True:
+            page, cursor = compute_schedules_page(selection, free_sections_only=False, limit=2, cursor=cursor)
+            self.assertTrue(len(page) <= 2)
+            schedules.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual(list(all_schedules), schedules)
+
+    def test_cursor_of_another_selection(self):
+        c1 = self.create_course([((10, 0), (10, 50), MWF)], [((13, 0), (13, 50), MWF)])
+        c2 = self.create_course([((14, 0), (14, 50), MWF)], [((15, 0), (15, 50), MWF)])
+        schedules, cursor = compute_schedules_page(self.selection(c1), free_sections_only=False, limit=1)
+        self.assertRaises(
+            InvalidCursor, compute_schedules_page,
+            self.selection(c2), free_sections_only=False, cursor=cursor)
+        self.assertRaises(
+            InvalidCursor, compute_schedules_page,
+            self.selection(c1), free_sections_only=False, cursor='garbage')
+
+    def test_search_schedules_with_limit(self):
+        c1 = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((13, 0), (13, 50), MWF)],
+            [((15, 0), (15, 50), MWF)],
+        )
+        result = search_schedules(self.selection(c1), free_sections_only=False, limit=2)
+        self.assertTrue(result.truncated)
+        self.assertFalse(result.stats['timed_out'])
+        self.assertEqual(2, result.stats['solutions'])
+        rest = search_schedules(self.selection(c1), free_sections_only=False, cursor=result.next_cursor)
+        self.assertFalse(rest.truncated)
+        self.assertEqual(
+            list(compute_schedules(self.selection(c1), free_sections_only=False)),
+            result.schedules + rest.schedules)
+
+    def test_search_schedules_continues_after_timeout(self):
+        c1 = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((13, 0), (13, 50), MWF)],
+            [((15, 0), (15, 50), MWF)],
+        )
+        c2 = self.create_course(
+            [((13, 0), (13, 50), models.Period.MONDAY)],
+            [((10, 0), (10, 50), TR)],
+            [((15, 0), (15, 50), models.Period.FRIDAY)],
+        )
+        selection = self.selection(c1, c2)
+        budget_class = scheduling.SearchBudget
+        scheduling.SearchBudget = lambda timeout: budget_class(timeout, check_interval=1, clock=FakeClock())
+        try:
+            results = [search_schedules(selection, free_sections_only=False, timeout=10)]
+            while results[-1].truncated:
+                self.assertTrue(results[-1].stats['timed_out'])
+                results.append(search_schedules(
+                    selection, free_sections_only=False, timeout=10, cursor=results[-1].next_cursor))
+        finally:
+            scheduling.SearchBudget = budget_class
+        self.assertTrue(len(results) > 1)
+        schedules = [schedule for result in results for schedule in result.schedules]
+        self.assertEqual(list(compute_schedules(selection, free_sections_only=False)), schedules)
+
+    def test_parallel_search(self):
+        c1 = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((13, 0), (13, 50), MWF)],
+            [((15, 0), (15, 50), MWF)],
+        )
+        c2 = self.create_course(
+            [((13, 0), (13, 50), models.Period.MONDAY)],
+            [((10, 0), (10, 50), TR)],
+            [((15, 0), (15, 50), models.Period.FRIDAY)],
+        )
+        selection = self.selection(c1, c2)
+        scheduler = Scheduler(free_sections_only=False, processes=2, parallel_threshold=0, parallel_limit=0)
+        self.assertEqual(
+            compute_schedules(selection, free_sections_only=False),
+            scheduler.find_schedules(selection))
+        result = scheduler.search_schedules(selection, limit=2)
+        self.assertEqual(2, len(result.schedules))
+        self.assertTrue(result.truncated)
+
+    def test_parallel_search_only_for_large_limits(self):
+        domains = [[0b01, 0b10]] * 2
+        scheduler = Scheduler(processes=2, parallel_threshold=0, parallel_limit=100)
+        self.assertTrue(scheduler.use_parallel_search(domains))
+        self.assertTrue(scheduler.use_parallel_search(domains, limit=100))
+        self.assertFalse(scheduler.use_parallel_search(domains, limit=99))
+        self.assertFalse(Scheduler(processes=1, parallel_threshold=0).use_parallel_search(domains))
+
+    def test_find_schedules_with_limit(self):
+        c1 = self.create_course([((10, 0), (10, 50), MWF)], [((13, 0), (13, 50), MWF)])
+        c2 = self.create_course([((11, 0), (11, 50), MWF)], [((14, 0), (14, 50), MWF)])
+        selection = self.selection(c1, c2)
+        scheduler = Scheduler(free_sections_only=False)
+        limits = []
+        search = scheduler.search
+        scheduler.search = lambda mask_domains, start=None, budget=None, limit=None: (
+            limits.append(limit) or search(mask_domains, start, budget, limit))
+        all_schedules = compute_schedules(selection, free_sections_only=False)
+        self.assertEqual(all_schedules[1:3], scheduler.find_schedules(selection, start=1, limit=2))
+        self.assertEqual([3], limits)
+
+    def test_compute_schedules_with_timeout(self):
+        c1 = self.create_course([((10, 0), (10, 50), MWF)], [((13, 0), (13, 50), MWF)])
+        c2 = self.create_course([((11, 0), (11, 50), MWF)], [((14, 0), (14, 50), MWF)])
+        selection = self.selection(c1, c2)
+        budget_class = scheduling.SearchBudget
+        scheduling.SearchBudget = lambda timeout: budget_class(timeout, check_interval=1, clock=FakeClock())
+        try:
+            schedules = compute_schedules(selection, free_sections_only=False, start=1, timeout=4)
+        finally:
+            scheduling.SearchBudget = budget_class
+        all_schedules = compute_schedules(selection, free_sections_only=False)
+        self.assertEqual(4, len(all_schedules))
+        self.assertEqual(all_schedules[1:1 + len(schedules)], schedules)
+        self.assertTrue(len(schedules) < 3)
+
+    def test_count_schedules(self):
+        lecture = [((10, 0), (10, 50), MWF)]
+        c1 = self.create_course(lecture, lecture, [((14, 0), (14, 50), MWF)])
+        c2 = self.create_course(
+            [((10, 0), (10, 50), models.Period.MONDAY)],
+            [((13, 0), (13, 50), TR)],
+        )
+        selection = self.selection(c1, c2)
+        self.assertEqual(4, count_schedules(selection, free_sections_only=False))
+        self.assertEqual(2, count_schedules(selection, free_sections_only=False, limit=2))
+
+    def test_generator(self):
+        c1 = self.create_course([((10, 0), (10, 50), MWF)])
+        schedules = Scheduler(free_sections_only=False).find_schedules(self.selection(c1), generator=True)
+        self.assertEqual(1, len(list(schedules)))
@@ -0,0 +1,116 @@
+from django.core.cache.backends.locmem import LocMemCache
+
+from courses.signals import sections_modified, courses_imported
+from courses.tests.factories import SectionPeriodFactory
+from scheduler.domain import schedules_to_json, search_schedules
+from scheduler.store import ScheduleStore
+from scheduler.tests.test_scheduling import SchedulingTestCase, MWF, TR
+
+
+class ScheduleStoreTest(SchedulingTestCase):
+    def setUp(self):
+        super(ScheduleStoreTest, self).setUp()
+        self.store = ScheduleStore(cache=LocMemCache('schedule-store-test', {}), max_entries=10)
+        self.store.cache.clear()
+        self.c1 = self.create_course(
+            [((8, 0), (8, 50), MWF)],
+            [((10, 0), (10, 50), MWF)],
+        )
+        self.c2 = self.create_course(
+            [((8, 0), (8, 50), MWF)],
+            [((10, 0), (11, 15), TR)],
+        )
+
+    def expected(self, selection):
+        return sorted(schedules_to_json(self.brute_force(selection)))
+
+    def store_selection(self, selection):
+        self.store.set(selection, schedules_to_json(self.brute_force(selection)))
+
+    def test_get_stored_selection(self):
+        selection = self.selection(self.c1, self.c2)
+        self.assertEqual(None, self.store.get(selection))
+        self.store_selection(selection)
+        self.assertEqual(self.expected(selection), sorted(self.store.get(selection)))
+
+    def test_extends_with_added_course(self):
+        self.store_selection(self.selection(self.c1, self.c2))
+        c3 = self.create_course(
+            [((10, 0), (10, 50), MWF)],
+            [((12, 0), (12, 50), MWF)],
+        )
+        selection = self.selection(self.c1, self.c2, c3)
+        self.assertEqual(self.expected(selection), sorted(self.store.get(selection)))
+
+    def test_extends_to_no_schedules(self):
+        self.store_selection(self.selection(self.c1, self.c2))
+        c3 = self.create_course([((8, 0), (11, 50), MWF | TR)])
+        self.assertEqual([], self.store.get(self.selection(self.c1, self.c2, c3)))
+
+    def test_projects_removed_course(self):
+        c3 = self.create_course(
+            [((8, 0), (8, 50), MWF)],
+            [((14, 0), (14, 50), MWF)],
+        )
+        self.store_selection(self.selection(self.c1, self.c2, c3))
+        selection = self.selection(self.c1, self.c2)
+        self.assertEqual(self.expected(selection), sorted(self.store.get(selection)))
+
+    def test_does_not_project_when_schedules_could_be_missing(self):
+        # c3 conflicts with a schedule of c1 and c2, so it is missing from the stored ones.
+        c3 = self.create_course([((10, 0), (10, 50), MWF | TR)])
+        self.store_selection(self.selection(self.c1, self.c2, c3))
+        self.assertEqual(None, self.store.get(self.selection(self.c1, self.c2)))
+
+    def test_evicts_least_recently_used(self):
+        self.store.max_entries = 2
+        c3 = self.create_course([((14, 0), (14, 50), MWF)])
+        self.store_selection(self.selection(self.c1))
+        self.store_selection(self.selection(self.c2))
+        self.store.get(self.selection(self.c1))
+        self.store_selection(self.selection(c3))
+        self.assertNotEqual(None, self.store.get(self.selection(self.c1)))
+        versions = self.store.versions_of(self.selection(self.c2))
+        self.assertEqual(None, self.store.cache.get(self.store.key([s.id for s in self.c2[1]], versions)))
+
+    def test_clear(self):
+        selection = self.selection(self.c1, self.c2)
+        self.store_selection(selection)
+        self.store.clear()
+        self.assertEqual(None, self.store.get(selection))
+
+    def test_ignores_older_versions(self):
+        selection = self.selection(self.c1, self.c2)
+        self.store_selection(selection)
+        self.store.results.bump_version(self.semester.id)
+        self.assertEqual(None, self.store.get(selection))
+        self.assertEqual(None, self.store.get(self.selection(self.c1)))
+
+    def test_ignores_changed_periods(self):
+        selection = self.selection(self.c1, self.c2)
+        self.store_selection(selection)
+        # a change of periods that is not published yet doesn't bump the version.
+        course, (section1, section2) = self.c1
+        SectionPeriodFactory.create(period=section1.get_periods()[0], section=section2, semester=self.semester)
+        self.assertEqual(None, self.store.get(selection))
+
+    def test_search_schedules_with_store(self):
+        selection = self.selection(self.c1, self.c2)
+        result = search_schedules(selection, store=self.store)
+        self.assertFalse(result['stats'].get('stored'))
+        result = search_schedules(selection, store=self.store)
+        self.assertTrue(result['stats']['stored'])
+        self.assertEqual(self.expected(selection), result['schedules'])
+
+
+class ClearStoreTest(SchedulingTestCase):
+    def test_import_clears_store_once_committed(self):
+        course, (section,) = c1 = self.create_course([((8, 0), (8, 50), MWF)])
+        selection = self.selection(c1)
+        store = ScheduleStore()
+        store.cache.clear()
+        store.set(selection, schedules_to_json(self.brute_force(selection)))
+        sections_modified.send(sender=self, semester=self.semester, section_ids=[section.id])
+        self.assertNotEqual(None, store.get(selection))
+        courses_imported.send(sender=self)
+        self.assertEqual(None, store.get(selection))
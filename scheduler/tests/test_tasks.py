@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+
+from mock import patch
+
+from courses.tests.factories import SemesterFactory
+from scheduler import tasks
+from scheduler.models import SectionConflict
+from scheduler.tests.test_scheduling import SchedulingTestCase, MWF
+
+
+class ComputeConflictsTest(SchedulingTestCase):
+    def setUp(self):
+        super(ComputeConflictsTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.progress_file = os.path.join(self.directory, 'progress')
+        self.other_semester = SemesterFactory.create(year=self.semester.year - 1)
+        course1, (section1,) = self.create_course([((10, 0), (10, 50), MWF)])
+        course2, (section2,) = self.create_course([((10, 0), (10, 50), MWF)])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def compute(self, **kwargs):
+        with patch('sys.stdout'):
+            tasks.compute_conflicts(all_semesters=True, processes=1, progress_file=self.progress_file, **kwargs)
+
+    def test_computes_all_semesters(self):
+        self.compute()
+        self.assertEqual(1, SectionConflict.objects.filter(semester=self.semester).count())
+        self.assertFalse(os.path.exists(self.progress_file))
+
+    def test_resume_skips_completed_semesters(self):
+        tasks.write_progress(self.progress_file, [self.semester.id])
+        self.compute(resume=True)
+        self.assertEqual(0, SectionConflict.objects.filter(semester=self.semester).count())
+
+        tasks.write_progress(self.progress_file, [self.semester.id])
+        self.compute()
+        self.assertEqual(1, SectionConflict.objects.filter(semester=self.semester).count())
+
+    def test_records_progress_of_interrupted_runs(self):
+        def cache_conflicts(semester, **kwargs):
+            if semester == self.other_semester:
+                raise KeyboardInterrupt
+        with patch.object(tasks.models, 'cache_conflicts', cache_conflicts):
+            self.assertRaises(KeyboardInterrupt, self.compute)
+        self.assertEqual(set([self.semester.id]), tasks.read_progress(self.progress_file))
@@ -0,0 +1,109 @@
+import random
+
+from courses import models as courses
+from scheduler import time_index
+from scheduler.models import semester_data_changed
+from scheduler.scheduling import parse_time_window
+from scheduler.time_index import SectionTimeIndex, get_section_time_index
+from scheduler.tests.test_scheduling import SchedulingTestCase, MWF, TR
+
+
+class SectionTimeIndexTest(SchedulingTestCase):
+    def setUp(self):
+        super(SectionTimeIndexTest, self).setUp()
+        self.course1, (self.morning, self.noon) = self.create_course(
+            [((10, 0), (10, 50), TR)],
+            [((12, 0), (12, 50), MWF)],
+        )
+        self.course2, (self.both,) = self.create_course(
+            [((10, 0), (10, 50), courses.Period.TUESDAY), ((13, 0), (13, 50), courses.Period.TUESDAY)],
+        )
+        self.index = SectionTimeIndex.for_semester(self.semester)
+
+    def windows(self, *windows):
+        return [parse_time_window(window) for window in windows]
+
+    def test_sections_within(self):
+        self.assertEqual(set(), self.index.sections_within(self.windows('Tuesday_10:00-12:00')))
+        self.assertEqual(
+            set([self.morning.id]),
+            self.index.sections_within(self.windows('Tuesday_10:00-12:00', 'Thursday_9:00-11:00')))
+        self.assertEqual(
+            set([self.morning.id, self.both.id]),
+            self.index.sections_within(self.windows(
+                'Tuesday_10:00-12:00', 'Tuesday_11:00-14:00', 'Thursday_10:00-10:51')))
+        # the window ends before the period does.
+        self.assertEqual(
+            set(), self.index.sections_within(self.windows('Tuesday_10:00-10:50', 'Thursday_10:00-10:50')))
+
+    def test_sections_overlapping(self):
+        self.assertEqual(
+            set([self.morning.id, self.both.id]),
+            self.index.sections_overlapping(self.windows('Tuesday_10:30-11:00')))
+        self.assertEqual(
+            set([self.noon.id, self.both.id]),
+            self.index.sections_overlapping(self.windows('Tuesday_13:50-14:00', 'Friday_12:50-12:51')))
+        self.assertEqual(set(), self.index.sections_overlapping(self.windows('Monday_10:51-12:00')))
+
+    def test_find_sections(self):
+        self.assertEqual(
+            set([self.noon.id]),
+            self.index.find_sections(busy=self.windows('Tuesday_10:00-11:00')))
+        # noon also meets on wednesdays and fridays.
+        self.assertEqual(set(), self.index.find_sections(self.windows('Monday_8:00-18:00')))
+        self.assertEqual(
+            set([self.noon.id]),
+            self.index.find_sections(
+                self.windows('Monday_8:00-18:00', 'Wednesday_12:00-13:00', 'Friday_12:00-13:00', 'Tuesday_10:00-11:00'),
+                self.windows('Tuesday_10:00-11:00')))
+        self.assertEqual(self.course2.id, self.index.course_ids[self.both.id])
+
+    def test_to_be_announced_periods_never_fit(self):
+        course, (section,) = self.create_course([((0, 0), (0, 0), 0)])
+        courses.Period.objects.filter(section_times__section=section).update(start=None, end=None)
+        index = SectionTimeIndex.for_semester(self.semester)
+        self.assertFalse(section.id in index.sections_within(self.windows('Monday_0:00-24:00')))
+        self.assertFalse(section.id in index.sections_overlapping(self.windows('Monday_0:00-24:00')))
+
+    def test_matches_time_ranges(self):
+        rand = random.Random(7)
+        sections = [
+            self.create_course([
+                ((hour, 0), (hour + rand.choice([0, 1]), rand.choice([20, 50])), rand.choice([MWF, TR]))
+                for hour in rand.sample(range(8, 18), rand.randint(1, 2))
+            ])[1][0]
+            for i in range(10)
+        ]
+        index = SectionTimeIndex.for_semester(self.semester)
+        for hour in range(8, 18):
+            windows = self.windows('Monday_%d:00-%d:30' % (hour, hour + 1), 'Thursday_%d:30-%d:00' % (hour, hour + 2))
+            expected = set(
+                section.id for section in sections
+                if any(window.conflicts_with(section) for window in windows)
+            )
+            self.assertEqual(expected, index.sections_overlapping(windows) & set(s.id for s in sections))
+
+
+class GetSectionTimeIndexTest(SchedulingTestCase):
+    def tearDown(self):
+        time_index._indices.clear()
+
+    def test_rebuilds_when_semester_is_updated(self):
+        course, (section,) = self.create_course([((10, 0), (10, 50), MWF)])
+        index = get_section_time_index(self.semester)
+        with self.assertNumQueries(0):
+            self.assertTrue(index is get_section_time_index(self.semester))
+
+        self.create_course([((12, 0), (12, 50), MWF)])
+        self.semester.save()
+        self.assertNotEqual(index.section_ids, get_section_time_index(self.semester).section_ids)
+
+    def test_rebuilds_when_semester_data_changes(self):
+        self.create_course([((10, 0), (10, 50), MWF)])
+        index = get_section_time_index(self.semester)
+        date_updated = self.semester.date_updated
+
+        self.create_course([((12, 0), (12, 50), MWF)])
+        semester_data_changed(self.semester)
+        self.assertEqual(date_updated, courses.Semester.objects.get(id=self.semester.id).date_updated)
+        self.assertNotEqual(index.section_ids, get_section_time_index(self.semester).section_ids)
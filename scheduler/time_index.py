@@ -0,0 +1,133 @@
+"""Indices of the times of the sections of a semester, to find the sections that fit
+in free time windows or avoid busy ones without querying the database.
+
+For each day of the week, the index keeps the periods of the sections sorted by their
+start minute, so the periods in or around a time window are found by bisection. Each
+process builds the index of a semester once, and again when the semester is updated.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+
+from courses.models import Period, SectionPeriod
+from scheduler.solver import days_flag, minute_of_day
+
+
+__all__ = ['TimeIndex', 'SectionTimeIndex', 'get_section_time_index']
+
+
+class TimeIndex(object):
+    """The periods of keys (eg - sections or rooms) by day of the week.
+
+    ``rows``: An iterable of (key, start, end, days of the week flag).
+    Periods to be announced (or with an end before their start) are never in or
+    around any time window.
+
+    Time windows are objects with ``start``, ``end`` and ``days_of_week`` attributes
+    (eg - scheduler.scheduling.TimeRange). Like periods, both their start and end are
+    inclusive.
+    """
+    def __init__(self, rows):
+        self.period_counts = {}  # key => number of (period, day) in the index
+        days = dict((day, []) for day, name in Period.DAYS_OF_WEEK)
+        for key, start, end, flag in rows:
+            self.period_counts.setdefault(key, 0)
+            first, last = minute_of_day(start), minute_of_day(end)
+            if first is None or last is None or last < first:
+                # can never fit in a window.
+                self.period_counts[key] += 1
+                continue
+            for day, periods in days.items():
+                if flag & day:
+                    periods.append((first, last, key))
+                    self.period_counts[key] += 1
+        self.days = {}  # day => (sorted starts, periods, longest period)
+        for day, periods in days.items():
+            periods.sort()
+            longest = max([last - first for first, last, key in periods] or [0])
+            self.days[day] = ([first for first, last, key in periods], periods, longest)
+
+    def __repr__(self):
+        return "<%s: %d keys>" % (self.__class__.__name__, len(self.period_counts))
+
+    @property
+    def keys(self):
+        return set(self.period_counts)
+
+    def day_ranges(self, windows):
+        "Returns the (day, first minute, last minute) of each day of the given time windows."
+        for window in windows:
+            flag = days_flag(window.days_of_week)
+            first, last = minute_of_day(window.start), minute_of_day(window.end)
+            for day in self.days:
+                if flag & day:
+                    yield day, first, last
+
+    def keys_within(self, windows):
+        "Returns the set of keys whose periods are all inside the given time windows."
+        inside = {}
+        seen = set()
+        for day, first, last in self.day_ranges(windows):
+            starts, periods, longest = self.days[day]
+            for period in periods[bisect_left(starts, first):bisect_right(starts, last)]:
+                # windows may overlap, count each period once.
+                if period[1] <= last and (day, period) not in seen:
+                    seen.add((day, period))
+                    inside[period[2]] = inside.get(period[2], 0) + 1
+        return set(key for key, count in inside.items() if count == self.period_counts[key])
+
+    def keys_overlapping(self, windows):
+        "Returns the set of keys with a period overlapping any of the given time windows."
+        keys = set()
+        for day, first, last in self.day_ranges(windows):
+            starts, periods, longest = self.days[day]
+            # periods starting before first - longest end before the window.
+            for start, end, key in periods[bisect_left(starts, first - longest):bisect_right(starts, last)]:
+                if end >= first:
+                    keys.add(key)
+        return keys
+
+    def find(self, free=None, busy=()):
+        """Returns the set of keys fitting in the ``free`` time windows (all the keys if
+        None) and not overlapping the ``busy`` ones.
+        """
+        keys = self.keys if free is None else self.keys_within(free)
+        return keys - self.keys_overlapping(busy)
+
+
+class SectionTimeIndex(TimeIndex):
+    """The periods of sections by day of the week.
+
+    ``rows``: An iterable of (section id, course id, start, end, days of the week flag).
+    """
+    def __init__(self, rows):
+        self.course_ids = {}  # section id => course id
+        periods = []
+        for section_id, course_id, start, end, flag in rows:
+            self.course_ids[section_id] = course_id
+            periods.append((section_id, start, end, flag))
+        super(SectionTimeIndex, self).__init__(periods)
+
+    @classmethod
+    def for_semester(cls, semester):
+        "Returns the index of the sections of the given semester."
+        return cls(SectionPeriod.objects.filter(semester=semester).values_list(
+            'section_id', 'section__course_id', 'period__start', 'period__end', 'period__days_of_week_flag'))
+
+    section_ids = TimeIndex.keys
+    sections_within = TimeIndex.keys_within
+    sections_overlapping = TimeIndex.keys_overlapping
+    find_sections = TimeIndex.find
+
+
+_indices = {}  # semester id => (data version, index)
+_indices_lock = threading.Lock()
+
+
+def get_section_time_index(semester):
+    "Returns the SectionTimeIndex of the semester, built again only when the semester is updated."
+    with _indices_lock:
+        version, index = _indices.get(semester.id, (None, None))
+        if index is None or version != semester.data_version:
+            index = SectionTimeIndex.for_semester(semester)
+            _indices[semester.id] = (semester.data_version, index)
+        return index
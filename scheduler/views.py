@@ -1,7 +1,7 @@
 from json import dumps
 
 from django.views.generic import TemplateView
-from django.http import HttpResponse, Http404, HttpResponseNotFound, HttpResponseForbidden
+from django.http import HttpResponse, Http404, HttpResponseNotFound, HttpResponseForbidden, HttpResponseBadRequest
 from django.shortcuts import render_to_response, redirect
 from django.template import RequestContext
 from django.conf import settings
@@ -11,7 +11,7 @@ from courses.views import SemesterBasedMixin, AjaxJsonResponseMixin, SelectedCou
 from courses.models import Semester, Department, Section
 from courses.utils import dict_by_attr, sorted_daysofweek, DAYS
 from scheduler import models
-from scheduler.scheduling import compute_schedules
+from scheduler.scheduling import compute_schedules, search_schedules, count_schedules, InvalidCursor
 
 
 ICAL_PRODID = getattr(
@@ -19,6 +19,9 @@ ICAL_PRODID = getattr(
     'SCHEDULER_ICAL_PRODUCT_ID',
     '-//Jeff Hui//YACS Export 1.0//EN')
 SECTION_LIMIT = getattr(settings, 'SECTION_LIMIT', 60)
+SCHEDULE_TIMEOUT = getattr(settings, 'SCHEDULER_TIMEOUT', 5)
+SCHEDULE_LIMIT = getattr(settings, 'SCHEDULER_SCHEDULE_LIMIT', 2000)
+SCHEDULE_COUNT_LIMIT = getattr(settings, 'SCHEDULER_COUNT_LIMIT', 100000)
 
 
 def compute_selection_dict(sids):
@@ -31,7 +34,7 @@ def compute_selection_dict(sids):
 def take(num, iterable):
     for i, v in enumerate(iterable):
         if i < num:
-            yield iterable
+            yield v
         else:
             break
 
@@ -83,12 +86,6 @@ class ConflictMixin(SemesterBasedMixin):
 
     "Provides the view with helper methods to acquire the conflicted sections."
 
-    def conflict_mapping(self, conflicts):
-        """Returns a dictionary of section id to a frozen set of section ids
-        that conflict with the given section.
-        """
-        return models.SectionConflict.objects.as_dictionary(conflicts)
-
     def get_sections_by_crns(self, crns):
         "Returns all sections with the provided CRNs."
         year, month = self.get_year_and_month()
@@ -99,18 +96,6 @@ class ConflictMixin(SemesterBasedMixin):
         queryset = queryset.select_related('course', 'course__department')
         return queryset.by_semester(year, month).prefetch_periods()
 
-    def inject_conflict_mapping_in_sections(self, sections):
-        """Givens the collection of section objects, attaches a conflict attr
-        to each which is a frozen set of all section ids that conflict with
-        the given section.
-        """
-        section_ids = set(s.id for s in sections)
-        conflict_mapping = models.SectionConflict.objects.as_dictionary(
-            section_ids)
-        empty_set = frozenset()  # saves memory
-        for section in sections:
-            section.conflicts = conflict_mapping.get(section.id) or empty_set
-
 
 # warning: this view doesn't actually work by itself...
 # mostly because the template doesn't expect the same context
@@ -139,7 +124,7 @@ class ComputeSchedules(ConflictMixin, ExceptionResponseMixin, TemplateView):
         """Return the collection of section objects that
         correspond to the user's selection of CRNs.
 
-        The section object has select_related and conflict maps.
+        The section object has select_related and prefetched periods.
         """
         year, month = self.get_year_and_month()
         sections = self.get_sections_by_crns(crns)
@@ -147,20 +132,30 @@ class ComputeSchedules(ConflictMixin, ExceptionResponseMixin, TemplateView):
         if len(sections) > SECTION_LIMIT:
             raise ResponsePayloadException(HttpResponseForbidden('invalid'))
 
-        self.inject_conflict_mapping_in_sections(sections)
         return sections
 
     def get_savepoint(self):
         "Returns the reference to a position in the scheduler generation."
         return int(self.request.GET.get('from', 0))
 
+    def get_cursor(self):
+        "Returns the cursor token of the page of schedules to compute, if any."
+        return self.request.GET.get('cursor') or None
+
+    def get_limit(self):
+        "Returns the maximum number of schedules to compute, or 0 for all of them."
+        try:
+            return max(int(self.request.GET.get('limit')), 0)
+        except (ValueError, TypeError):
+            return 0
+
     def reformat_to_selected_courses(self, sections):
         "Returns a dictionary of a course mapped to its sections objects."
         return dict_by_attr(sections, 'course')
 
     def compute_schedules(self, selected_courses):
-        # we should probably set some upper bound of computation and restrict number of sections used.
-        # schedules = take(100, compute_schedules(selected_courses, generator=True))
+        # the computation is bounded by SCHEDULE_TIMEOUT and SCHEDULE_LIMIT, clients
+        # continue a truncated computation with the next_cursor in the context.
         #
         # ideally, we should write the schedules to the database in bulk after
         # the first time we compute this for a bunch of benefits (short-linkable
@@ -168,26 +163,37 @@ class ComputeSchedules(ConflictMixin, ExceptionResponseMixin, TemplateView):
         # version:
         # https://docs.djangoproject.com/en/dev/ref/models/querysets/#django.db.models.query.QuerySet.bulk_create
         if self.request.GET.get('check'):
-            for schedule in compute_schedules(selected_courses, free_sections_only=False, generator=True):
+            if count_schedules(selected_courses, free_sections_only=False, limit=1):
                 raise ResponsePayloadException(HttpResponse('ok'))
             raise ResponsePayloadException(HttpResponseNotFound('conflicts'))
-        schedules = compute_schedules(
-            selected_courses,
-            start=self.get_savepoint(),
-            free_sections_only=False,
-            generator=True)
+        if self.request.GET.get('count'):
+            count = count_schedules(selected_courses, free_sections_only=False, limit=SCHEDULE_COUNT_LIMIT)
+            raise ResponsePayloadException(HttpResponse(str(count)))
+
+        limit = self.get_limit()
+        cursor = self.get_cursor()
+        self.next_cursor, self.truncated = None, False
+        if cursor is None and self.get_savepoint():
+            # older clients page by the number of schedules to skip.
+            return list(compute_schedules(
+                selected_courses,
+                start=self.get_savepoint(),
+                free_sections_only=False,
+                generator=True,
+                timeout=SCHEDULE_TIMEOUT,
+                limit=min(limit or SCHEDULE_LIMIT, SCHEDULE_LIMIT)))
 
         try:
-            limit = int(self.request.GET.get('limit'))
-        except (ValueError, TypeError):
-            limit = 0
-        if limit > 0:
-            print "limiting by", limit
-            schedules = take(limit, schedules)
-        else:
-            schedules = list(schedules)
-
-        return schedules
+            result = search_schedules(
+                selected_courses,
+                free_sections_only=False,
+                limit=min(limit or SCHEDULE_LIMIT, SCHEDULE_LIMIT),
+                timeout=SCHEDULE_TIMEOUT,
+                cursor=cursor)
+        except InvalidCursor:
+            raise ResponsePayloadException(HttpResponseBadRequest('invalid cursor'))
+        self.next_cursor, self.truncated = result.next_cursor, result.truncated
+        return result.schedules
 
     def period_stats(self, periods):
         """Returns various statistics of the period objects provided..
@@ -335,6 +341,8 @@ class ComputeSchedules(ConflictMixin, ExceptionResponseMixin, TemplateView):
                     schedules,
                     periods),
                 'selection_slug': selection.id,
+                'next_cursor': self.next_cursor,
+                'truncated': self.truncated,
             }
         else:
             context = {
@@ -342,6 +350,8 @@ class ComputeSchedules(ConflictMixin, ExceptionResponseMixin, TemplateView):
                 'sem_year': year,
                 'sem_month': month,
                 'selection_slug': selection.id,
+                'next_cursor': self.next_cursor,
+                'truncated': self.truncated,
             }
         data.update(context)
         return data
@@ -242,6 +242,10 @@ CACHES = {
 # ==== API App ====
 # Return queries executed in json, only works when DEBUG = True
 API_RETURN_QUERIES = True
+# directory of the static snapshots of the most requested API responses, built after each import.
+API_SNAPSHOTS_DIR = relative_path('snapshots')
+# number of sections read from the database at a time when streaming the sections list.
+API_SECTIONS_CHUNK_SIZE = 500
 
 # ==== Courses App ====
 # full module path to the function that does all the importing
@@ -256,6 +260,23 @@ SCHEDULER_ICAL_PRODUCT_ID = '-//Jeff Hui//YACS Export 1.0//EN'
 # more sections means it takes longer to compute. Until we have
 # a good caching strategy, this is a hard upper bound. Default is 60.
 SCHEDULER_SECTION_LIMIT = 60
+# upper bounds of a single schedule computation. Once either the number of seconds
+# or the number of schedules is reached, the schedules found so far are returned
+# along with a cursor to continue from.
+SCHEDULER_TIMEOUT = 5
+SCHEDULER_SCHEDULE_LIMIT = 2000
+# the number of schedules counted at most for the schedule_count of selections.
+SCHEDULER_COUNT_LIMIT = 100000
+# number of selections whose schedules are kept in the cache, so schedules of selections
+# differing by a course can be derived from them. The least recently used are removed first.
+SCHEDULER_STORE_SIZE = 100
+SCHEDULER_STORE_TIMEOUT = 24 * 60 * 60
+# number of seconds to cache the schedules API results of a selection for.
+SCHEDULER_RESULTS_TIMEOUT = 24 * 60 * 60
+# directory of the packed conflict matrices of each semester, written when conflicts are cached.
+SCHEDULER_CONFLICTS_DIR = relative_path('conflicts')
+# the semesters computed by an unfinished create_section_cache, to continue it with --resume.
+SCHEDULER_CONFLICTS_PROGRESS_FILE = os.path.join(SCHEDULER_CONFLICTS_DIR, 'progress')
 
 # ==== Django Debug Toolbar ====
 INTERNAL_IPS = ('127.0.0.1',)
@@ -376,22 +397,9 @@ CELERYBEAT_SCHEDULE = {
             'catalog': True,
         },
     },
-    'compute_section_cache': {
-        'task': 'scheduler.tasks.compute_conflicts',
-        'schedule': crontab(minute='*/30'),
-        'kwargs': {
-            'all_semesters': False,
-            'sql': True,
-        },
-    },
-    'clean_selection': {
-        'task': 'scheduler.tasks.clear_selection_cache',
-        'schedule': crontab(minute='0'),
-        'kwargs': {
-            'all_semesters': False,
-            'sql': True,
-        },
-    },
+    # section conflicts are updated by imports that modify periods (see courses.signals.sections_modified).
+    # Use the create_section_cache command to recompute all of them.
+    # cached schedules are versioned by semester (see scheduler.results), so they never need clearing.
 }
 
 # === corsheaders ===
@@ -13,3 +13,11 @@ DATABASES = {
 
 # === django-pipeline ===
 STATICFILES_STORAGE = 'pipeline.storage.PipelineStorage'
+
+# === scheduler ===
+# tests reuse the same semesters, so don't share conflict matrices between them.
+SCHEDULER_CONFLICTS_DIR = None
+SCHEDULER_CONFLICTS_PROGRESS_FILE = None
+
+# === api ===
+API_SNAPSHOTS_DIR = None